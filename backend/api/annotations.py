@@ -1,18 +1,35 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from models.data_models import RemoveRequest, RemoveResponse, ClassesResponse, HealthResponse
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from typing import List, Optional
+from models.data_models import (RemoveRequest, RemoveResponse, UndoRequest, UndoResponse,
+                                ExportResponse, ClassesResponse, HealthResponse)
 from services.data_loader import data_loader
 from services.coco_service import coco_service
+from services.stats_service import stats_service
+from services.annotation_query import annotation_query, SORT_KEYS
+from services.executors import PoolSaturatedError, io_pool
+from api.conditional import not_modified
 
 router = APIRouter()
 
+MAX_PAGE_SIZE = 1000
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated ?fields= projection"""
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(',') if field.strip()]
+
 @router.get("/classes", response_model=List[str])
-async def get_classes():
+async def get_classes(request: Request, response: Response):
     """Get list of available class names"""
     try:
         if not data_loader.annotations:
             data_loader.load_all()
             
+        cached = not_modified(request, response)
+        if cached:
+            return cached
+            
         class_names = coco_service.get_category_names()
         return class_names
         
@@ -26,30 +43,121 @@ async def remove_annotations(request: RemoveRequest):
         if not request.annotation_ids:
             raise HTTPException(status_code=400, detail="No annotation IDs provided")
             
-        result = coco_service.remove_annotations_by_ids(request.annotation_ids)
+        if not data_loader.annotations:
+            data_loader.load_all()
+            
+        # The removal log is fsync'd, keep that off the event loop
+        result = await io_pool.run(coco_service.remove_annotations_by_ids, request.annotation_ids)
         
         return RemoveResponse(
             success=result['success'],
             removed_count=result['removed_count'],
-            output_file=result['output_file']
+            output_file=result['output_file'],
+            batch_id=result['batch_id']
         )
         
+    except (HTTPException, PoolSaturatedError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error removing annotations: {str(e)}")
 
+@router.post("/remove/undo", response_model=UndoResponse)
+async def undo_removal(request: UndoRequest):
+    """Undo a removal batch, the most recent one by default"""
+    try:
+        if not data_loader.annotations:
+            data_loader.load_all()
+            
+        result = await io_pool.run(coco_service.undo_removal, request.batch_id)
+        if not result['success']:
+            raise HTTPException(status_code=404, detail="No removal batch to undo")
+            
+        return UndoResponse(**result)
+        
+    except (HTTPException, PoolSaturatedError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error undoing removal: {str(e)}")
+
+@router.get("/removals")
+async def get_removals():
+    """List removal batches that are currently applied"""
+    return {'batches': data_loader.removal_log.batches()}
+
+@router.post("/export", response_model=ExportResponse)
+async def export_annotations():
+    """Write the cleaned annotations to a new timestamped COCO file"""
+    try:
+        if not data_loader.annotations:
+            data_loader.load_all()
+            
+        result = await io_pool.run(coco_service.export_annotations)
+        return ExportResponse(**result)
+        
+    except PoolSaturatedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error exporting annotations: {str(e)}")
+
+@router.get("/annotations")
+async def list_annotations(sort: str = Query('id', description=f"Sort key: {', '.join(SORT_KEYS)}"),
+                           order: str = Query('asc', pattern='^(asc|desc)$'),
+                           class_name: Optional[str] = Query(None, description="Filter by class name"),
+                           min_score: Optional[float] = None, max_score: Optional[float] = None,
+                           min_area: Optional[float] = None, max_area: Optional[float] = None,
+                           limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+                           cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+                           offset: Optional[int] = Query(None, ge=0),
+                           fields: Optional[str] = Query(None, description="Comma-separated fields to return")):
+    """Page through live annotations, sorted and filtered, with only the requested fields"""
+    try:
+        if not data_loader.annotations:
+            data_loader.load_all()
+            
+        return annotation_query.page(
+            sort=sort, descending=order == 'desc', class_filter=class_name,
+            min_score=min_score, max_score=max_score, min_area=min_area, max_area=max_area,
+            limit=limit, cursor=cursor, offset=offset, fields=parse_fields(fields)
+        )
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing annotations: {str(e)}")
+
 @router.get("/annotations/stats")
-async def get_annotation_stats():
+async def get_annotation_stats(request: Request, response: Response):
     """Get statistics about annotations"""
     try:
         if not data_loader.annotations:
             data_loader.load_all()
             
+        cached = not_modified(request, response)
+        if cached:
+            return cached
+            
         stats = coco_service.get_annotation_stats()
         return stats
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting annotation stats: {str(e)}")
 
+@router.get("/annotations/stats/images")
+async def get_image_annotation_counts(request: Request, response: Response):
+    """Get the number of live annotations per image"""
+    try:
+        if not data_loader.annotations:
+            data_loader.load_all()
+            
+        cached = not_modified(request, response)
+        if cached:
+            return cached
+            
+        return {'image_counts': stats_service.image_counts()}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting image stats: {str(e)}")
+
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     """Check health status of the API"""
@@ -80,16 +188,22 @@ async def health_check():
 async def reload_data():
     """Reload all data files"""
     try:
-        data_loader.load_all()
-        
-        return {
-            'success': True,
-            'message': 'Data reloaded successfully',
-            'embeddings_shape': list(data_loader.embeddings.shape) if data_loader.embeddings is not None else None,
-            'annotations_count': len(data_loader.annotations['annotations']) if data_loader.annotations else 0,
-            'mapping_count': len(data_loader.mapping) if data_loader.mapping else 0
-        }
-        
+        await io_pool.run(data_loader.reload)
+        # Report on the new snapshot rather than the one this request started on
+        token = data_loader.pin()
+        try:
+            return {
+                'success': True,
+                'message': 'Data reloaded successfully',
+                'embeddings_shape': list(data_loader.embeddings.shape) if data_loader.embeddings is not None else None,
+                'annotations_count': data_loader.get_live_annotation_count() if data_loader.annotations else 0,
+                'mapping_count': len(data_loader.mapping) if data_loader.mapping else 0
+            }
+        finally:
+            data_loader.unpin(token)
+            
+    except PoolSaturatedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reloading data: {str(e)}")
 
@@ -97,11 +211,16 @@ async def reload_data():
 async def get_annotation(annotation_id: int):
     """Get specific annotation by ID"""
     try:
+        if not data_loader.annotations:
+            data_loader.load_all()
+            
         annotation = data_loader.get_annotation_by_id(annotation_id)
         if not annotation:
             raise HTTPException(status_code=404, detail="Annotation not found")
             
         return annotation
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting annotation: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,36 @@
+import hashlib
+from typing import Dict, Optional
+from fastapi import Request, Response
+from services.data_loader import data_loader
+
+def etag_headers(request: Request) -> Dict[str, str]:
+    """Validator headers for a read-only endpoint over the current dataset version.
+
+    The ETag covers the dataset version, the URL and the headers that pick
+    the representation, so every format and encoding gets its own tag.
+    """
+    key = "|".join([
+        data_loader.dataset_version(),
+        request.url.path,
+        str(sorted(request.query_params.multi_items())),
+        request.headers.get("accept", ""),
+        request.headers.get("accept-encoding", ""),
+    ])
+    etag = '"' + hashlib.blake2b(key.encode(), digest_size=12).hexdigest() + '"'
+    # no-cache: browsers keep the body but revalidate on every use
+    return {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+
+def not_modified(request: Request, response: Response) -> Optional[Response]:
+    """A 304 response when the client already holds this version, else None.
+
+    The validator headers are set on `response` for the normal path;
+    endpoints that build their own Response pass etag_headers() to it.
+    """
+    headers = etag_headers(request)
+    candidates = request.headers.get("if-none-match", "")
+    # If-None-Match uses weak comparison, so W/ prefixes added by proxies still match
+    tags = [tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip() for tag in candidates.split(",")]
+    if candidates.strip() == "*" or headers["ETag"] in tags:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -1,58 +1,141 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
 from typing import List, Optional
 from models.data_models import EmbeddingPoint, SelectionRequest, SelectionResponse
+from api.annotations import MAX_PAGE_SIZE, parse_fields
+from api.conditional import etag_headers, not_modified
 from services.data_loader import data_loader
+from services.annotation_query import annotation_query, SORT_KEYS
+from services.stats_service import stats_service
+from services.point_codec import POINTS_MEDIA_TYPE
+from services.tile_service import tile_service
 
 router = APIRouter()
 
-@router.get("/embeddings", response_model=List[EmbeddingPoint])
-async def get_embeddings(class_name: Optional[str] = Query(None, description="Filter by class name")):
-    """Get all embedding points or filtered by class"""
-    if data_loader.embeddings is None:
-        # Try to load data if not already loaded
-        data_loader.load_all()
+FORMAT_DESCRIPTION = "Response format: 'json' or 'binary' (packed typed arrays)"
+
+def _points_response(request: Request, class_name: Optional[str], format: Optional[str]):
+    """Serve points as JSON, or packed binary when asked via ?format= or Accept"""
+    if format not in (None, "json", "binary"):
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
         
-    points = data_loader.get_embedding_points(class_filter=class_name)
-    return points
+    accept = request.headers.get("accept", "")
+    if format == "binary" or (format is None and POINTS_MEDIA_TYPE in accept):
+        return Response(
+            content=data_loader.get_embedding_points_binary(class_filter=class_name),
+            media_type=POINTS_MEDIA_TYPE,
+            headers=etag_headers(request)
+        )
         
+    return data_loader.get_embedding_points(class_filter=class_name)
 
-@router.get("/embeddings/{class_name}", response_model=List[EmbeddingPoint])
-async def get_embeddings_by_class(class_name: str):
-    """Get embedding points filtered by specific class"""
+@router.get("/embeddings", response_model=List[EmbeddingPoint])
+async def get_embeddings(request: Request, response: Response,
+                         class_name: Optional[str] = Query(None, description="Filter by class name"),
+                         format: Optional[str] = Query(None, description=FORMAT_DESCRIPTION),
+                         sort: str = Query('id', description=f"Sort key when paging: {', '.join(SORT_KEYS)}"),
+                         order: str = Query('asc', pattern='^(asc|desc)$'),
+                         min_score: Optional[float] = None, max_score: Optional[float] = None,
+                         min_area: Optional[float] = None, max_area: Optional[float] = None,
+                         limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE,
+                                                      description="Page size; pages are JSON only"),
+                         cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+                         offset: Optional[int] = Query(None, ge=0),
+                         fields: Optional[str] = Query(None, description="Comma-separated fields to return")):
+    """Get all embedding points or filtered by class, or one page of them when limit or cursor is given"""
     if data_loader.embeddings is None:
+        # Try to load data if not already loaded
         data_loader.load_all()
         
-    points = data_loader.get_embedding_points(class_filter=class_name)
-    return points
+    cached = not_modified(request, response)
+    if cached:
+        return cached
         
-@router.post("/selection", response_model=SelectionResponse)
-async def get_selection(selection: SelectionRequest):
-    """Get annotation IDs within the selection rectangle"""
-    annotation_ids = data_loader.get_annotations_in_selection(
-        selection.x_min, selection.x_max,
-        selection.y_min, selection.y_max
-    )
+    if limit is None and cursor is None and offset is None:
+        return _points_response(request, class_name, format)
         
-    return SelectionResponse(annotation_ids=annotation_ids)
+    if format == "binary":
+        raise HTTPException(status_code=400, detail="Paged embeddings are only available as JSON")
+    try:
+        page = annotation_query.page(
+            sort=sort, descending=order == 'desc', class_filter=class_name,
+            min_score=min_score, max_score=max_score, min_area=min_area, max_area=max_area,
+            points_only=True, limit=limit or MAX_PAGE_SIZE, cursor=cursor, offset=offset, fields=parse_fields(fields)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # A page is {items, next_cursor, total}, not the plain point list
+    return JSONResponse(page, headers=etag_headers(request))
         
+
 @router.get("/embeddings/stats")
-async def get_embedding_stats():
+async def get_embedding_stats(request: Request, response: Response):
     """Get statistics about embeddings"""
     if data_loader.embeddings is None:
         data_loader.load_all()
         
-    points = data_loader.get_embedding_points()
-    
-    # Calculate stats
-    class_counts = {}
-    for point in points:
-        class_name = point['class_name']
-        class_counts[class_name] = class_counts.get(class_name, 0) + 1
+    cached = not_modified(request, response)
+    if cached:
+        return cached
         
-    total_points = len(points)
+    # Calculate stats
+    class_counts = stats_service.class_counts(points_only=True)
+    total_points = sum(class_counts.values())
     
     return {
         'total_points': total_points,
         'class_counts': class_counts,
-        'embedding_shape': list(data_loader.embeddings.shape) if data_loader.embeddings is not None else None
-    }
\ No newline at end of file
+        'embedding_shape': list(data_loader.embeddings.shape) if data_loader.embeddings is not None else None,
+        'feature_shape': list(data_loader.features.shape) if data_loader.features is not None else None,
+        'feature_dtype': str(data_loader.features.dtype) if data_loader.features is not None else None
+    }
+
+@router.get("/embeddings/tiles/{z}/{x}/{y}")
+async def get_embedding_tile(request: Request, response: Response, z: int, x: int, y: int,
+                             class_name: Optional[str] = Query(None, description="Filter by class name")):
+    """Get a level-of-detail tile: raw points when sparse, per-class density bins when dense"""
+    if data_loader.embeddings is None:
+        data_loader.load_all()
+        
+    cached = not_modified(request, response)
+    if cached:
+        return cached
+        
+    try:
+        return tile_service.get_tile(z, x, y, class_filter=class_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/embeddings/{class_name}", response_model=List[EmbeddingPoint])
+async def get_embeddings_by_class(request: Request, response: Response, class_name: str,
+                                  format: Optional[str] = Query(None, description=FORMAT_DESCRIPTION)):
+    """Get embedding points filtered by specific class"""
+    if data_loader.embeddings is None:
+        data_loader.load_all()
+        
+    cached = not_modified(request, response)
+    if cached:
+        return cached
+        
+    return _points_response(request, class_name, format)
+        
+@router.post("/selection", response_model=SelectionResponse)
+async def get_selection(selection: SelectionRequest):
+    """Get annotation IDs within the selection rectangle or lasso polygon"""
+    rect = (selection.x_min, selection.x_max, selection.y_min, selection.y_max)
+    if selection.polygon is not None:
+        if len(selection.polygon) < 3 or any(len(vertex) != 2 for vertex in selection.polygon):
+            raise HTTPException(status_code=400, detail="Polygon needs at least 3 [x, y] vertices")
+    elif any(bound is None for bound in rect):
+        raise HTTPException(status_code=400, detail="Selection needs a rectangle or a polygon")
+        
+    if data_loader.index is None:
+        data_loader.load_all()
+        
+    annotation_ids = data_loader.get_annotations_in_selection(
+        *rect,
+        class_filter=selection.class_name,
+        polygon=selection.polygon
+    )
+        
+    return SelectionResponse(annotation_ids=annotation_ids)
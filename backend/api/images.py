@@ -1,38 +1,100 @@
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, HTTPException, Query, Response
 from fastapi.responses import StreamingResponse
+from typing import Optional
 import io
-from services.image_service import image_service
+from models.data_models import CropBatchRequest
+from services.crop_bundle import BUNDLE_MEDIA_TYPE, SPRITE_MEDIA_TYPE, encode_bundle, encode_sprite
+from services.data_loader import data_loader
+from services.executors import PoolSaturatedError, cpu_pool
+from services.image_service import image_service, CROP_FORMATS
 
 router = APIRouter()
 
+MAX_BATCH_CROPS = 1000
+
+@router.get("/crop/cache/stats")
+async def get_crop_cache_stats():
+    """Get crop cache hit/miss/eviction counters"""
+    return image_service.get_cache_stats()
+
 @router.get("/crop/{annotation_id}")
-async def get_cropped_image(annotation_id: int):
+async def get_cropped_image(annotation_id: int,
+                            padding: int = Query(10, ge=0, le=512, description="Padding around the bbox in pixels"),
+                            size: Optional[int] = Query(None, ge=8, le=1024, description="Fit into a size x size thumbnail"),
+                            format: str = Query("jpeg", description="Output format: jpeg, webp or png")):
     """Get cropped image for a specific annotation"""
+    if format not in CROP_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+        
     try:
+        if not data_loader.annotations:
+            data_loader.load_all()
+            
         # Get cropped image bytes
-        image_bytes = image_service.crop_detection(annotation_id)
+        crops = await image_service.crop_detections_async([annotation_id], padding=padding, size=size, format=format)
+        image_bytes = crops[annotation_id]
+        media_type = CROP_FORMATS[format][1]
         
         if image_bytes is None:
             # Return placeholder if cropping fails
             image_bytes = image_service.create_placeholder_image()
+            media_type = "image/jpeg"
             
         # Return as streaming response
         return StreamingResponse(
             io.BytesIO(image_bytes),
-            media_type="image/jpeg",
+            media_type=media_type,
             headers={"Cache-Control": "max-age=3600"}  # Cache for 1 hour
         )
         
+    except PoolSaturatedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting cropped image: {str(e)}")
 
+@router.post("/crops")
+async def get_cropped_images(request: CropBatchRequest):
+    """Get crops for many annotations in one response, as a bundle or a sprite sheet"""
+    if not request.annotation_ids:
+        raise HTTPException(status_code=400, detail="No annotation IDs provided")
+    if len(request.annotation_ids) > MAX_BATCH_CROPS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_CROPS} crops per request")
+    if request.format not in CROP_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {request.format}")
+    if request.layout not in ("bundle", "sprite"):
+        raise HTTPException(status_code=400, detail=f"Unsupported layout: {request.layout}")
+    if not 8 <= request.size <= 1024 or not 0 <= request.padding <= 512:
+        raise HTTPException(status_code=400, detail="Size must be in [8, 1024] and padding in [0, 512]")
+        
+    try:
+        if not data_loader.annotations:
+            data_loader.load_all()
+            
+        if request.layout == "sprite":
+            image_bytes, manifest = await cpu_pool.run(
+                image_service.render_sprite,
+                request.annotation_ids, request.size, padding=request.padding, format=request.format
+            )
+            return Response(content=encode_sprite(image_bytes, manifest), media_type=SPRITE_MEDIA_TYPE)
+            
+        crops = await image_service.crop_detections_async(
+            request.annotation_ids, padding=request.padding, size=request.size, format=request.format
+        )
+        return Response(content=encode_bundle(crops), media_type=BUNDLE_MEDIA_TYPE)
+        
+    except PoolSaturatedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting cropped images: {str(e)}")
+
 @router.get("/crop/{annotation_id}/info")
 async def get_crop_info(annotation_id: int):
     """Get information about the crop for debugging"""
     try:
-        from services.data_loader import data_loader
-        
-        annotation = data_loader.get_annotation_by_id(annotation_id)
+        if not data_loader.annotations:
+            data_loader.load_all()
+            
+        annotation = data_loader.get_annotation_fields(annotation_id)
         if not annotation:
             raise HTTPException(status_code=404, detail="Annotation not found")
             
@@ -48,9 +110,12 @@ async def get_crop_info(annotation_id: int):
             'bbox': bbox,
             'image_path': str(image_path) if image_path else None,
             'image_exists': image_path.exists() if image_path else False,
-            'category_id': annotation.get('category_id')
+            'category_id': annotation.get('category_id'),
+            'image_annotation_count': len(data_loader.get_image_annotation_ids(image_id))
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting crop info: {str(e)}")
 
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException, Query
+from services.profiler import PROFILER_ENABLED, profiler
+
+router = APIRouter()
+
+def _require_enabled():
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=403, detail="Profiler is disabled, start the server with PROFILER_ENABLED=1")
+
+@router.get("/profiler")
+async def get_profiler_status():
+    """Whether the sampling profiler is enabled and running"""
+    return profiler.status()
+
+@router.post("/profiler/start")
+async def start_profiler(interval_ms: float = Query(5.0, ge=1.0, le=1000.0, description="Sampling interval"),
+                         seconds: float = Query(60.0, gt=0, le=300, description="Stop automatically after this long")):
+    """Start sampling the stacks of this worker process"""
+    _require_enabled()
+    try:
+        return profiler.start(interval=interval_ms / 1000.0, seconds=seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.post("/profiler/stop")
+async def stop_profiler(limit: int = Query(50, ge=1, le=1000, description="Stacks and functions to return")):
+    """Stop sampling and return the hottest stacks and functions"""
+    _require_enabled()
+    return profiler.stop(limit)
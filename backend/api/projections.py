@@ -0,0 +1,58 @@
+from fastapi import APIRouter, HTTPException
+from models.data_models import ProjectionJobResponse, ProjectionRequest
+from services.data_loader import data_loader
+from services.executors import PoolSaturatedError, io_pool, job_pool
+from services.projection_service import projection_service
+
+router = APIRouter()
+
+@router.post("/projections", response_model=ProjectionJobResponse, status_code=202)
+async def start_projection(request: ProjectionRequest):
+    """Start a background job computing a 2D layout from the high-dimensional embeddings"""
+    try:
+        if not data_loader.annotations:
+            data_loader.load_all()
+            
+        job = projection_service.create_job(request.method, request.class_name, request.params, request.apply)
+        job_pool.spawn(projection_service.run_job, job)
+        return job.to_dict()
+        
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Class not found: {request.class_name}")
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PoolSaturatedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting projection: {str(e)}")
+
+@router.get("/projections")
+async def list_projections():
+    """Get the layout currently shown and recent projection jobs, newest first"""
+    return {
+        'current': data_loader.projection,
+        'jobs': [job.to_dict() for job in projection_service.list_jobs()],
+    }
+
+@router.get("/projections/{job_id}", response_model=ProjectionJobResponse)
+async def get_projection(job_id: str):
+    """Get the status of a projection job"""
+    job = projection_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Projection job not found")
+    return job.to_dict()
+
+@router.post("/projections/reset")
+async def reset_projection():
+    """Show the precomputed layout from embeddings_2d.npy again"""
+    try:
+        if not data_loader.annotations:
+            data_loader.load_all()
+            
+        await io_pool.run(data_loader.reset_embeddings)
+        return {'success': True, 'embedding_shape': list(data_loader.embeddings.shape)}
+        
+    except PoolSaturatedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error resetting projection: {str(e)}")
@@ -0,0 +1,84 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from models.data_models import NeighborBatchResponse, NeighborRequest, NeighborResponse, OutlierResponse
+from services.data_loader import data_loader
+from services.executors import PoolSaturatedError, cpu_pool
+from services.neighbor_service import neighbor_service
+from services.outlier_service import SCORE_FIELDS, outlier_service
+
+router = APIRouter()
+
+MAX_NEIGHBORS = 1000
+MAX_NEIGHBOR_QUERIES = 256
+MAX_OUTLIERS_PAGE = 1000
+
+def _require_features():
+    if not data_loader.annotations:
+        data_loader.load_all()
+    if not data_loader.has_features():
+        raise HTTPException(status_code=400, detail="High-dimensional embeddings not available (data/embeddings.npy)")
+
+@router.get("/neighbors/{annotation_id}", response_model=NeighborResponse)
+async def get_neighbors(annotation_id: int,
+                        k: int = Query(50, ge=1, le=MAX_NEIGHBORS, description="Number of neighbours"),
+                        class_name: Optional[str] = Query(None, description="Only return neighbours of this class"),
+                        exact: bool = Query(False, description="Force exact search on large datasets")):
+    """Get the annotations most similar to one annotation in the original embedding space"""
+    try:
+        _require_features()
+        results = await cpu_pool.run(neighbor_service.search, [annotation_id], k, class_name, exact)
+        if annotation_id not in results:
+            raise HTTPException(status_code=404, detail="Annotation not found or has no embedding")
+            
+        return NeighborResponse(annotation_id=annotation_id, neighbors=results[annotation_id])
+        
+    except (HTTPException, PoolSaturatedError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching neighbors: {str(e)}")
+
+@router.post("/neighbors", response_model=NeighborBatchResponse)
+async def get_neighbors_batch(request: NeighborRequest):
+    """Get neighbours for several annotations in one search; unknown IDs are omitted"""
+    if not request.annotation_ids:
+        raise HTTPException(status_code=400, detail="No annotation IDs provided")
+    if len(request.annotation_ids) > MAX_NEIGHBOR_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_NEIGHBOR_QUERIES} queries per request")
+    if not 1 <= request.k <= MAX_NEIGHBORS:
+        raise HTTPException(status_code=400, detail=f"k must be in [1, {MAX_NEIGHBORS}]")
+        
+    try:
+        _require_features()
+        results = await cpu_pool.run(neighbor_service.search, request.annotation_ids,
+                                     request.k, request.class_name, request.exact)
+        return NeighborBatchResponse(results=[
+            NeighborResponse(annotation_id=aid, neighbors=results[aid])
+            for aid in dict.fromkeys(request.annotation_ids) if aid in results
+        ])
+        
+    except (HTTPException, PoolSaturatedError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching neighbors: {str(e)}")
+
+@router.get("/outliers", response_model=OutlierResponse)
+async def get_outliers(class_name: Optional[str] = Query(None, description="Rank within this class only"),
+                       top_k: int = Query(100, ge=1, le=MAX_OUTLIERS_PAGE, description="Page size"),
+                       offset: int = Query(0, ge=0, description="Skip this many ranked annotations"),
+                       sort: str = Query("score", description="Rank by: " + ", ".join(SCORE_FIELDS))):
+    """Get live annotations ranked by outlier score, most suspicious first"""
+    if sort not in SCORE_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort field: {sort}")
+        
+    try:
+        if not data_loader.annotations:
+            data_loader.load_all()
+            
+        return await cpu_pool.run(outlier_service.get_outliers, class_name, top_k, offset, sort)
+        
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Class not found: {class_name}")
+    except PoolSaturatedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error scoring outliers: {str(e)}")
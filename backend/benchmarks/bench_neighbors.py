@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark exact vs IVF nearest-neighbour search: recall against latency.
+
+Generates clustered synthetic embeddings (or memory-maps an existing
+.npy), takes exact blocked brute-force results as ground truth and
+reports recall@k and per-query latency of the IVF index for each
+n_probe setting.
+
+    python benchmarks/bench_neighbors.py --rows 200000 --dim 256 --probes 1 4 16 64
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from services.vector_index import BruteForceIndex, IVFIndex, inverse_norms
+
+def make_embeddings(path: Path, rows: int, dim: int, clusters: int, seed: int = 0):
+    """Write float16 vectors drawn around random cluster centres"""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32) * 3
+    vectors = np.lib.format.open_memmap(path, mode='w+', dtype=np.float16, shape=(rows, dim))
+    for start in range(0, rows, 65536):
+        count = min(65536, rows - start)
+        labels = rng.integers(0, clusters, size=count)
+        vectors[start:start + count] = centres[labels] + rng.normal(size=(count, dim)).astype(np.float32)
+    vectors.flush()
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embeddings", type=Path, help="N x D .npy to search (default: synthetic)")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--lists", type=int, help="IVF cells (default: sqrt(rows))")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--output", type=Path, help="Write JSON results here as well")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.embeddings
+        if path is None:
+            path = Path(tmp) / "embeddings.npy"
+            make_embeddings(path, args.rows, args.dim, args.clusters)
+        features = np.load(path, mmap_mode='r')
+        fetch = lambda rows: np.asarray(features[rows], dtype=np.float32)
+        rows = np.arange(len(features))
+
+        start = time.perf_counter()
+        inv_norms = inverse_norms(fetch, rows, len(rows))
+        norms_s = time.perf_counter() - start
+
+        rng = np.random.default_rng(1)
+        query_rows = np.sort(rng.choice(rows, size=min(args.queries, len(rows)), replace=False))
+        queries = fetch(query_rows) * inv_norms[query_rows][:, None]
+
+        exact_times = []
+        truth = []
+        brute = BruteForceIndex(fetch, inv_norms)
+        for query in queries:
+            start = time.perf_counter()
+            found, _ = brute.search(query[None, :], rows, args.k)
+            exact_times.append(time.perf_counter() - start)
+            truth.append(set(found[0].tolist()))
+        start = time.perf_counter()
+        brute.search(queries, rows, args.k)
+        batched_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ivf = IVFIndex(fetch, inv_norms, rows, n_lists=args.lists)
+        build_s = time.perf_counter() - start
+
+        results = []
+        for n_probe in args.probes:
+            times, recalls = [], []
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                found, _ = ivf.search(query[None, :], args.k, n_probe=n_probe)
+                times.append(time.perf_counter() - start)
+                recalls.append(len(expected & set(found[0].tolist())) / len(expected))
+            results.append({
+                'n_probe': n_probe,
+                'recall_mean': float(np.mean(recalls)),
+                'recall_min': float(np.min(recalls)),
+                'p50_ms': percentile_ms(times, 50),
+                'p95_ms': percentile_ms(times, 95),
+                'speedup_p50': float(np.median(exact_times) / np.median(times)),
+            })
+
+    report = {
+        'embeddings': str(args.embeddings or f'synthetic {args.rows}x{args.dim} float16'),
+        'rows': int(len(rows)), 'dim': int(features.shape[1]), 'k': args.k, 'queries': len(queries),
+        'norms_s': norms_s,
+        'exact_p50_ms': percentile_ms(exact_times, 50),
+        'exact_p95_ms': percentile_ms(exact_times, 95),
+        'exact_batched_ms_per_query': batched_s * 1000 / len(queries),
+        'ivf_lists': ivf.n_lists, 'ivf_build_s': build_s,
+        'ivf': results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
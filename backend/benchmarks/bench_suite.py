@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot paths of the backend on a real or synthetic dataset.
+
+Runs dataset loading (cold, rebuilding the dataset cache, and warm),
+embedding point listing, rectangle selection, crop rendering (cold and
+cached), removal and undo, and end-to-end HTTP requests through
+FastAPI's test client. Each benchmark reports latency percentiles,
+throughput, the peak Python allocation of one call and the process's
+resident memory; the report is JSON.
+
+Without --root a dataset of the given --scale is generated into a
+temporary directory (see generate_dataset.py). With --root the dataset
+under <root>/data is benchmarked through a temporary working copy: the
+source files are linked into it, its removal log is copied, and every
+cache, log and state file the benchmarks write stays in the copy, so
+the dataset itself is never modified.
+
+    python benchmarks/bench_suite.py --scale medium --output results.json
+    python benchmarks/bench_suite.py --root /data/session --only load_all_warm http_embeddings
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import generate_dataset
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def summarize(name: str, times: List[float], items: int = 0, peak_alloc: Optional[int] = None) -> Dict:
+    """Latency percentiles and throughput of one benchmark"""
+    times = np.asarray(times)
+    total = float(times.sum())
+    result = {
+        'name': name,
+        'runs': len(times),
+        'mean_ms': float(times.mean() * 1000),
+        'min_ms': float(times.min() * 1000),
+        'p50_ms': float(np.percentile(times, 50) * 1000),
+        'p90_ms': float(np.percentile(times, 90) * 1000),
+        'p99_ms': float(np.percentile(times, 99) * 1000),
+        'max_ms': float(times.max() * 1000),
+        'ops_per_s': len(times) / total if total else None,
+        'items_per_call': items,
+        'items_per_s': items * len(times) / total if total and items else None,
+        'peak_alloc_bytes': peak_alloc,
+        'rss_bytes': rss_bytes(),
+        'peak_rss_bytes': peak_rss_bytes(),
+    }
+    print(f"{name:32s} p50 {result['p50_ms']:10.3f} ms  p99 {result['p99_ms']:10.3f} ms  ({len(times)} runs)",
+          file=sys.stderr)
+    return result
+
+def measure(name: str, fn: Callable[[], Optional[int]], repeats: int,
+            setup: Optional[Callable[[], None]] = None) -> Dict:
+    """Time fn `repeats` times after one untimed call that records its peak allocation.
+
+    `setup` runs untimed before every call, e.g. to clear a cache. fn may
+    return the number of items it produced, for items_per_s.
+    """
+    if setup:
+        setup()
+    tracemalloc.start()
+    items = fn() or 0
+    peak_alloc = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    times = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return summarize(name, times, items, peak_alloc)
+
+# Read-only inputs, linked into the working copy; anything else the server writes goes to the copy
+LINKED_FILES = ("embeddings_2d.npy", "embeddings.npy", "annotations.json", "mapping.json", "images", "thumbnail_atlas")
+# Small and appended to by the benchmarks, so copied
+COPIED_FILES = ("removal_log.jsonl",)
+
+def working_copy(source_root: Path, target_root: Path) -> Path:
+    """A dataset root whose data/ links to the source files, so benchmarks cannot modify the source"""
+    source, target = source_root / "data", target_root / "data"
+    target.mkdir(parents=True)
+    for name in LINKED_FILES:
+        if (source / name).exists():
+            (target / name).symlink_to((source / name).resolve())
+    for name in COPIED_FILES:
+        if (source / name).exists():
+            shutil.copy2(source / name, target / name)
+    return target_root
+
+def _load_in_child(root: str, cold: bool, repeats: int, queue):
+    """Run in a fresh process so peak_rss_bytes belongs to loading alone"""
+    os.chdir(root)
+    from services.data_loader import DataLoader
+    times = []
+    for _ in range(repeats):
+        loader = DataLoader("data")
+        if cold:
+            shutil.rmtree(loader.dataset_cache.cache_dir, ignore_errors=True)
+        start = time.perf_counter()
+        loader.load_all()
+        times.append(time.perf_counter() - start)
+        rows = len(loader.get_index().annotation_ids)
+        del loader
+    queue.put(summarize('load_all_cold' if cold else 'load_all_warm', times, rows))
+
+def bench_load(root: Path, cold: bool, repeats: int) -> Dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_load_in_child, args=(str(root), cold, repeats, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def bench_in_process(args, rng: np.random.Generator) -> List[Dict]:
+    """Benchmarks against the server's own module-level services"""
+    from fastapi.testclient import TestClient
+    from services.coco_service import coco_service
+    from services.data_loader import data_loader
+    from services.image_service import image_service
+    import main
+
+    data_loader.load_all()
+    index = data_loader.get_index()
+    ids = index.annotation_ids
+    points = np.asarray(data_loader.embeddings, dtype=np.float32)
+    low, high = points.min(axis=0), points.max(axis=0)
+    results = []
+
+    def wanted(name: str) -> bool:
+        return not args.only or name in args.only
+
+    def random_rectangle(share: float):
+        """Rectangle covering about `share` of the extent of the 2D view"""
+        size = (high - low) * np.sqrt(share)
+        corner = low + rng.random(2) * (high - low - size)
+        return float(corner[0]), float(corner[0] + size[0]), float(corner[1]), float(corner[1] + size[1])
+
+    if wanted('get_embedding_points'):
+        results.append(measure('get_embedding_points', lambda: len(data_loader.get_embedding_points()),
+                               args.repeats))
+    if wanted('get_embedding_points_binary'):
+        results.append(measure('get_embedding_points_binary',
+                               lambda: len(data_loader.get_embedding_points_binary()), args.repeats))
+    for share in (0.01, 0.25):
+        name = f'get_annotations_in_selection_{int(share * 100)}pct'
+        if wanted(name):
+            rectangles = iter([random_rectangle(share) for _ in range(args.repeats + 1)])
+            results.append(measure(name, lambda: len(data_loader.get_annotations_in_selection(*next(rectangles))),
+                                   args.repeats))
+
+    crop_ids = rng.choice(ids, size=min(args.crops, len(ids)), replace=False).tolist()
+    if not (Path("data") / "images").exists():
+        print("No data/images, skipping crop benchmarks", file=sys.stderr)
+    else:
+        def clear_crop_caches():
+            image_service.crop_cache.clear()
+            image_service.image_cache.clear()
+        if wanted('crop_detection_cold'):
+            cold_ids = iter(crop_ids * 2)
+            results.append(measure('crop_detection_cold',
+                                   lambda: image_service.crop_detection(next(cold_ids), size=args.crop_size) and 1,
+                                   min(args.repeats, len(crop_ids) - 1), setup=clear_crop_caches))
+        if wanted('crop_detection_cached'):
+            clear_crop_caches()
+            for aid in crop_ids:
+                image_service.crop_detection(aid, size=args.crop_size)
+            warm_ids = iter(crop_ids * (args.repeats // len(crop_ids) + 2))
+            results.append(measure('crop_detection_cached',
+                                   lambda: image_service.crop_detection(next(warm_ids), size=args.crop_size) and 1,
+                                   args.repeats))
+        if wanted('crop_detections_batch'):
+            results.append(measure('crop_detections_batch',
+                                   lambda: len(image_service.crop_detections(crop_ids, size=args.crop_size)),
+                                   max(1, args.repeats // 10), setup=clear_crop_caches))
+
+    if wanted('remove_annotations_by_ids') or wanted('undo_removal'):
+        batches = [rng.choice(ids, size=min(args.remove_batch, len(ids)), replace=False).tolist()
+                   for _ in range(args.repeats + 1)]
+        remove_times, undo_times = [], []
+        for batch in batches[:-1]:
+            start = time.perf_counter()
+            coco_service.remove_annotations_by_ids(batch)
+            remove_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            coco_service.undo_removal()
+            undo_times.append(time.perf_counter() - start)
+        tracemalloc.start()
+        removed = coco_service.remove_annotations_by_ids(batches[-1])['removed_count']
+        peak_alloc = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        coco_service.undo_removal()
+        results.append(summarize('remove_annotations_by_ids', remove_times, removed, peak_alloc))
+        results.append(summarize('undo_removal', undo_times, removed))
+
+    client = TestClient(main.app)
+
+    def request(method: str, url: str, **kwargs) -> Callable[[], int]:
+        def call():
+            response = client.request(method, url, **kwargs)
+            if response.status_code >= 400:
+                response.raise_for_status()
+            return len(response.content)
+        return call
+
+    def get(url: str, **kwargs) -> Callable[[], int]:
+        return request("GET", url, **kwargs)
+
+    x_min, x_max, y_min, y_max = random_rectangle(0.05)
+    http = {
+        'http_embeddings': get("/api/embeddings"),
+        'http_embeddings_binary': get("/api/embeddings?format=binary"),
+        'http_embeddings_page': get("/api/embeddings?limit=1000"),
+        'http_embeddings_not_modified': None,
+        'http_classes': get("/api/classes"),
+        'http_annotations_stats': get("/api/annotations/stats"),
+        'http_annotations_page': get("/api/annotations?sort=score&order=desc&limit=100"),
+        'http_selection': request("POST", "/api/selection", json={
+            'x_min': x_min, 'x_max': x_max, 'y_min': y_min, 'y_max': y_max}),
+    }
+    etag = client.get("/api/embeddings").headers.get("etag")
+    http['http_embeddings_not_modified'] = get("/api/embeddings", headers={"If-None-Match": etag or ""})
+    if (Path("data") / "images").exists():
+        crop_urls = iter([f"/api/crop/{aid}?size={args.crop_size}" for aid in crop_ids] * (args.repeats + 2))
+        http['http_crop'] = lambda: len(client.get(next(crop_urls)).content)
+    for name, call in http.items():
+        if wanted(name):
+            results.append(measure(name, call, args.http_repeats))
+    return results
+
+def environment() -> Dict:
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", type=Path, help="Dataset root containing data/ (default: generate one)")
+    parser.add_argument("--scale", choices=sorted(generate_dataset.SCALES), default='small',
+                        help="Size of the generated dataset")
+    parser.add_argument("--keep", type=Path, help="Generate the dataset here and keep it, instead of a temp dir")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed calls per in-process benchmark")
+    parser.add_argument("--http-repeats", type=int, default=20, help="Timed requests per HTTP benchmark")
+    parser.add_argument("--load-repeats", type=int, default=3, help="Timed loads per load benchmark")
+    parser.add_argument("--crops", type=int, default=200, help="Distinct annotations to crop")
+    parser.add_argument("--crop-size", type=int, default=128)
+    parser.add_argument("--remove-batch", type=int, default=1000, help="Annotations per removal")
+    parser.add_argument("--only", nargs="+", help="Run only these benchmarks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write JSON results here as well")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = args.root
+        dataset = {'root': str(source)} if source else None
+        if source is None:
+            source = args.keep or Path(tmp) / "dataset"
+            generate_args = generate_dataset.build_parser().parse_args([str(source), "--scale", args.scale])
+            dataset = generate_dataset.generate(source, generate_dataset.resolve_counts(generate_args))
+        if not (source / "data" / "annotations.json").exists():
+            parser.error(f"No dataset in {source / 'data'}")
+        root = working_copy(source.resolve(), Path(tmp) / "work")
+
+        results = []
+        wanted_loads = [cold for cold in (True, False)
+                        if not args.only or ('load_all_cold' if cold else 'load_all_warm') in args.only]
+        if wanted_loads == [False]:
+            # Untimed load that builds the working copy's dataset cache, so warm loads are warm
+            bench_load(root, False, 1)
+        for cold in wanted_loads:
+            results.append(bench_load(root, cold, 1 if cold else args.load_repeats))
+
+        os.chdir(root)
+        try:
+            results.extend(bench_in_process(args, np.random.default_rng(args.seed)))
+        finally:
+            os.chdir(BACKEND_DIR)
+
+    report = {'dataset': dataset, 'environment': environment(), 'settings': {
+        'repeats': args.repeats, 'http_repeats': args.http_repeats, 'load_repeats': args.load_repeats,
+        'crops': args.crops, 'crop_size': args.crop_size, 'remove_batch': args.remove_batch, 'seed': args.seed,
+    }, 'results': results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark full-resolution vs reduced-scale JPEG decoding for thumbnails.
+
+Renders crops of random boxes from a large JPEG both ways, each with a
+cold decode, and reports latency and PSNR of the reduced thumbnails
+against the full-resolution ones.
+
+    python benchmarks/bench_thumbnail_decode.py --sizes 64 128 256
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from services.image_service import _crop_array, _decode_image, _reduction_factor
+
+def make_test_image(path: Path, width: int, height: int, seed: int = 0):
+    """Write a textured JPEG so the decoder does realistic work"""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        127 + 80 * np.sin(xx / 37.0) * np.cos(yy / 53.0),
+        127 + 80 * np.sin((xx + yy) / 71.0),
+        127 + 80 * np.cos(xx / 19.0 + yy / 29.0),
+    ], axis=-1)
+    noise = rng.normal(0, 3, size=base.shape)
+    cv2.imwrite(str(path), np.clip(base + noise, 0, 255).astype(np.uint8), [cv2.IMWRITE_JPEG_QUALITY, 90])
+
+def random_boxes(count: int, width: int, height: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    boxes = []
+    for i in range(count):
+        w, h = rng.integers(100, 600, size=2)
+        x, y = rng.integers(0, width - w), rng.integers(0, height - h)
+        boxes.append({'id': i, 'bbox': [float(x), float(y), float(w), float(h)]})
+    return boxes
+
+def psnr(a: np.ndarray, b: np.ndarray) -> float:
+    if a.shape != b.shape:
+        b = cv2.resize(b, (a.shape[1], a.shape[0]), interpolation=cv2.INTER_AREA)
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float('inf') if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse))
+
+def render(image_path: Path, box: dict, padding: int, size: int, reduced: bool):
+    factor = _reduction_factor(image_path, [box], padding, size) if reduced else 1
+    image = _decode_image(str(image_path), factor)
+    thumb = _crop_array(image, box, padding, size, factor)
+    cv2.imencode('.jpg', thumb, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return thumb, factor
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", type=Path, help="JPEG to crop from (default: synthetic 3840x2160)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 128, 256])
+    parser.add_argument("--crops", type=int, default=30, help="Random boxes per size")
+    parser.add_argument("--padding", type=int, default=10)
+    parser.add_argument("--output", type=Path, help="Write JSON results here as well")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = args.image
+        if image_path is None:
+            image_path = Path(tmp) / "synthetic_4k.jpg"
+            make_test_image(image_path, 3840, 2160)
+        height, width = cv2.imread(str(image_path)).shape[:2]
+        boxes = random_boxes(args.crops, width, height)
+
+        results = []
+        for size in args.sizes:
+            full_times, reduced_times, scores, factors = [], [], [], []
+            for box in boxes:
+                start = time.perf_counter()
+                full, _ = render(image_path, box, args.padding, size, reduced=False)
+                full_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                reduced, factor = render(image_path, box, args.padding, size, reduced=True)
+                reduced_times.append(time.perf_counter() - start)
+
+                scores.append(psnr(full, reduced))
+                factors.append(factor)
+
+            results.append({
+                'size': size,
+                'full_p50_ms': percentile_ms(full_times, 50),
+                'full_p95_ms': percentile_ms(full_times, 95),
+                'reduced_p50_ms': percentile_ms(reduced_times, 50),
+                'reduced_p95_ms': percentile_ms(reduced_times, 95),
+                'speedup_p50': float(np.median(full_times) / np.median(reduced_times)),
+                'mean_reduction_factor': float(np.mean(factors)),
+                'psnr_db_mean': float(np.mean([s for s in scores if np.isfinite(s)] or [float('inf')])),
+                'psnr_db_min': float(np.min(scores)),
+            })
+
+    report = {'image': str(args.image or 'synthetic 3840x2160'), 'width': width, 'height': height,
+              'crops_per_size': args.crops, 'results': results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic dataset in the layout the server reads.
+
+Writes <output>/data/embeddings_2d.npy, annotations.json, mapping.json
+and JPEG images (optionally embeddings.npy) with detections clustered
+by class in the 2D view. Everything is streamed to disk in chunks, so
+the largest scales fit in a few hundred MB of memory. The same seed
+always gives the same files; images that already exist are kept, so an
+interrupted run can be restarted.
+
+    python benchmarks/generate_dataset.py /tmp/bench --scale medium
+    python benchmarks/generate_dataset.py /tmp/bench --detections 250000 --images 20000 --no-images
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# name -> (detections, images)
+SCALES = {
+    'small': (10_000, 1_000),
+    'medium': (100_000, 10_000),
+    'large': (1_000_000, 50_000),
+    'xlarge': (5_000_000, 100_000),
+}
+
+CHUNK_ROWS = 262144
+IMAGES_PER_TASK = 256
+FIRST_ANNOTATION_ID = 1_000_000
+
+def chunk_rng(seed: int, stream: int, chunk: int) -> np.random.Generator:
+    """Independent generator per output and chunk, so chunking does not change the data"""
+    return np.random.default_rng([seed, stream, chunk])
+
+def class_weights(classes: int) -> np.ndarray:
+    # Long-tailed like real detection sets: a few classes dominate
+    weights = 1.0 / np.arange(1, classes + 1) ** 0.8
+    return weights / weights.sum()
+
+def detection_columns(start: int, count: int, args) -> dict:
+    """Class, image, box and score of detections [start, start + count)"""
+    rng = chunk_rng(args.seed, 1, start // CHUNK_ROWS)
+    width, height = args.image_width, args.image_height
+    w = np.clip(rng.lognormal(np.log(width / 8), 0.6, count), 8, width - 1)
+    h = np.clip(w * rng.lognormal(0, 0.3, count), 8, height - 1)
+    return {
+        'category': rng.choice(args.classes, size=count, p=class_weights(args.classes)) + 1,
+        'image': rng.integers(1, args.images + 1, size=count),
+        'bbox': np.stack([rng.uniform(0, width - w), rng.uniform(0, height - h), w, h], axis=1).round(1),
+        'score': rng.beta(5, 2, size=count).round(4),
+    }
+
+def write_annotations(path: Path, args) -> np.ndarray:
+    """Stream annotations.json; returns the category of every detection"""
+    categories = np.empty(args.detections, dtype=np.int32)
+    with open(path, 'w') as f:
+        f.write('{"info": {"description": "synthetic benchmark dataset"}, "images": [')
+        f.write(", ".join(
+            f'{{"id": {i}, "file_name": "{i:07d}.jpg", "width": {args.image_width}, "height": {args.image_height}}}'
+            for i in range(1, args.images + 1)))
+        f.write('], "categories": [')
+        f.write(", ".join(f'{{"id": {i}, "name": "class_{i:03d}"}}' for i in range(1, args.classes + 1)))
+        f.write('], "annotations": [')
+        for start in range(0, args.detections, CHUNK_ROWS):
+            count = min(CHUNK_ROWS, args.detections - start)
+            columns = detection_columns(start, count, args)
+            categories[start:start + count] = columns['category']
+            rows = zip(range(FIRST_ANNOTATION_ID + start, FIRST_ANNOTATION_ID + start + count),
+                       columns['image'].tolist(), columns['category'].tolist(),
+                       columns['bbox'].tolist(), columns['score'].tolist())
+            records = [f'{{"id": {aid}, "image_id": {image_id}, "category_id": {category}, '
+                       f'"bbox": [{x}, {y}, {w}, {h}], "area": {round(w * h, 1)}, "score": {score}, "iscrowd": 0}}'
+                       for aid, image_id, category, (x, y, w, h), score in rows]
+            f.write((", " if start else "") + ", ".join(records))
+        f.write("]}")
+    return categories
+
+def write_embeddings(data_dir: Path, categories: np.ndarray, rows: np.ndarray, args):
+    """2D points clustered by class, in the row order given by the mapping"""
+    rng = np.random.default_rng([args.seed, 2])
+    centres = rng.uniform(-50, 50, size=(args.classes + 1, 2)).astype(np.float32)
+    points = np.lib.format.open_memmap(data_dir / "embeddings_2d.npy", mode='w+', dtype=np.float32,
+                                       shape=(args.detections, 2))
+    features = None
+    if args.features_dim:
+        feature_centres = rng.normal(size=(args.classes + 1, args.features_dim)).astype(np.float32) * 3
+        features = np.lib.format.open_memmap(data_dir / "embeddings.npy", mode='w+', dtype=np.float16,
+                                             shape=(args.detections, args.features_dim))
+    for start in range(0, args.detections, CHUNK_ROWS):
+        stop = min(args.detections, start + CHUNK_ROWS)
+        chunk = chunk_rng(args.seed, 3, start // CHUNK_ROWS)
+        labels = categories[start:stop]
+        target = rows[start:stop]
+        points[target] = centres[labels] + chunk.normal(0, 4, size=(stop - start, 2)).astype(np.float32)
+        if features is not None:
+            features[target] = feature_centres[labels] + chunk.normal(size=(stop - start, args.features_dim))
+    points.flush()
+    if features is not None:
+        features.flush()
+
+def write_mapping(path: Path, rows: np.ndarray):
+    with open(path, 'w') as f:
+        f.write("{")
+        for start in range(0, len(rows), CHUNK_ROWS):
+            ids = range(FIRST_ANNOTATION_ID + start, FIRST_ANNOTATION_ID + min(len(rows), start + CHUNK_ROWS))
+            f.write((", " if start else "") + ", ".join(
+                f'"{aid}": {row}' for aid, row in zip(ids, rows[start:start + CHUNK_ROWS].tolist())))
+        f.write("}")
+
+def render_images(task):
+    """Draw one batch of images: a textured background with a filled box per detection"""
+    images_dir, image_ids, boxes_by_image, width, height, seed = task
+    rng = np.random.default_rng([seed, 4, int(image_ids[0])])
+    # One texture per batch, shifted per image; computing it per image would dominate the run time
+    yy, xx = np.mgrid[0:2 * height, 0:2 * width].astype(np.float32)
+    texture = np.stack([
+        127 + 60 * np.sin(xx / 41.0) * np.cos(yy / 57.0),
+        127 + 60 * np.sin((xx + yy) / 73.0),
+        127 + 60 * np.cos(xx / 23.0 + yy / 31.0),
+    ], axis=-1)
+    texture = np.clip(texture + rng.normal(0, 4, size=texture.shape), 0, 255).astype(np.uint8)
+    written = 0
+    for image_id in image_ids:
+        # Draw the offsets first so a resumed run renders the same images as a fresh one
+        top, left = rng.integers(0, height), rng.integers(0, width)
+        path = images_dir / f"{image_id:07d}.jpg"
+        if path.exists():
+            continue
+        image = texture[top:top + height, left:left + width].copy()
+        for category, x, y, w, h in boxes_by_image.get(int(image_id), []):
+            colour = tuple(int(c) for c in (37 * category % 256, 91 * category % 256, 151 * category % 256))
+            cv2.rectangle(image, (int(x), int(y)), (int(x + w), int(y + h)), colour, thickness=-1)
+        # Write under another name first so an interrupted run never leaves a truncated JPEG behind
+        temp_path = path.with_name(f".{path.stem}.partial.jpg")
+        cv2.imwrite(str(temp_path), image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        os.replace(temp_path, path)
+        written += 1
+    return written
+
+def write_images(images_dir: Path, args) -> int:
+    images_dir.mkdir(parents=True, exist_ok=True)
+    # Boxes are drawn only for images that still need writing
+    missing = np.array([i for i in range(1, args.images + 1) if not (images_dir / f"{i:07d}.jpg").exists()])
+    if not len(missing):
+        return 0
+    wanted = np.zeros(args.images + 1, dtype=bool)
+    wanted[missing] = True
+    boxes = {}
+    for start in range(0, args.detections, CHUNK_ROWS):
+        columns = detection_columns(start, min(CHUNK_ROWS, args.detections - start), args)
+        for offset in np.flatnonzero(wanted[columns['image']]).tolist():
+            boxes.setdefault(int(columns['image'][offset]), []).append(
+                (int(columns['category'][offset]), *columns['bbox'][offset].tolist()))
+    # Fixed batches over all image ids keep each batch's random stream the same across restarts
+    tasks = []
+    for first in range(1, args.images + 1, IMAGES_PER_TASK):
+        batch = np.arange(first, min(args.images + 1, first + IMAGES_PER_TASK))
+        if wanted[batch].any():
+            tasks.append((images_dir, batch, {int(i): boxes.get(int(i), []) for i in batch if wanted[i]},
+                          args.image_width, args.image_height, args.seed))
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        return sum(pool.map(render_images, tasks))
+
+def generate(output: Path, args) -> dict:
+    data_dir = output / "data"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    timings = {}
+
+    start = time.perf_counter()
+    categories = write_annotations(data_dir / "annotations.json", args)
+    timings['annotations_s'] = time.perf_counter() - start
+
+    # Embedding rows are a permutation of the annotation order, so the mapping is not the identity
+    rows = np.random.default_rng([args.seed, 5]).permutation(args.detections)
+    start = time.perf_counter()
+    write_mapping(data_dir / "mapping.json", rows)
+    write_embeddings(data_dir, categories, rows, args)
+    timings['embeddings_s'] = time.perf_counter() - start
+
+    written = 0
+    if not args.no_images:
+        start = time.perf_counter()
+        written = write_images(data_dir / "images", args)
+        timings['images_s'] = time.perf_counter() - start
+
+    return {
+        'output': str(output), 'detections': args.detections, 'images': args.images, 'classes': args.classes,
+        'image_size': [args.image_width, args.image_height], 'features_dim': args.features_dim,
+        'seed': args.seed, 'images_written': written, **timings,
+    }
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", type=Path, help="Dataset root; files go to <output>/data")
+    parser.add_argument("--scale", choices=sorted(SCALES), default='small',
+                        help="Preset detection and image counts: " +
+                             ", ".join(f"{name} {d:,}/{i:,}" for name, (d, i) in SCALES.items()))
+    parser.add_argument("--detections", type=int, help="Override the preset detection count")
+    parser.add_argument("--images", type=int, help="Override the preset image count")
+    parser.add_argument("--classes", type=int, default=20)
+    parser.add_argument("--image-width", type=int, default=640)
+    parser.add_argument("--image-height", type=int, default=480)
+    parser.add_argument("--features-dim", type=int, default=0, help="Also write embeddings.npy with this many dims")
+    parser.add_argument("--no-images", action="store_true", help="Skip the JPEGs (crop benchmarks need them)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes drawing images")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+def resolve_counts(args):
+    detections, images = SCALES[args.scale]
+    args.detections = args.detections or detections
+    args.images = args.images or images
+    if args.detections <= 0 or args.images <= 0 or args.classes <= 0:
+        raise ValueError("detections, images and classes must be positive")
+    return args
+
+def main():
+    try:
+        args = resolve_counts(build_parser().parse_args())
+        report = generate(args.output, args)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error generating dataset: {e}")
+        sys.exit(1)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Build the binary dataset cache so the server starts without parsing JSON
+"""
+
+import argparse
+import shutil
+import sys
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data-dir", default="data", help="directory with the source data files")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the cache is current")
+    args = parser.parse_args()
+
+    from services.data_loader import DataLoader
+    loader = DataLoader(args.data_dir)
+    if args.force:
+        shutil.rmtree(loader.dataset_cache.cache_dir, ignore_errors=True)
+
+    start = time.perf_counter()
+    try:
+        loader.load_all()
+    except Exception as e:
+        print(f"❌ Error building dataset cache: {e}")
+        sys.exit(1)
+    print(f"✅ Dataset cache ready in {loader.dataset_cache.cache_dir} ({time.perf_counter() - start:.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Pre-render thumbnails of all annotations into a memory-mapped atlas that /api/crop serves without decoding
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data-dir", default="data", help="directory with the source data files")
+    parser.add_argument("--size", type=int, default=128, help="thumbnail size; /api/crop uses the atlas for ?size=<size>")
+    parser.add_argument("--padding", type=int, default=10, help="padding around the bbox in pixels")
+    parser.add_argument("--format", default="jpeg", help="jpeg, webp or png")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="rendering processes")
+    parser.add_argument("--force", action="store_true", help="start over instead of resuming an interrupted build")
+    args = parser.parse_args()
+
+    from services.atlas_builder import AtlasBuilder
+    from services.data_loader import DataLoader
+    data_dir = Path(args.data_dir)
+    loader = DataLoader(args.data_dir)
+    try:
+        loader.load_all()
+        builder = AtlasBuilder(loader, data_dir / "images", data_dir / "thumbnail_atlas")
+        summary = builder.build(args.size, args.padding, args.format, max(1, args.workers), force=args.force)
+    except KeyboardInterrupt:
+        print("⚠️  Interrupted; run again with the same options to resume")
+        sys.exit(130)
+    except Exception as e:
+        print(f"❌ Error building thumbnail atlas: {e}")
+        sys.exit(1)
+    print(f"✅ Thumbnail atlas ready in {builder.atlas_dir} ({summary['thumbnails']} thumbnails rendered, "
+          f"{summary['failures']} failed)")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
+import time
 import uvicorn
 
-from api import embeddings, images, annotations
+from api import embeddings, images, annotations, similarity, projections, profiler
+from services.data_loader import data_loader
+from services.executors import PoolSaturatedError, io_pool, shutdown_pools
+from services.metrics import metrics
 
 app = FastAPI(title="Object Detection Analysis Tool", version="1.0.0")
 
@@ -16,15 +22,89 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON and binary payloads; brotli when brotli-asgi is installed, it falls back to gzip
+COMPRESS_MIN_BYTES = 1024
+# Crops, bundles and sprites are JPEG/PNG/WebP already; compressing them again only costs CPU
+UNCOMPRESSED_PATH_PREFIXES = ("/api/crop/", "/api/crops")
+
+class SelectiveCompression:
+    """Sends requests through `compressor` unless their path serves already-compressed images"""
+
+    def __init__(self, app, compressor, **options):
+        self.app = app
+        self.compressed_app = compressor(app, **options)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not scope["path"].startswith(UNCOMPRESSED_PATH_PREFIXES):
+            await self.compressed_app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(SelectiveCompression, compressor=BrotliMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+except ImportError:
+    app.add_middleware(SelectiveCompression, compressor=GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+
 # Include API routes
 app.include_router(embeddings.router, prefix="/api")
 app.include_router(images.router, prefix="/api")
 app.include_router(annotations.router, prefix="/api")
+app.include_router(similarity.router, prefix="/api")
+app.include_router(projections.router, prefix="/api")
+app.include_router(profiler.router, prefix="/api")
+
+@app.middleware("http")
+async def dataset_snapshot(request: Request, call_next):
+    # Pick up removals, reloads and layouts published by other worker processes
+    if data_loader.needs_sync():
+        try:
+            await io_pool.run(data_loader.sync)
+        except PoolSaturatedError:
+            pass  # serve the current state, a later request syncs
+    # The whole request reads one snapshot, even if a reload publishes another meanwhile
+    token = data_loader.pin()
+    try:
+        return await call_next(request)
+    finally:
+        data_loader.unpin(token)
+
+REQUEST_SECONDS = metrics.histogram('http_request_duration_seconds', 'Request latency by route template',
+                                    ('method', 'route', 'status'))
+
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    # Outermost, so the latency includes syncing with other workers
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # The route template, not the URL, keeps the number of series bounded
+        route = request.scope.get('route')
+        REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                route=route.path if route is not None else 'unmatched', status=status)
+
+@app.exception_handler(PoolSaturatedError)
+async def pool_saturated_handler(request: Request, exc: PoolSaturatedError):
+    # Shed load instead of queueing without bound
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.on_event("shutdown")
+async def shutdown():
+    shutdown_pools()
 
 @app.get("/")
 async def root():
     return {"message": "Object Detection Analysis Tool API"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Metrics of this worker process in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
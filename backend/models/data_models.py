@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 class EmbeddingPoint(BaseModel):
     annotation_id: int
@@ -8,10 +8,12 @@ class EmbeddingPoint(BaseModel):
     class_name: str
 
 class SelectionRequest(BaseModel):
-    x_min: float
-    x_max: float
-    y_min: float
-    y_max: float
+    x_min: Optional[float] = None
+    x_max: Optional[float] = None
+    y_min: Optional[float] = None
+    y_max: Optional[float] = None
+    class_name: Optional[str] = None
+    polygon: Optional[List[List[float]]] = None  # lasso vertices as [x, y] pairs
 
 class SelectionResponse(BaseModel):
     annotation_ids: List[int]
@@ -22,7 +24,28 @@ class RemoveRequest(BaseModel):
 class RemoveResponse(BaseModel):
     success: bool
     removed_count: int
+    output_file: str  # removal log the batch was appended to
+    batch_id: Optional[int] = None
+
+class UndoRequest(BaseModel):
+    batch_id: Optional[int] = None  # most recent batch when omitted
+
+class UndoResponse(BaseModel):
+    success: bool
+    restored_count: int
+    batch_id: Optional[int] = None
+
+class ExportResponse(BaseModel):
+    success: bool
     output_file: str
+    annotation_count: int
+
+class CropBatchRequest(BaseModel):
+    annotation_ids: List[int]
+    size: int = 128
+    padding: int = 10
+    format: str = "jpeg"
+    layout: str = "bundle"  # "bundle" (individual crops) or "sprite" (one packed sheet)
 
 class ClassesResponse(BaseModel):
     classes: List[str]
@@ -31,4 +54,58 @@ class HealthResponse(BaseModel):
     status: str
     embeddings_loaded: bool
     annotations_loaded: bool
-    mapping_loaded: bool
\ No newline at end of file
+    mapping_loaded: bool
+
+class Neighbor(BaseModel):
+    annotation_id: int
+    score: float  # cosine similarity to the query
+    class_name: str
+
+class NeighborResponse(BaseModel):
+    annotation_id: int
+    neighbors: List[Neighbor]
+
+class NeighborRequest(BaseModel):
+    annotation_ids: List[int]
+    k: int = 50
+    class_name: Optional[str] = None
+    exact: bool = False
+
+class NeighborBatchResponse(BaseModel):
+    results: List[NeighborResponse]
+
+class OutlierEntry(BaseModel):
+    annotation_id: int
+    class_name: str
+    score: float  # mean percentile rank of the three signals within the class
+    centroid_distance: float
+    lof: float
+    neighbor_disagreement: float
+
+class OutlierResponse(BaseModel):
+    class_name: Optional[str] = None
+    space: str  # "features" (embeddings.npy) or "2d"
+    total: int
+    offset: int
+    outliers: List[OutlierEntry]
+
+class ProjectionRequest(BaseModel):
+    method: str = "pca"  # "pca", "umap" or "tsne"
+    class_name: Optional[str] = None  # project one class only
+    params: Dict[str, Any] = {}
+    apply: bool = True  # swap each finished stage into the embedding view
+
+class ProjectionJobResponse(BaseModel):
+    job_id: str
+    method: str
+    class_name: Optional[str] = None
+    params: Dict[str, Any]
+    apply: bool
+    status: str
+    stage: Optional[str] = None
+    applied: Optional[str] = None
+    cached: bool
+    point_count: int
+    error: Optional[str] = None
+    created_at: float
+    finished_at: Optional[float] = None
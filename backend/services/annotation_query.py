@@ -0,0 +1,172 @@
+import base64
+import json
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from .data_loader import data_loader
+
+ANNOTATION_FIELDS = ('annotation_id', 'image_id', 'category_id', 'class_name', 'bbox', 'score', 'area', 'x', 'y')
+POINT_FIELDS = ('annotation_id', 'x', 'y', 'class_name')
+SORT_KEYS = ('id', 'score', 'area', 'class')
+
+def encode_cursor(sort: str, descending: bool, position: int) -> str:
+    raw = json.dumps({'s': sort, 'd': descending, 'p': position}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str, sort: str, descending: bool) -> int:
+    """Position encoded in a cursor, which must come from the same sort"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        position = int(data['p'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if data.get('s') != sort or data.get('d') != descending or position < 0:
+        raise ValueError("Cursor belongs to a different sort order")
+    return position
+
+class AnnotationQuery:
+    """Sorted, filtered and paginated views over the annotation columns.
+
+    One sort order per (key, direction) is computed on first use and kept
+    for the loaded dataset. A cursor is a position in that order: rows are
+    only masked on removal, never moved, so cursors stay valid while
+    annotations are removed between pages. The positions matching recent
+    filter combinations are cached, so following pages is O(page size).
+    """
+
+    def __init__(self, max_selections: int = 16):
+        self.max_selections = max_selections
+        self._lock = threading.Lock()
+        self._ids = None
+        self._orders: Dict[Tuple[str, bool], np.ndarray] = {}
+        self._selections: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+
+    def _sync(self, index):
+        # Orders depend only on the annotations, not on the 2D layout
+        if index.annotation_ids is not self._ids:
+            self._orders.clear()
+            self._selections.clear()
+            self._ids = index.annotation_ids
+
+    def _areas(self) -> np.ndarray:
+        bboxes = data_loader.table.bboxes
+        return bboxes[:, 2] * bboxes[:, 3]
+
+    def _order(self, index, sort: str, descending: bool) -> np.ndarray:
+        key = (sort, descending)
+        order = self._orders.get(key)
+        if order is not None:
+            return order
+        if sort == 'class':
+            # Alphabetical by class name, ties by annotation id
+            name_rank = np.argsort(np.argsort(index.class_names, kind='stable'), kind='stable')
+            order = np.lexsort((index.annotation_ids, name_rank[index.class_codes]))
+            if descending:
+                order = order[::-1].copy()
+        elif sort == 'id':
+            order = np.argsort(index.annotation_ids, kind='stable')
+            if descending:
+                order = order[::-1].copy()
+        else:
+            values = data_loader.table.scores if sort == 'score' else self._areas()
+            # NaN (missing score or bbox) sorts last in both directions
+            order = np.argsort(-values if descending else values, kind='stable')
+        self._orders[key] = order
+        return order
+
+    def _mask(self, index, class_filter: Optional[str], min_score: Optional[float], max_score: Optional[float],
+              min_area: Optional[float], max_area: Optional[float], points_only: bool) -> np.ndarray:
+        mask = index.point_mask(class_filter) if points_only else index.alive.copy()
+        if class_filter and not points_only:
+            code = index.class_names.index(class_filter) if class_filter in index.class_names else -1
+            mask &= index.class_codes == code
+        if min_score is not None or max_score is not None:
+            scores = data_loader.table.scores
+            with np.errstate(invalid='ignore'):
+                if min_score is not None:
+                    mask &= scores >= min_score
+                if max_score is not None:
+                    mask &= scores <= max_score
+        if min_area is not None or max_area is not None:
+            areas = self._areas()
+            with np.errstate(invalid='ignore'):
+                if min_area is not None:
+                    mask &= areas >= min_area
+                if max_area is not None:
+                    mask &= areas <= max_area
+        return mask
+
+    def _selection(self, index, sort: str, descending: bool, filters: Tuple) -> np.ndarray:
+        """Positions in the sort order that pass the filters, cached per index version"""
+        key = (sort, descending, filters, id(index), index.version)
+        selected = self._selections.get(key)
+        if selected is None:
+            order = self._order(index, sort, descending)
+            selected = np.flatnonzero(self._mask(index, *filters)[order])
+            self._selections[key] = selected
+            while len(self._selections) > self.max_selections:
+                self._selections.popitem(last=False)
+        else:
+            self._selections.move_to_end(key)
+        return selected
+
+    def page(self, sort: str = 'id', descending: bool = False, class_filter: Optional[str] = None,
+             min_score: Optional[float] = None, max_score: Optional[float] = None,
+             min_area: Optional[float] = None, max_area: Optional[float] = None,
+             points_only: bool = False, limit: int = 100, cursor: Optional[str] = None,
+             offset: Optional[int] = None, fields: Optional[Sequence[str]] = None) -> Dict:
+        """One page of annotations: {'items', 'next_cursor', 'total'}"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unsupported sort key: {sort}")
+        fields = list(fields or (POINT_FIELDS if points_only else ANNOTATION_FIELDS))
+        unknown = [field for field in fields if field not in ANNOTATION_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+        index = data_loader.get_index()
+        filters = (class_filter, min_score, max_score, min_area, max_area, points_only)
+        with self._lock:
+            self._sync(index)
+            order = self._order(index, sort, descending)
+            selected = self._selection(index, sort, descending, filters)
+
+        if cursor is not None:
+            start = int(np.searchsorted(selected, decode_cursor(cursor, sort, descending)))
+        else:
+            start = offset or 0
+        positions = selected[start:start + limit]
+        next_cursor = None
+        if start + limit < len(selected) and len(positions):
+            next_cursor = encode_cursor(sort, descending, int(positions[-1]) + 1)
+
+        return {
+            'items': self._materialize(index, order[positions], fields),
+            'next_cursor': next_cursor,
+            'total': int(len(selected)),
+        }
+
+    def _materialize(self, index, rows: np.ndarray, fields: List[str]) -> List[dict]:
+        table = data_loader.table
+        columns = {}
+        for field in fields:
+            if field == 'annotation_id':
+                columns[field] = index.annotation_ids[rows].tolist()
+            elif field in ('image_id', 'category_id'):
+                values = (table.image_ids if field == 'image_id' else table.category_ids)[rows].tolist()
+                columns[field] = [value if value >= 0 else None for value in values]
+            elif field == 'class_name':
+                columns[field] = [index.class_names[code] for code in index.class_codes[rows].tolist()]
+            elif field == 'bbox':
+                columns[field] = [None if any(v != v for v in box) else box for box in table.bboxes[rows].tolist()]
+            else:
+                if field == 'area':
+                    values = table.bboxes[rows, 2] * table.bboxes[rows, 3]
+                else:
+                    values = {'score': table.scores, 'x': index.x, 'y': index.y}[field][rows]
+                # NaN marks a missing value
+                columns[field] = [None if value != value else value for value in values.tolist()]
+        return [dict(zip(fields, values)) for values in zip(*(columns[field] for field in fields))]
+
+# Global annotation query instance
+annotation_query = AnnotationQuery()
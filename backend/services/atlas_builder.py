@@ -0,0 +1,186 @@
+import json
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from .dataset_cache import file_fingerprint
+from .image_service import CROP_FORMATS, _render_file_crops, resolve_image_path
+from .shared_state import FileLock
+from .thumbnail_atlas import ATLAS_FORMAT, ID, part_paths
+
+# Source images per part; a part is the unit of work and of resuming
+IMAGES_PER_PART = 256
+
+# (image path, [{'id', 'bbox'}, ...]) for every source image of a part
+PartJobs = List[Tuple[str, List[dict]]]
+
+def _init_worker():
+    # Parallelism comes from the processes; OpenCV threads on top would oversubscribe the cores
+    cv2.setNumThreads(1)
+
+def _write_atomically(path: Path, write):
+    temp_path = path.with_name(path.name + ".tmp")
+    with open(temp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def render_part(atlas_path: Path, index_path: Path, jobs: PartJobs, padding: int, size: int,
+                format: str) -> Tuple[int, int]:
+    """Render one part in a worker process, returns (thumbnails, failures).
+
+    The index file is written after the thumbnail bytes and marks the
+    part as done, so a part interrupted halfway is rendered again.
+    """
+    rows = []
+    requested = 0
+
+    def write_thumbnails(f):
+        nonlocal requested
+        for image_path, annotations in jobs:
+            requested += len(annotations)
+            try:
+                rendered = _render_file_crops(image_path, annotations, padding, size, format)
+            except Exception as e:
+                print(f"Error rendering crops of {image_path}: {e}")
+                continue
+            for annotation_id, image_bytes in rendered.items():
+                if image_bytes is not None:
+                    rows.append((annotation_id, f.tell(), len(image_bytes)))
+                    f.write(image_bytes)
+
+    _write_atomically(atlas_path, write_thumbnails)
+    index = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    _write_atomically(index_path, lambda f: np.save(f, index))
+    return len(rows), requested - len(rows)
+
+class AtlasBuilder:
+    """Renders a thumbnail atlas (see ThumbnailAtlas) for every annotation of a loaded dataset.
+
+    Annotations are grouped by source image so each image is decoded once,
+    and parts of IMAGES_PER_PART images are rendered in parallel worker
+    processes. Removed annotations are included, so an undo needs no
+    rebuild. Parts that finished in an earlier, interrupted run with the
+    same settings are kept.
+    """
+
+    def __init__(self, loader, images_dir: Path, atlas_dir: Path):
+        self.loader = loader
+        self.images_dir = Path(images_dir)
+        self.atlas_dir = Path(atlas_dir)
+        self.manifest_path = self.atlas_dir / "manifest.json"
+
+    def _read_manifest(self) -> Optional[Dict]:
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self, manifest: Dict):
+        _write_atomically(self.manifest_path, lambda f: f.write(json.dumps(manifest).encode()))
+
+    def _plan(self) -> List[np.ndarray]:
+        """Image ids of each part, in a fixed order so a resumed build splits them the same way"""
+        snapshot = self.loader.get_snapshot()
+        image_ids = np.unique(snapshot.sorted_image_ids)
+        image_ids = image_ids[image_ids >= 0]
+        return [image_ids[start:start + IMAGES_PER_PART] for start in range(0, len(image_ids), IMAGES_PER_PART)]
+
+    def _jobs(self, image_ids: np.ndarray) -> PartJobs:
+        snapshot = self.loader.get_snapshot()
+        table = snapshot.table
+        jobs = []
+        for image_id in image_ids.tolist():
+            image_path = resolve_image_path(self.images_dir, snapshot.images_by_id.get(image_id))
+            if image_path is None:
+                continue
+            start, stop = np.searchsorted(snapshot.sorted_image_ids, [image_id, image_id + 1])
+            rows = snapshot.image_order[start:stop]
+            rows = rows[(table.ids[rows] >= 0) & np.isfinite(table.bboxes[rows]).all(axis=1)]
+            if len(rows):
+                jobs.append((str(image_path), [{'id': int(annotation_id), 'bbox': bbox}
+                                               for annotation_id, bbox in zip(table.ids[rows].tolist(),
+                                                                              table.bboxes[rows].tolist())]))
+        return jobs
+
+    def build(self, size: int, padding: int, format: str, workers: int, force: bool = False) -> Dict:
+        """Render the parts that are not done yet, then publish the merged index"""
+        if format not in CROP_FORMATS:
+            raise ValueError(f"Unsupported crop format: {format}")
+        # Outside the atlas directory, which a fresh build deletes; a second build waits for the first
+        with FileLock(self.atlas_dir.with_name(self.atlas_dir.name + ".lock")).hold():
+            return self._build(size, padding, format, workers, force)
+
+    def _build(self, size: int, padding: int, format: str, workers: int, force: bool) -> Dict:
+        parts = self._plan()
+        manifest = {
+            'format': ATLAS_FORMAT, 'size': size, 'padding': padding, 'image_format': format,
+            'source': file_fingerprint(self.loader.data_dir / "annotations.json"),
+            'images_per_part': IMAGES_PER_PART, 'parts': len(parts), 'complete': False,
+        }
+        existing = self._read_manifest()
+        resumable = existing is not None and not force and \
+            {key: value for key, value in existing.items() if key != 'complete'} == \
+            {key: value for key, value in manifest.items() if key != 'complete'}
+        if resumable and existing.get('complete'):
+            print(f"Thumbnail atlas in {self.atlas_dir} is already complete")
+            return {'parts': len(parts), 'rendered_parts': 0, 'thumbnails': 0, 'failures': 0}
+        if not resumable:
+            shutil.rmtree(self.atlas_dir, ignore_errors=True)
+            self.atlas_dir.mkdir(parents=True, exist_ok=True)
+            self._write_manifest(manifest)
+
+        start_time = time.perf_counter()
+        todo = [part for part in range(len(parts)) if not part_paths(self.atlas_dir, part)[1].exists()]
+        print(f"Rendering {len(todo)} of {len(parts)} atlas parts with {workers} workers")
+        thumbnails = failures = done = 0
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        try:
+            in_flight = set()
+
+            def collect(futures):
+                nonlocal thumbnails, failures, done
+                for future in futures:
+                    rendered, failed = future.result()
+                    thumbnails += rendered
+                    failures += failed
+                    done += 1
+                    print(f"  {done}/{len(todo)} parts, {thumbnails} thumbnails "
+                          f"({thumbnails / (time.perf_counter() - start_time):.0f}/s)")
+
+            for part in todo:
+                # Bounded, so the jobs of a large dataset are not all held in memory at once
+                if len(in_flight) >= 2 * workers:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                atlas_path, index_path = part_paths(self.atlas_dir, part)
+                in_flight.add(pool.submit(render_part, atlas_path, index_path, self._jobs(parts[part]),
+                                          padding, size, format))
+            collect(wait(in_flight)[0])
+        except BaseException:
+            # Interrupted: drop queued parts, finished ones are kept for the next run
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+
+        self._finish(len(parts), manifest)
+        return {'parts': len(parts), 'rendered_parts': len(todo), 'thumbnails': thumbnails, 'failures': failures,
+                'seconds': time.perf_counter() - start_time}
+
+    def _finish(self, part_count: int, manifest: Dict):
+        """Merge the part indexes into index.npy sorted by id, then mark the atlas complete"""
+        columns = []
+        for part in range(part_count):
+            rows = np.load(part_paths(self.atlas_dir, part)[1])
+            columns.append(np.column_stack([rows[:, :1], np.full((len(rows), 1), part, dtype=np.int64),
+                                            rows[:, 1:]]))
+        index = np.concatenate(columns) if columns else np.zeros((0, 4), dtype=np.int64)
+        index = index[np.argsort(index[:, ID], kind='stable')]
+        _write_atomically(self.atlas_dir / "index.npy", lambda f: np.save(f, index))
+        self._write_manifest(dict(manifest, complete=True))
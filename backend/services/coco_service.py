@@ -1,8 +1,9 @@
 import json
-from typing import List, Dict
-from pathlib import Path
+import os
+from typing import List, Dict, Optional
 from datetime import datetime
 from .data_loader import data_loader
+from .stats_service import stats_service
 
 class COCOService:
     def __init__(self):
@@ -24,82 +25,87 @@ class COCOService:
         if not data_loader.annotations:
             return []
             
-        existing_ids = {ann['id'] for ann in data_loader.annotations['annotations']}
-        return [aid for aid in annotation_ids if aid in existing_ids]
+        index = data_loader.get_index()
+        live = set(index.annotation_ids[index.rows_for_ids(annotation_ids)].tolist())
+        return [aid for aid in annotation_ids if aid in live]
         
     def remove_annotations_by_ids(self, annotation_ids: List[int]) -> Dict:
-        """Remove annotations by IDs and return summary"""
+        """Remove annotations by IDs and return summary.
+
+        The removal is appended to the removal log and applied as a mask;
+        nothing is rewritten. Use export_annotations() for a cleaned file.
+        """
         if not data_loader.annotations:
             raise RuntimeError("Annotations not loaded")
             
         # Validate annotation IDs
         valid_ids = self.validate_annotation_ids(annotation_ids)
         
-        # Count before removal
-        original_count = len(data_loader.annotations['annotations'])
-        
-        # Remove annotations
-        data_loader.annotations['annotations'] = [
-            ann for ann in data_loader.annotations['annotations']
-            if ann['id'] not in valid_ids
-        ]
-        
-        new_count = len(data_loader.annotations['annotations'])
-        removed_count = original_count - new_count
-        
-        # Save to new file
-        output_file = self._save_filtered_annotations()
+        # Log first so an acknowledged removal survives a crash
+        batch_id = None
+        removed_count = 0
+        if valid_ids:
+            batch_id, removed_count = data_loader.log_removal(valid_ids)
         
         return {
             'success': True,
             'removed_count': removed_count,
             'requested_count': len(annotation_ids),
             'valid_count': len(valid_ids),
-            'output_file': output_file
+            'batch_id': batch_id,
+            'output_file': str(data_loader.removal_log.path)
         }
         
-    def _save_filtered_annotations(self) -> str:
-        """Save current annotations to a new filtered file"""
+    def undo_removal(self, batch_id: Optional[int] = None) -> Dict:
+        """Undo a removal batch, the most recent one by default"""
+        if not data_loader.annotations:
+            raise RuntimeError("Annotations not loaded")
+            
+        undone = data_loader.log_undo(batch_id)
+        if undone is None:
+            return {'success': False, 'restored_count': 0, 'batch_id': batch_id}
+            
+        batch_id, restored_count = undone
+        return {'success': True, 'restored_count': restored_count, 'batch_id': batch_id}
+        
+    def export_annotations(self) -> Dict:
+        """Write the cleaned COCO file, copying live annotation records byte for byte"""
+        if not data_loader.annotations:
+            raise RuntimeError("Annotations not loaded")
+            
         # Create output directory
-        output_dir = Path("data/filtered_annotations")
+        output_dir = data_loader.data_dir / "filtered_annotations"
         output_dir.mkdir(exist_ok=True)
         
         # Generate timestamped filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_file = output_dir / f"filtered_annotations_{timestamp}.json"
+        temp_file = output_file.with_name(output_file.name + ".tmp")
         
-        # Save annotations
-        with open(output_file, 'w') as f:
-            json.dump(data_loader.annotations, f, indent=2)
-            
-        return str(output_file)
+        # Write to a temp file and rename so readers never see a partial export
+        count = 0
+        with open(temp_file, 'wb') as f:
+            f.write(b"{")
+            for key, value in data_loader.annotations.items():
+                f.write(f"{json.dumps(key)}: {json.dumps(value)}, ".encode('utf-8'))
+            f.write(b'"annotations": [')
+            for raw in data_loader.iter_live_raw_annotations():
+                if count:
+                    f.write(b", ")
+                f.write(raw)
+                count += 1
+            f.write(b"]}")
+        os.replace(temp_file, output_file)
+        
+        return {'success': True, 'output_file': str(output_file), 'annotation_count': count}
         
     def get_annotation_stats(self) -> Dict:
         """Get statistics about current annotations"""
         if not data_loader.annotations:
             return {}
             
-        annotations = data_loader.annotations['annotations']
-        
-        # Count by category
-        category_counts = {}
-        for ann in annotations:
-            cat_id = ann.get('category_id')
-            category_counts[cat_id] = category_counts.get(cat_id, 0) + 1
-            
-        # Map category IDs to names
-        categories = {cat['id']: cat['name'] for cat in self.get_categories()}
-        named_counts = {
-            categories.get(cat_id, f"category_{cat_id}"): count 
-            for cat_id, count in category_counts.items()
-        }
-        
-        return {
-            'total_annotations': len(annotations),
-            'category_counts': named_counts,
-            'total_categories': len(category_counts),
-            'total_images': len(data_loader.annotations.get('images', []))
-        }
+        # Maintained incrementally across removals, see stats_service
+        return stats_service.annotation_stats()
 
 # Global COCO service instance
 coco_service = COCOService()
\ No newline at end of file
@@ -0,0 +1,239 @@
+import codecs
+import json
+from array import array
+import mmap
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+import numpy as np
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+class AnnotationTable:
+    """Compact columns for COCO annotations.
+
+    Only the fields the tool uses are kept in memory; full records stay in
+    the source file and are parsed on demand from their byte span.
+    Missing ids/categories are stored as -1, missing bbox/score as NaN.
+    """
+
+    def __init__(self, source_path: Path, columns: Dict[str, np.ndarray]):
+        self.source_path = Path(source_path)
+        self.ids = columns['ids']
+        self.image_ids = columns['image_ids']
+        self.category_ids = columns['category_ids']
+        self.bboxes = columns['bboxes']
+        self.scores = columns['scores']
+        self.offsets = columns['offsets']
+        self.lengths = columns['lengths']
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {
+            'ids': self.ids, 'image_ids': self.image_ids, 'category_ids': self.category_ids,
+            'bboxes': self.bboxes, 'scores': self.scores,
+            'offsets': self.offsets, 'lengths': self.lengths,
+        }
+
+    def _source(self) -> mmap.mmap:
+        # Keep the file mapped so an annotations.json replaced on disk does
+        # not change the records behind an already loaded table
+        if self._mmap is None:
+            self._file = open(self.source_path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def raw_record(self, row: int) -> bytes:
+        """Original JSON bytes of one annotation"""
+        offset = int(self.offsets[row])
+        return self._source()[offset:offset + int(self.lengths[row])]
+
+    def record(self, row: int) -> dict:
+        """Full annotation record, parsed from the source file"""
+        return json.loads(self.raw_record(row))
+
+    def fields(self, row: int) -> dict:
+        """The in-memory fields of one annotation as a dict"""
+        bbox = self.bboxes[row]
+        score = self.scores[row]
+        image_id = int(self.image_ids[row])
+        category_id = int(self.category_ids[row])
+        return {
+            'id': int(self.ids[row]),
+            'image_id': image_id if image_id >= 0 else None,
+            'category_id': category_id if category_id >= 0 else None,
+            'bbox': None if np.isnan(bbox).any() else bbox.tolist(),
+            'score': None if np.isnan(score) else float(score),
+        }
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+            self._file = None
+
+class _ChunkReader:
+    """Sliding text window over a UTF-8 file that tracks byte offsets"""
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+        self._base_bytes = 0  # byte offset of text[0]
+        self._ascii = True
+        self._cursor = (0, 0)  # (text index, byte offset) for non-ASCII windows
+
+    def fill(self) -> bool:
+        """Drop consumed text and read the next chunk, False at end of file"""
+        if self.eof:
+            return False
+        consumed = self.text[:self.pos]
+        self._base_bytes += len(consumed) if self._ascii else len(consumed.encode('utf-8'))
+        data = self.f.read(self.chunk_size)
+        self.eof = not data
+        self.text = self.text[self.pos:] + self.decoder.decode(data, final=self.eof)
+        self.pos = 0
+        self._ascii = self.text.isascii()
+        self._cursor = (0, self._base_bytes)
+        return not self.eof
+
+    def byte_offset(self, index: int) -> int:
+        if self._ascii:
+            return self._base_bytes + index
+        # Offsets are requested in increasing order, encode only the new span
+        cursor_index, cursor_bytes = self._cursor
+        cursor_bytes += len(self.text[cursor_index:index].encode('utf-8'))
+        self._cursor = (index, cursor_bytes)
+        return cursor_bytes
+
+    def peek(self) -> str:
+        """Next non-whitespace character, refilling as needed ('' at end)"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at byte {self.byte_offset(self.pos)}")
+        self.pos += 1
+
+    def value(self) -> Tuple[object, int, int]:
+        """Decode the JSON value at the cursor, returns (value, start index, end index)"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                # Value runs past the window, widen it and retry
+                if not self.fill():
+                    raise
+                continue
+            if end == len(self.text) and not self.eof:
+                # A number could continue in the next chunk
+                self.fill()
+                continue
+            start = self.pos
+            self.pos = end
+            return value, start, end
+
+_NAN_BBOX = (np.nan,) * 4
+
+class _ColumnBuilder:
+    """Typed growable buffers, ~8 bytes per value instead of a Python object"""
+
+    def __init__(self):
+        self.ids = array('q')
+        self.image_ids = array('q')
+        self.category_ids = array('q')
+        self.bboxes = array('d')
+        self.scores = array('d')
+        self.offsets = array('q')
+        self.lengths = array('q')
+
+    def append(self, ann: dict, offset: int, length: int):
+        bbox = ann.get('bbox')
+        if not bbox or len(bbox) < 4:
+            bbox = _NAN_BBOX
+        image_id = ann.get('image_id')
+        category_id = ann.get('category_id')
+        score = ann.get('score')
+        self.ids.append(ann['id'])
+        self.image_ids.append(-1 if image_id is None else image_id)
+        self.category_ids.append(-1 if category_id is None else category_id)
+        self.bboxes.extend(bbox[:4])
+        self.scores.append(np.nan if score is None else score)
+        self.offsets.append(offset)
+        self.lengths.append(length)
+
+    def build(self) -> Dict[str, np.ndarray]:
+        return {
+            'ids': np.frombuffer(self.ids, dtype=np.int64).copy(),
+            'image_ids': np.frombuffer(self.image_ids, dtype=np.int64).copy(),
+            'category_ids': np.frombuffer(self.category_ids, dtype=np.int64).copy(),
+            'bboxes': np.frombuffer(self.bboxes, dtype=np.float64).reshape(-1, 4).copy(),
+            'scores': np.frombuffer(self.scores, dtype=np.float64).copy(),
+            'offsets': np.frombuffer(self.offsets, dtype=np.int64).copy(),
+            'lengths': np.frombuffer(self.lengths, dtype=np.int64).astype(np.int32),
+        }
+
+def _iter_annotations(reader: _ChunkReader) -> Iterator[Tuple[dict, int, int]]:
+    """Yield (record, byte offset, byte length) for each element of the annotations array"""
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    while True:
+        ann, start, end = reader.value()
+        offset = reader.byte_offset(start)
+        yield ann, offset, reader.byte_offset(end) - offset
+        separator = reader.peek()
+        reader.pos += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f"Malformed annotations array near byte {offset}")
+
+def load_coco_streaming(path: Path, chunk_size: int = 8 * 1024 * 1024) -> Tuple[dict, AnnotationTable]:
+    """Parse a COCO file without materializing the annotations list.
+
+    Returns the top-level dict minus 'annotations' (images, categories,
+    info, ...) and an AnnotationTable for the annotations. Each annotation
+    is decoded once to pull out its fields and then dropped, so peak
+    memory is one window plus the compact columns.
+    """
+    path = Path(path)
+    meta = {}
+    builder = _ColumnBuilder()
+
+    with open(path, 'rb') as f:
+        reader = _ChunkReader(f, chunk_size)
+        reader.expect('{')
+        if reader.peek() != '}':
+            while True:
+                key, _, _ = reader.value()
+                reader.expect(':')
+                if key == 'annotations' and reader.peek() == '[':
+                    for ann, offset, length in _iter_annotations(reader):
+                        builder.append(ann, offset, length)
+                else:
+                    meta[key], _, _ = reader.value()
+                separator = reader.peek()
+                reader.pos += 1
+                if separator == '}':
+                    break
+                if separator != ',':
+                    raise ValueError(f"Malformed COCO file near byte {reader.byte_offset(reader.pos)}")
+
+    return meta, AnnotationTable(path, builder.build())
@@ -0,0 +1,33 @@
+import json
+import struct
+from typing import Dict, Optional
+
+BUNDLE_MEDIA_TYPE = "application/vnd.embeddings.crops"
+SPRITE_MEDIA_TYPE = "application/vnd.embeddings.sprite"
+BUNDLE_MAGIC = b"CRPB"
+SPRITE_MAGIC = b"CRPS"
+
+def encode_bundle(crops: Dict[int, Optional[bytes]]) -> bytes:
+    """Pack individual crops into one length-prefixed binary bundle.
+
+    Layout (little-endian):
+        magic "CRPB" | uint32 count
+        count x (int64 annotation_id | uint32 length | length bytes of image)
+
+    A zero length marks a crop that could not be rendered.
+    """
+    parts = [BUNDLE_MAGIC, struct.pack("<I", len(crops))]
+    for annotation_id, image_bytes in crops.items():
+        image_bytes = image_bytes or b""
+        parts.append(struct.pack("<qI", annotation_id, len(image_bytes)))
+        parts.append(image_bytes)
+    return b"".join(parts)
+
+def encode_sprite(image_bytes: bytes, manifest: Dict) -> bytes:
+    """Pack a sprite sheet with its manifest.
+
+    Layout (little-endian):
+        magic "CRPS" | uint32 manifest length | manifest JSON | image bytes
+    """
+    header = json.dumps(manifest).encode('utf-8')
+    return b"".join([SPRITE_MAGIC, struct.pack("<I", len(header)), header, image_bytes])
@@ -0,0 +1,178 @@
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Hashable, Optional, Tuple
+
+CropKey = Tuple[int, int, Optional[int], str]  # (annotation_id, padding, size, format)
+
+class CropCache:
+    """Two-tier cache for encoded crops.
+
+    The memory tier is an LRU bounded by total bytes. Entries evicted from
+    memory spill to an optional disk tier, itself bounded by bytes, and
+    are promoted back to memory on the next hit.
+
+    Worker processes share disk_dir but each spills into its own <pid>
+    subdirectory, since the disk index lives in process memory: clearing
+    one process's tier never deletes files another process has indexed.
+    Directories of processes that are gone are removed on first use.
+    """
+
+    def __init__(self, max_bytes: int = 128 * 1024 * 1024,
+                 disk_dir: Optional[str] = None, max_disk_bytes: int = 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_root = Path(disk_dir) if disk_dir else None
+        self._disk_pid: Optional[int] = None
+        self._memory: "OrderedDict[CropKey, bytes]" = OrderedDict()
+        self._disk: "OrderedDict[CropKey, int]" = OrderedDict()  # key -> file size
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._owner: Optional[Hashable] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    @property
+    def disk_dir(self) -> Optional[Path]:
+        """This process's spill directory"""
+        if self.disk_root is None:
+            return None
+        pid = os.getpid()
+        if pid != self._disk_pid:
+            self._disk_pid = pid
+            self._remove_orphans()
+        return self.disk_root / str(pid)
+
+    def _remove_orphans(self):
+        """Delete spill directories of processes that no longer run"""
+        if not self.disk_root.is_dir():
+            return
+        for path in self.disk_root.iterdir():
+            if path.is_file():
+                # Spilled by a version that shared one directory between processes
+                path.unlink(missing_ok=True)
+                continue
+            if not path.name.isdigit() or int(path.name) == self._disk_pid:
+                continue
+            try:
+                os.kill(int(path.name), 0)
+            except ProcessLookupError:
+                shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass  # Running under another user
+
+    def _disk_path(self, key: CropKey) -> Path:
+        annotation_id, padding, size, fmt = key
+        return self.disk_dir / f"{annotation_id}_{padding}_{size or 0}.{fmt}"
+
+    def bind(self, owner: Hashable):
+        """Invalidate everything when the owning dataset changes; owners compare by value"""
+        with self._lock:
+            if owner != self._owner:
+                self._clear_locked()
+                self._owner = owner
+
+    def get(self, key: CropKey) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+
+            if key in self._disk:
+                try:
+                    data = self._disk_path(key).read_bytes()
+                except OSError:
+                    data = None
+                self._drop_disk_locked(key)
+                if data is not None:
+                    self.disk_hits += 1
+                    self._put_locked(key, data)
+                    return data
+
+            self.misses += 1
+            return None
+
+    def put(self, key: CropKey, data: bytes):
+        with self._lock:
+            self._put_locked(key, data)
+
+    def _put_locked(self, key: CropKey, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+
+        while self._memory_bytes > self.max_bytes:
+            old_key, old_data = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old_data)
+            self.evictions += 1
+            self._spill_locked(old_key, old_data)
+
+    def _spill_locked(self, key: CropKey, data: bytes):
+        if self.disk_root is None or len(data) > self.max_disk_bytes:
+            return
+        try:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_path(key).write_bytes(data)
+        except OSError as e:
+            print(f"Error spilling crop to disk: {e}")
+            return
+        self._disk[key] = len(data)
+        self._disk_bytes += len(data)
+
+        while self._disk_bytes > self.max_disk_bytes:
+            old_key = next(iter(self._disk))
+            self._drop_disk_locked(old_key)
+            self.disk_evictions += 1
+
+    def _drop_disk_locked(self, key: CropKey):
+        size = self._disk.pop(key, None)
+        if size is None:
+            return
+        self._disk_bytes -= size
+        try:
+            self._disk_path(key).unlink()
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._clear_locked()
+
+    def _clear_locked(self):
+        self._memory.clear()
+        self._disk.clear()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        disk_dir = self.disk_dir
+        if disk_dir is not None and disk_dir.exists():
+            shutil.rmtree(disk_dir, ignore_errors=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'max_bytes': self.max_bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes,
+                'max_disk_bytes': self.max_disk_bytes if self.disk_root is not None else 0,
+            }
@@ -1,44 +1,235 @@
+import copy
+import hashlib
 import json
+import threading
 import numpy as np
-from typing import Dict, List, Optional
+from contextvars import ContextVar, Token
+from typing import Dict, Iterator, List, Optional, Tuple
 import os
 from pathlib import Path
+from .coco_stream import AnnotationTable, load_coco_streaming
+from .dataset_cache import DatasetCache
+from .dataset_index import DatasetIndex, SortedIdMap
+from .metrics import metrics
+from .point_codec import encode_points
+from .removal_log import RemovalLog
+from .shared_state import SharedState
+
+LOAD_PHASE_SECONDS = metrics.histogram('dataset_load_phase_seconds', 'Time spent in each phase of a dataset load',
+                                       ('phase',))
+DATASET_CACHE_LOADS = metrics.counter('dataset_cache_loads_total', 'Dataset loads served from the dataset cache or not',
+                                      ('result',))
+
+# Snapshot the current request reads from, see DataLoader.pin
+_pinned_snapshot: ContextVar[Optional["DatasetSnapshot"]] = ContextVar('dataset_snapshot', default=None)
+
+class DatasetSnapshot:
+    """Everything loaded from one version of the data files.
+
+    A snapshot is built completely before it is published and its fields
+    are not reassigned afterwards: reloads and layout swaps publish a new
+    snapshot, so a request that started on the old one finishes on it.
+    Removals are the exception; they flip rows of index.alive in place and
+    bump the index version.
+    """
+
+    def __init__(self):
+        self.embeddings: Optional[np.ndarray] = None  # 2D projection, memory-mapped
+        self.features: Optional[np.ndarray] = None  # optional high-dimensional embeddings, same rows
+        self.projection: Optional[dict] = None  # swapped-in layout, None while embeddings_2d.npy is shown
+        self.annotations: Optional[dict] = None  # COCO top level without the 'annotations' list
+        self.table: Optional[AnnotationTable] = None  # compact annotation columns, records stay on disk
+        self.mapping: Optional[SortedIdMap] = None  # annotation_id -> embedding_index
+        self.class_names: List[str] = []
+        self.index: Optional[DatasetIndex] = None
+        self.load_id: Optional[str] = None  # source files + reload generation, part of dataset_version()
+        self.generation = 0  # reload count shared by all worker processes
+        self.layout_id: Optional[str] = None  # published 2D layout, None for embeddings_2d.npy
+        self.images_by_id: Dict[int, dict] = {}
+        # Rows grouped by image_id for per-image lookups
+        self.image_order: Optional[np.ndarray] = None
+        self.sorted_image_ids: Optional[np.ndarray] = None
+
+    def with_embeddings(self, embeddings: np.ndarray, projection: Optional[dict],
+                        layout_id: Optional[str]) -> "DatasetSnapshot":
+        """A new snapshot sharing the annotation data, laid out by another 2D embedding"""
+        snapshot = copy.copy(self)
+        snapshot.index = self.index.with_embeddings(embeddings)
+        snapshot.embeddings = embeddings
+        snapshot.projection = projection
+        snapshot.layout_id = layout_id
+        return snapshot
+
+class _SnapshotField:
+    """DataLoader attribute read from the snapshot of the current request"""
+
+    def __init__(self, default=None):
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, loader, owner=None):
+        if loader is None:
+            return self
+        snapshot = loader.get_snapshot()
+        return getattr(snapshot, self.name) if snapshot is not None else self.default
 
 class DataLoader:
+    embeddings = _SnapshotField()
+    features = _SnapshotField()
+    projection = _SnapshotField()
+    annotations = _SnapshotField()
+    table = _SnapshotField()
+    mapping = _SnapshotField()
+    class_names = _SnapshotField(())
+    index = _SnapshotField()
+    load_id = _SnapshotField()
+    generation = _SnapshotField(0)
+    layout_id = _SnapshotField()
+    images_by_id = _SnapshotField({})
+
     def __init__(self, data_dir: str = "data"):
         self.data_dir = Path(data_dir)
-        self.embeddings: Optional[np.ndarray] = None
-        self.annotations: Optional[dict] = None
-        self.mapping: Optional[Dict[int, int]] = None  # annotation_id -> embedding_index
-        self.class_names: List[str] = []
+        self._snapshot: Optional[DatasetSnapshot] = None  # latest published snapshot
+        # Removals are tombstones over the loaded records, persisted in this log
+        self.removal_log = RemovalLog(self.data_dir / "removal_log.jsonl")
+        # Reload generation and active layout, followed by every worker process
+        self.shared_state = SharedState(self.data_dir / "serving_state.json")
+        # Held while changing the published snapshot; _load_lock lets one load build at a time
+        self._sync_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # Parsed annotations, mapping and index columns, rebuilt when a source file changes
+        self.dataset_cache = DatasetCache(self.data_dir / "dataset_cache", {
+            'annotations': self.data_dir / "annotations.json",
+            'mapping': self.data_dir / "mapping.json",
+            'embeddings_2d': self.data_dir / "embeddings_2d.npy",
+        })
+        
+    def get_snapshot(self) -> Optional[DatasetSnapshot]:
+        """The snapshot this request is pinned to, else the latest one"""
+        pinned = _pinned_snapshot.get()
+        return pinned if pinned is not None else self._snapshot
+        
+    def pin(self) -> Token:
+        """Keep reading the current snapshot in this context, even if a reload publishes another"""
+        return _pinned_snapshot.set(self._snapshot)
+        
+    def unpin(self, token: Token):
+        _pinned_snapshot.reset(token)
+        
+    def _latest(self) -> DatasetSnapshot:
+        if self._snapshot is None:
+            raise RuntimeError("Data not loaded. Call load_all() first.")
+        return self._snapshot
         
     def load_all(self):
-        """Load all required data files"""
-        self.load_embeddings()
-        self.load_annotations()
-        self.load_mapping()
-        self._extract_class_names()
-        
-    def load_embeddings(self):
-        """Load embeddings from numpy file"""
+        """Load all data files into a new snapshot and publish it in one step.
+
+        Reads from the dataset cache when it is current. Requests keep
+        using the previous snapshot while this runs.
+        """
+        with self._load_lock, LOAD_PHASE_SECONDS.time(phase='total'):
+            snapshot = DatasetSnapshot()
+            with LOAD_PHASE_SECONDS.time(phase='embeddings'):
+                self.load_embeddings(snapshot)
+                self.load_features(snapshot)
+            with LOAD_PHASE_SECONDS.time(phase='cache'):
+                cached = self.load_cache(snapshot)
+            if not cached:
+                with self.dataset_cache.lock.hold():
+                    # Another worker may have rebuilt the cache while this one waited
+                    with LOAD_PHASE_SECONDS.time(phase='cache'):
+                        cached = self.load_cache(snapshot)
+                    if not cached:
+                        self._rebuild(snapshot)
+            DATASET_CACHE_LOADS.inc(result='hit' if cached else 'miss')
+            state = self.shared_state.read()
+            snapshot.generation = state.get('generation', 0)
+            snapshot.load_id = self._make_load_id(snapshot.generation)
+            layout = state.get('layout')
+            if layout and layout.get('generation') == snapshot.generation:
+                with LOAD_PHASE_SECONDS.time(phase='layout'):
+                    embeddings = self._load_layout(layout)
+                if embeddings is not None:
+                    snapshot = snapshot.with_embeddings(embeddings, layout['projection'], layout['id'])
+            with self._sync_lock, LOAD_PHASE_SECONDS.time(phase='removal_log'):
+                # Replay and publish together so no removal logged in between is lost
+                self._apply_removal_log(snapshot)
+                self._snapshot = snapshot
+        
+    def _rebuild(self, snapshot: DatasetSnapshot):
+        """Parse the source files into the snapshot and write them to the dataset cache"""
+        fingerprints = self._source_fingerprints()
+        with LOAD_PHASE_SECONDS.time(phase='annotations'):
+            self.load_annotations(snapshot)
+        with LOAD_PHASE_SECONDS.time(phase='mapping'):
+            self.load_mapping(snapshot)
+        with LOAD_PHASE_SECONDS.time(phase='index'):
+            self._extract_class_names(snapshot)
+            self._build_index(snapshot)
+        with LOAD_PHASE_SECONDS.time(phase='cache_write'):
+            self.save_cache(snapshot, fingerprints)
+        
+    def reload(self):
+        """Load all data files again, in this and every other worker process"""
+        self.shared_state.update(increment='generation', layout=None)
+        self.load_all()
+        
+    def _make_load_id(self, generation: int) -> str:
+        # Equal in every worker that loaded the same files at the same generation
+        key = hashlib.blake2b(digest_size=8)
+        key.update(str(generation).encode())
+        for path in sorted(self.dataset_cache.sources.values()) + [self.data_dir / "embeddings.npy"]:
+            if path.exists():
+                stat = path.stat()
+                key.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return key.hexdigest()
+        
+    def load_embeddings(self, snapshot: DatasetSnapshot):
+        """Memory-map embeddings from numpy file; pages are shared between worker processes"""
         embeddings_path = self.data_dir / "embeddings_2d.npy"
         if not embeddings_path.exists():
             raise FileNotFoundError(f"Embeddings file not found: {embeddings_path}")
         
-        self.embeddings = np.load(embeddings_path)
-        print(f"Loaded embeddings: {self.embeddings.shape}")
+        snapshot.embeddings = np.load(embeddings_path, mmap_mode='r')
+        print(f"Loaded embeddings: {snapshot.embeddings.shape}")
+        
+    def load_features(self, snapshot: DatasetSnapshot):
+        """Memory-map the optional high-dimensional embeddings (embeddings.npy).
+
+        Rows must line up with embeddings_2d.npy so the mapping applies to both.
+        """
+        features_path = self.data_dir / "embeddings.npy"
+        if not features_path.exists():
+            return
+            
+        features = np.load(features_path, mmap_mode='r')
+        if features.ndim != 2 or len(features) != len(snapshot.embeddings):
+            print(f"Ignoring {features_path}: shape {features.shape} does not match "
+                  f"{len(snapshot.embeddings)} embedding rows")
+            return
+        if not np.issubdtype(features.dtype, np.floating):
+            print(f"Ignoring {features_path}: dtype {features.dtype} is not floating point")
+            return
+        snapshot.features = features
+        print(f"Loaded high-dimensional embeddings: {features.shape} {features.dtype}")
         
-    def load_annotations(self):
-        """Load COCO annotations"""
+    def load_annotations(self, snapshot: DatasetSnapshot):
+        """Load COCO annotations.
+
+        The annotations list is streamed into compact columns; full records
+        are read back from annotations.json by byte offset when needed.
+        """
         annotations_path = self.data_dir / "annotations.json"
         if not annotations_path.exists():
             raise FileNotFoundError(f"Annotations file not found: {annotations_path}")
             
-        with open(annotations_path, 'r') as f:
-            self.annotations = json.load(f)
-        print(f"Loaded {len(self.annotations.get('annotations', []))} annotations")
+        snapshot.annotations, snapshot.table = load_coco_streaming(annotations_path)
+        self._build_lookups(snapshot)
+        print(f"Loaded {len(snapshot.table)} annotations")
         
-    def load_mapping(self):
+    def load_mapping(self, snapshot: DatasetSnapshot):
         """Load annotation_id to embedding index mapping"""
         mapping_path = self.data_dir / "mapping.json"
         if not mapping_path.exists():
@@ -48,124 +239,310 @@ class DataLoader:
             mapping_data = json.load(f)
             
         # Convert string keys to int if necessary
-        self.mapping = {int(k): v for k, v in mapping_data.items()}
-        print(f"Loaded mapping for {len(self.mapping)} annotations")
+        snapshot.mapping = SortedIdMap.from_dict({int(k): v for k, v in mapping_data.items()})
+        print(f"Loaded mapping for {len(snapshot.mapping)} annotations")
         
-    def _extract_class_names(self):
+    def _extract_class_names(self, snapshot: DatasetSnapshot):
         """Extract unique class names from annotations"""
-        if not self.annotations:
+        if not snapshot.annotations:
             return
             
         # Get category names from COCO categories
-        categories = self.annotations.get('categories', [])
-        self.class_names = [cat['name'] for cat in categories]
+        categories = snapshot.annotations.get('categories', [])
+        snapshot.class_names = [cat['name'] for cat in categories]
         
         # If no categories, extract from annotations directly
-        if not self.class_names and 'annotations' in self.annotations:
-            category_ids = set()
-            for ann in self.annotations['annotations']:
-                category_ids.add(ann.get('category_id'))
-            self.class_names = [f"class_{cid}" for cid in sorted(category_ids)]
+        if not snapshot.class_names and snapshot.table is not None:
+            category_ids = np.unique(snapshot.table.category_ids)
+            snapshot.class_names = [f"class_{cid}" for cid in category_ids.tolist()]
             
-        print(f"Found {len(self.class_names)} classes: {self.class_names}")
+        print(f"Found {len(snapshot.class_names)} classes: {snapshot.class_names}")
         
-    def get_embedding_points(self, class_filter: Optional[str] = None) -> List[dict]:
-        """Get embedding points with class information"""
-        if self.embeddings is None or self.annotations is None or self.mapping is None:
-            raise RuntimeError("Data not loaded. Call load_all() first.")
+    def _build_lookups(self, snapshot: DatasetSnapshot, image_order: Optional[np.ndarray] = None):
+        """Build the image lookups; annotation ids are looked up through the index"""
+        if image_order is None:
+            image_order = np.argsort(snapshot.table.image_ids, kind='stable')
+        snapshot.image_order = image_order
+        snapshot.sorted_image_ids = snapshot.table.image_ids[image_order]
+        snapshot.images_by_id = {img['id']: img for img in snapshot.annotations.get('images', [])}
         
-        points = []
+    def _build_index(self, snapshot: DatasetSnapshot):
+        """Build the columnar index used by all read paths"""
+        snapshot.index = DatasetIndex.build(snapshot.table, snapshot.annotations.get('categories', []),
+                                            snapshot.mapping, snapshot.embeddings)
+        print(f"Indexed {int(snapshot.index.has_point.sum())} embedding points")
         
-        # Create category_id to name mapping
-        cat_id_to_name = {}
-        if 'categories' in self.annotations:
-            cat_id_to_name = {cat['id']: cat['name'] for cat in self.annotations['categories']}
+    def _source_fingerprints(self) -> Optional[Dict]:
+        try:
+            return self.dataset_cache.fingerprints()
+        except OSError:
+            return None
         
-        for annotation in self.annotations['annotations']:
-            annotation_id = annotation['id']
-            category_id = annotation.get('category_id')
+    def load_cache(self, snapshot: DatasetSnapshot) -> bool:
+        """Memory-map annotations, mapping and index columns from the dataset cache.
+
+        Returns False when the cache is missing or older than the source files.
+        """
+        cached = self.dataset_cache.load()
+        if cached is None:
+            return False
             
-            # Get class name
-            if cat_id_to_name:
-                class_name = cat_id_to_name.get(category_id, f"class_{category_id}")
+        columns = cached['columns']
+        snapshot.annotations = cached['coco']
+        snapshot.table = AnnotationTable(self.data_dir / "annotations.json", columns)
+        snapshot.mapping = SortedIdMap(columns['mapping_keys'], columns['mapping_values'])
+        snapshot.class_names = cached['class_names']
+        self._build_lookups(snapshot, columns['image_order'])
+        snapshot.index = DatasetIndex(snapshot.table.ids, columns['class_codes'], cached['index_class_names'],
+                                      columns['embedding_rows'], columns['has_point'],
+                                      columns['x'], columns['y'], columns['id_order'])
+        print(f"Loaded dataset cache: {len(snapshot.table)} annotations, "
+              f"{int(snapshot.index.has_point.sum())} embedding points")
+        return True
+        
+    def save_cache(self, snapshot: DatasetSnapshot, fingerprints: Optional[Dict]):
+        """Write the parsed dataset to the cache, keyed by the source fingerprints taken before parsing"""
+        if fingerprints is None:
+            return
+        columns = dict(snapshot.table.columns(), **snapshot.index.columns())
+        columns['mapping_keys'] = snapshot.mapping.keys_array
+        columns['mapping_values'] = snapshot.mapping.values_array
+        columns['image_order'] = snapshot.image_order
+        try:
+            self.dataset_cache.save(fingerprints, columns, coco=snapshot.annotations,
+                                    class_names=snapshot.class_names,
+                                    index_class_names=snapshot.index.class_names)
+        except OSError as e:
+            print(f"Could not write dataset cache: {e}")
+        
+    def _apply_removal_log(self, snapshot: DatasetSnapshot):
+        """Replay logged removals over a freshly loaded snapshot"""
+        self.removal_log.open(self.data_dir / "annotations.json")
+        removed = snapshot.index.remove(list(self.removal_log.removed_ids()))
+        if removed:
+            print(f"Applied {removed} logged removals")
+        
+    def get_index(self) -> DatasetIndex:
+        """Get the columnar index, failing if data is not loaded"""
+        index = self.index
+        if index is None:
+            raise RuntimeError("Data not loaded. Call load_all() first.")
+        return index
+        
+    def dataset_version(self) -> str:
+        """Changes whenever served data may change: reloads, removals, undos and layout swaps.
+
+        Built only from state shared between worker processes, so every
+        worker that has synced reports the same version.
+        """
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            raise RuntimeError("Data not loaded. Call load_all() first.")
+        return f"{snapshot.load_id}.{snapshot.layout_id or 'base'}.{self.removal_log.offset}"
+        
+    def needs_sync(self) -> bool:
+        """Cheap check for changes made by other worker processes"""
+        return self._snapshot is not None and (self.shared_state.changed() or self.removal_log.changed())
+        
+    def sync(self):
+        """Catch up with reloads, layouts and removals published by other worker processes"""
+        if self._snapshot is None:
+            return
+        state = self.shared_state.read()
+        if state.get('generation', 0) != self._snapshot.generation:
+            self.load_all()
+            return
+        layout = state.get('layout')
+        if (layout or {}).get('id') != self._snapshot.layout_id:
+            self._apply_layout(layout)
+        with self._sync_lock:
+            self._apply_log_changes()
+        
+    def _apply_log_changes(self) -> Dict[tuple, int]:
+        """Apply logged removals and undos not yet in the index; returns rows changed per (op, batch)"""
+        counts = {}
+        for op, batch, annotation_ids in self.removal_log.poll():
+            if op == 'remove':
+                counts[(op, batch)] = self.discard_annotations(annotation_ids)
             else:
-                class_name = f"class_{category_id}"
-                
-            # Skip if class filter is applied and doesn't match
-            if class_filter and class_filter != class_name:
-                continue
-                
-            # Get embedding index
-            if annotation_id not in self.mapping:
-                continue
-                
-            embedding_idx = self.mapping[annotation_id]
-            if embedding_idx >= len(self.embeddings):
-                continue
-                
-            # Get 2D coordinates
-            x, y = self.embeddings[embedding_idx]
-            
-            points.append({
-                'annotation_id': annotation_id,
-                'x': float(x),
-                'y': float(y),
-                'class_name': class_name
-            })
-            
-        return points
+                counts[(op, batch)] = self.restore_annotations(annotation_ids)
+        return counts
+        
+    def log_removal(self, annotation_ids: List[int]) -> Tuple[int, int]:
+        """Durably remove annotations for all workers, returns (batch id, rows removed)"""
+        with self._sync_lock:
+            batch = self.removal_log.append_removal(annotation_ids)
+            return batch, self._apply_log_changes().get(('remove', batch), 0)
+        
+    def log_undo(self, batch: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        """Undo a removal batch for all workers, returns (batch id, rows restored) or None"""
+        with self._sync_lock:
+            undone = self.removal_log.append_undo(batch)
+            if undone is None:
+                return None
+            batch = undone[0]
+            return batch, self._apply_log_changes().get(('undo', batch), 0)
+        
+    def swap_embeddings(self, embeddings: np.ndarray, projection: Optional[dict] = None, publish: bool = True):
+        """Show another 2D layout without reloading annotations.
+
+        embeddings is indexed like embeddings_2d.npy; NaN rows are hidden.
+        A new snapshot with a new index is published, so caches bound to the
+        index are dropped. Unless publish is False the layout is written to
+        projection_cache and announced to the other worker processes.
+        """
+        layout_id = f"{projection['job_id']}_{projection['method']}" if projection else None
+        with self._sync_lock:
+            snapshot = self._latest().with_embeddings(embeddings, projection, layout_id)
+            self._snapshot = snapshot
+        if publish:
+            self._publish_layout(snapshot)
+        
+    def _publish_layout(self, snapshot: DatasetSnapshot):
+        if snapshot.layout_id is None:
+            self.shared_state.update(layout=None)
+            return
+        path = self.data_dir / "projection_cache" / f"layout_{snapshot.layout_id}.npy"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(path.name + ".tmp")
+        with open(temp_path, 'wb') as f:
+            np.save(f, np.asarray(snapshot.embeddings, dtype=np.float32))
+        os.replace(temp_path, path)
+        self.shared_state.update(layout={'id': snapshot.layout_id, 'file': path.name,
+                                         'projection': snapshot.projection, 'generation': snapshot.generation})
+        
+    def _load_layout(self, layout: dict) -> Optional[np.ndarray]:
+        path = self.data_dir / "projection_cache" / layout['file']
+        try:
+            return np.load(path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            print(f"Could not load published layout {path}: {e}")
+            return None
+        
+    def _apply_layout(self, layout: Optional[dict]):
+        """Show a layout another worker published, or embeddings_2d.npy for None"""
+        if layout is None:
+            self.swap_embeddings(np.load(self.data_dir / "embeddings_2d.npy", mmap_mode='r'), publish=False)
+            return
+        embeddings = self._load_layout(layout)
+        if embeddings is not None:
+            self.swap_embeddings(embeddings, layout['projection'], publish=False)
+        
+    def reset_embeddings(self):
+        """Go back to the layout in embeddings_2d.npy"""
+        self.swap_embeddings(np.load(self.data_dir / "embeddings_2d.npy", mmap_mode='r'))
+        
+    def has_features(self) -> bool:
+        """Whether high-dimensional embeddings are available"""
+        return self.features is not None
+        
+    def get_features(self, rows: np.ndarray) -> np.ndarray:
+        """High-dimensional embeddings of index rows as float32; rows must have a point"""
+        snapshot = self.get_snapshot()
+        if snapshot is None or snapshot.features is None:
+            raise RuntimeError("High-dimensional embeddings not loaded")
+        embedding_rows = snapshot.index.embedding_rows[rows]
+        return np.asarray(snapshot.features[embedding_rows], dtype=np.float32)
+        
+    def get_embedding_points(self, class_filter: Optional[str] = None) -> List[dict]:
+        """Get embedding points with class information"""
+        index = self.get_index()
+        return index.points(index.point_mask(class_filter))
+        
+    def get_embedding_points_binary(self, class_filter: Optional[str] = None) -> bytes:
+        """Get embedding points packed as typed arrays (see point_codec)"""
+        index = self.get_index()
+        return encode_points(index, index.point_mask(class_filter))
+        
+    def get_class_counts(self, class_filter: Optional[str] = None) -> Dict[str, int]:
+        """Get number of embedding points per class"""
+        index = self.get_index()
+        return index.class_counts(index.point_mask(class_filter))
         
     def get_annotations_in_selection(self, x_min: float, x_max: float, 
-                                   y_min: float, y_max: float) -> List[int]:
-        """Get annotation IDs within the selection rectangle"""
-        points = self.get_embedding_points()
-        
-        selected_ids = []
-        for point in points:
-            if (x_min <= point['x'] <= x_max and 
-                y_min <= point['y'] <= y_max):
-                selected_ids.append(point['annotation_id'])
-                
-        return selected_ids
+                                   y_min: float, y_max: float,
+                                   class_filter: Optional[str] = None,
+                                   polygon: Optional[List[List[float]]] = None) -> List[int]:
+        """Get annotation IDs within the selection rectangle or lasso polygon"""
+        index = self.get_index()
+        rows = index.select_rows(x_min, x_max, y_min, y_max,
+                                 class_filter=class_filter, polygon=polygon)
+        return index.annotation_ids[rows].tolist()
         
     def get_annotation_by_id(self, annotation_id: int) -> Optional[dict]:
-        """Get annotation data by ID"""
-        if not self.annotations:
-            return None
+        """Get the full annotation record by ID, parsed from annotations.json"""
+        snapshot = self.get_snapshot()
+        row = self.get_index().row_for_id(annotation_id)
+        return snapshot.table.record(row) if row is not None else None
+        
+    def get_annotation_fields(self, annotation_id: int) -> Optional[dict]:
+        """Get id, image_id, category_id, bbox and score of an annotation without touching disk"""
+        snapshot = self.get_snapshot()
+        row = self.get_index().row_for_id(annotation_id)
+        return snapshot.table.fields(row) if row is not None else None
+        
+    def get_image_info(self, image_id: int) -> Optional[dict]:
+        """Get COCO image record by ID"""
+        return self.images_by_id.get(image_id)
+        
+    def get_image_annotation_ids(self, image_id: int) -> List[int]:
+        """Get IDs of the live annotations on an image"""
+        snapshot = self.get_snapshot()
+        index = self.get_index()
+        start, stop = np.searchsorted(snapshot.sorted_image_ids, [image_id, image_id + 1])
+        rows = snapshot.image_order[start:stop]
+        return index.annotation_ids[rows[index.alive[rows]]].tolist()
+        
+    def get_live_annotation_count(self) -> int:
+        """Get number of annotations that have not been removed"""
+        return int(self.get_index().alive.sum())
+        
+    def iter_live_annotations(self) -> Iterator[dict]:
+        """Iterate annotation records that have not been removed, in file order"""
+        table = self.table
+        for row in np.flatnonzero(self.get_index().alive).tolist():
+            yield table.record(row)
             
-        for annotation in self.annotations['annotations']:
-            if annotation['id'] == annotation_id:
-                return annotation
-        return None
-        
-    def remove_annotations(self, annotation_ids: List[int]) -> str:
-        """Remove annotations and save to new file"""
-        if not self.annotations:
-            raise RuntimeError("Annotations not loaded")
+    def iter_live_raw_annotations(self) -> Iterator[bytes]:
+        """Iterate the original JSON bytes of live annotations, in file order"""
+        table = self.table
+        for row in np.flatnonzero(self.get_index().alive).tolist():
+            yield table.raw_record(row)
             
-        # Filter out the annotations to remove
-        original_count = len(self.annotations['annotations'])
-        self.annotations['annotations'] = [
-            ann for ann in self.annotations['annotations']
-            if ann['id'] not in annotation_ids
-        ]
-        
-        removed_count = original_count - len(self.annotations['annotations'])
-        
-        # Save to filtered annotations directory
-        output_dir = self.data_dir / "filtered_annotations"
-        output_dir.mkdir(exist_ok=True)
-        
-        # Generate filename with timestamp
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = output_dir / f"filtered_annotations_{timestamp}.json"
-        
-        with open(output_file, 'w') as f:
-            json.dump(self.annotations, f, indent=2)
+    def alive_state(self, index: DatasetIndex) -> Tuple[np.ndarray, int]:
+        """A copy of index.alive and the version it belongs to, taken together.
+
+        Removals and undos flip alive under the sync lock, so the copy
+        never holds half of a batch.
+        """
+        with self._sync_lock:
+            return index.alive.copy(), index.version
             
-        print(f"Removed {removed_count} annotations, saved to {output_file}")
-        return str(output_file)
+    def discard_annotations(self, annotation_ids: List[int]) -> int:
+        """Mask annotations out of the index, returns the number removed.
 
+        The records themselves are left untouched so removals can be undone.
+        Always applied to the latest snapshot, whichever one the caller reads.
+        """
+        if self._snapshot is None or not self._snapshot.annotations:
+            raise RuntimeError("Annotations not loaded")
+        return self._snapshot.index.remove(annotation_ids)
+        
+    def restore_annotations(self, annotation_ids: List[int]) -> int:
+        """Bring previously discarded annotations back, returns the number restored"""
+        return self._latest().index.restore(annotation_ids)
+        
 # Global data loader instance
-data_loader = DataLoader()
\ No newline at end of file
+data_loader = DataLoader()
+
+def _dataset_samples():
+    snapshot = data_loader.get_snapshot()
+    if snapshot is None or snapshot.index is None:
+        return []
+    return [
+        ('dataset_live_annotations', 'gauge', 'Annotations that have not been removed',
+         [({}, int(snapshot.index.alive.sum()))]),
+        ('dataset_generation', 'gauge', 'Reload generation of the served dataset', [({}, snapshot.generation)]),
+    ]
+
+metrics.add_collector(_dataset_samples)
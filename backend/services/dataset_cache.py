@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+import numpy as np
+from .shared_state import FileLock
+
+CACHE_FORMAT = 2
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+def file_digest(path: Path) -> str:
+    """Hash of the whole file"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_fingerprint(path: Path) -> Dict:
+    """Size, mtime and content hash of a file"""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': file_digest(path)}
+
+def fingerprint_matches(path: Path, stored: Dict) -> bool:
+    """Whether a file still matches its stored fingerprint.
+
+    An unchanged size and mtime is trusted; if the mtime moved (a touch,
+    copy or checkout) the whole file is hashed, so only a content change
+    counts as a change.
+    """
+    stat = os.stat(path)
+    if stat.st_size != stored.get('size'):
+        return False
+    if stat.st_mtime_ns == stored.get('mtime_ns'):
+        return True
+    return stored.get('digest') is not None and file_digest(path) == stored['digest']
+
+class DatasetCache:
+    """Preprocessed dataset columns as .npy files, memory-mapped on load.
+
+    meta.json records the fingerprint of every source file; the cache is
+    used only while all of them match (see fingerprint_matches), so a
+    copied or touched file does not force a rebuild but any edit does.
+    Worker processes rebuild while holding `lock`, one at a time.
+    """
+
+    def __init__(self, cache_dir: Path, sources: Dict[str, Path]):
+        self.cache_dir = Path(cache_dir)
+        self.sources = sources
+        self.meta_path = self.cache_dir / "meta.json"
+        self.lock = FileLock(self.cache_dir.with_name(self.cache_dir.name + ".lock"))
+
+    def fingerprints(self) -> Dict[str, Dict]:
+        return {name: file_fingerprint(path) for name, path in self.sources.items()}
+
+    def _matches(self, stored: Dict[str, Dict]) -> bool:
+        if set(stored) != set(self.sources):
+            return False
+        return all(fingerprint_matches(path, stored[name]) for name, path in self.sources.items())
+
+    def load(self) -> Optional[Dict]:
+        """Load the cached dataset, None if it is missing or stale"""
+        try:
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta.get('format') != CACHE_FORMAT or not self._matches(meta['fingerprints']):
+                return None
+            meta['columns'] = {
+                name: np.load(self.cache_dir / f"{name}.npy", mmap_mode='r')
+                for name in meta['columns']
+            }
+            return meta
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, fingerprints: Dict[str, Dict], columns: Dict[str, np.ndarray], **fields):
+        """Write the columns and meta.json; meta.json goes last so a torn write reads as stale.
+
+        Call with `lock` held so no other process writes the cache at the same time.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if self.meta_path.exists():
+            self.meta_path.unlink()
+
+        for name, values in columns.items():
+            temp_path = self.cache_dir / f"{name}.npy.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(values))
+            os.replace(temp_path, self.cache_dir / f"{name}.npy")
+
+        meta = dict(fields, format=CACHE_FORMAT, fingerprints=fingerprints, columns=sorted(columns))
+        temp_path = self.meta_path.with_name(f"{self.meta_path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self.meta_path)
@@ -0,0 +1,217 @@
+import numpy as np
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+from .coco_stream import AnnotationTable
+from .spatial_index import GridIndex
+
+class SortedIdMap(Mapping):
+    """Read-only int -> int mapping over sorted key and value arrays"""
+
+    def __init__(self, keys: np.ndarray, values: np.ndarray):
+        self.keys_array = keys
+        self.values_array = values
+
+    @classmethod
+    def from_dict(cls, mapping: Dict[int, int]) -> "SortedIdMap":
+        keys = np.fromiter(mapping.keys(), dtype=np.int64, count=len(mapping))
+        values = np.fromiter(mapping.values(), dtype=np.int64, count=len(mapping))
+        order = np.argsort(keys)
+        return cls(keys[order], values[order])
+
+    def lookup(self, keys: np.ndarray, default: int = -1) -> np.ndarray:
+        """Vectorized get, missing keys map to default"""
+        result = np.full(len(keys), default, dtype=np.int64)
+        if len(self.keys_array) and len(keys):
+            pos = np.minimum(np.searchsorted(self.keys_array, keys), len(self.keys_array) - 1)
+            found = self.keys_array[pos] == keys
+            result[found] = self.values_array[pos[found]]
+        return result
+
+    def __getitem__(self, key: int) -> int:
+        value = int(self.lookup(np.array([key], dtype=np.int64))[0])
+        if value == -1 and key not in self:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        pos = np.searchsorted(self.keys_array, key)
+        return bool(pos < len(self.keys_array) and self.keys_array[pos] == key)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.keys_array.tolist())
+
+    def __len__(self) -> int:
+        return len(self.keys_array)
+
+class DatasetIndex:
+    """Columnar view of the annotations joined with their 2D embeddings.
+
+    Built once per load; every read path answers from these arrays with
+    vectorized masks instead of walking the COCO dict. The columns can
+    come from build() or straight from the dataset cache.
+    """
+
+    def __init__(self, annotation_ids: np.ndarray, class_codes: np.ndarray, class_names: List[str],
+                 embedding_rows: np.ndarray, has_point: np.ndarray, x: np.ndarray, y: np.ndarray,
+                 id_order: Optional[np.ndarray] = None):
+        self.annotation_ids = annotation_ids
+        self.class_codes = class_codes
+        self.class_names: List[str] = list(class_names)
+        self._code_by_name: Dict[str, int] = {name: code for code, name in enumerate(self.class_names)}
+        self.embedding_rows = embedding_rows
+        self.has_point = has_point
+        self.x = x
+        self.y = y
+
+        # Rows stay in place on removal, they are only masked out;
+        # version is bumped on every removal so derived caches can invalidate
+        self.alive = np.ones(len(annotation_ids), dtype=bool)
+        self.version = 0
+        self.grid = GridIndex(self.x, self.y, np.flatnonzero(self.has_point))
+
+        # annotation_id -> row index
+        if id_order is None:
+            id_order = np.argsort(self.annotation_ids, kind='stable')
+        self._id_order = id_order
+        self._sorted_ids = self.annotation_ids[self._id_order]
+
+    @classmethod
+    def build(cls, table: AnnotationTable, categories: List[dict],
+              mapping: SortedIdMap, embeddings: np.ndarray) -> "DatasetIndex":
+        """Derive the index columns from the annotation table, mapping and 2D embeddings"""
+        count = len(table)
+
+        # Class codes follow the COCO categories order, unknown category ids are appended
+        cat_id_to_name = {cat['id']: cat['name'] for cat in categories}
+        class_names = list(dict.fromkeys(cat_id_to_name.values()))
+        code_by_name = {name: code for code, name in enumerate(class_names)}
+        category_ids, inverse = np.unique(table.category_ids, return_inverse=True)
+        code_by_category = np.empty(len(category_ids), dtype=np.int32)
+        for position, cid in enumerate(category_ids.tolist()):
+            name = cat_id_to_name.get(cid, f"class_{cid if cid >= 0 else None}")
+            if name not in code_by_name:
+                code_by_name[name] = len(class_names)
+                class_names.append(name)
+            code_by_category[position] = code_by_name[name]
+        class_codes = code_by_category[inverse] if count else np.empty(0, dtype=np.int32)
+
+        # Join annotation ids against the mapping with a sorted lookup
+        embedding_rows = mapping.lookup(table.ids)
+        has_point, x, y = cls._coordinates(embedding_rows, embeddings)
+        return cls(table.ids, class_codes, class_names, embedding_rows, has_point, x, y)
+
+    @staticmethod
+    def _coordinates(embedding_rows: np.ndarray, embeddings: np.ndarray):
+        """Look up 2D coordinates per row; rows without a finite point get NaN"""
+        count = len(embedding_rows)
+        has_point = (embedding_rows >= 0) & (embedding_rows < len(embeddings))
+        x = np.full(count, np.nan, dtype=np.float64)
+        y = np.full(count, np.nan, dtype=np.float64)
+        coords = np.asarray(embeddings[embedding_rows[has_point]])
+        if len(coords):
+            x[has_point] = coords[:, 0]
+            y[has_point] = coords[:, 1]
+        has_point &= np.isfinite(x) & np.isfinite(y)
+        return has_point, x, y
+
+    def with_embeddings(self, embeddings: np.ndarray) -> "DatasetIndex":
+        """A new index over the same annotations laid out by another 2D embedding.
+
+        Removals carry over; rows whose new coordinates are NaN drop out of
+        the point set.
+        """
+        has_point, x, y = self._coordinates(self.embedding_rows, embeddings)
+        index = DatasetIndex(self.annotation_ids, self.class_codes, self.class_names,
+                             self.embedding_rows, has_point, x, y, self._id_order)
+        index.alive = self.alive.copy()
+        index.version = self.version + 1
+        return index
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """The derived columns, as stored in the dataset cache"""
+        return {
+            'class_codes': self.class_codes, 'embedding_rows': self.embedding_rows,
+            'has_point': self.has_point, 'x': self.x, 'y': self.y, 'id_order': self._id_order,
+        }
+
+    def __len__(self) -> int:
+        return len(self.annotation_ids)
+
+    def rows_for_ids(self, annotation_ids: Iterable[int], alive_only: bool = True) -> np.ndarray:
+        """Get row indices for the given annotation IDs, unknown IDs are dropped"""
+        ids = np.unique(np.asarray(list(annotation_ids), dtype=np.int64))
+        if ids.size == 0 or len(self._sorted_ids) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        pos = np.minimum(np.searchsorted(self._sorted_ids, ids), len(self._sorted_ids) - 1)
+        rows = self._id_order[pos[self._sorted_ids[pos] == ids]]
+        if alive_only:
+            rows = rows[self.alive[rows]]
+        return rows
+
+    def row_for_id(self, annotation_id: int) -> Optional[int]:
+        """Get the row index of a live annotation"""
+        rows = self.rows_for_ids([annotation_id])
+        return int(rows[0]) if len(rows) else None
+
+    def point_mask(self, class_filter: Optional[str] = None) -> np.ndarray:
+        """Mask of live rows that have an embedding, optionally restricted to one class"""
+        mask = self.has_point & self.alive
+        if class_filter:
+            code = self._code_by_name.get(class_filter)
+            if code is None:
+                return np.zeros_like(mask)
+            mask &= self.class_codes == code
+        return mask
+
+    def select_rows(self, x_min: float, x_max: float, y_min: float, y_max: float,
+                    class_filter: Optional[str] = None,
+                    polygon: Optional[Sequence[Sequence[float]]] = None) -> np.ndarray:
+        """Rows of live points inside the rectangle, or the polygon when given, in annotation order"""
+        if polygon is not None:
+            rows = self.grid.query_polygon(polygon)
+        else:
+            rows = self.grid.query_rect(x_min, x_max, y_min, y_max)
+        keep = self.alive[rows]
+        if class_filter:
+            keep &= self.class_codes[rows] == self._code_by_name.get(class_filter, -1)
+        return np.sort(rows[keep])
+
+    def points(self, mask: np.ndarray) -> List[dict]:
+        """Materialize the masked rows as point dicts"""
+        return self.points_for_rows(np.flatnonzero(mask))
+
+    def points_for_rows(self, rows: np.ndarray) -> List[dict]:
+        """Materialize the given rows as point dicts"""
+        names = self.class_names
+        return [
+            {'annotation_id': annotation_id, 'x': x, 'y': y, 'class_name': names[code]}
+            for annotation_id, x, y, code in zip(
+                self.annotation_ids[rows].tolist(),
+                self.x[rows].tolist(),
+                self.y[rows].tolist(),
+                self.class_codes[rows].tolist(),
+            )
+        ]
+
+    def class_counts(self, mask: np.ndarray) -> Dict[str, int]:
+        """Count masked rows per class name"""
+        counts = np.bincount(self.class_codes[mask], minlength=len(self.class_names))
+        return {self.class_names[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+
+    def remove(self, annotation_ids: Iterable[int]) -> int:
+        """Mask out annotations, returns the number of rows newly removed"""
+        rows = self.rows_for_ids(annotation_ids)
+        if len(rows):
+            self.alive[rows] = False
+            self.version += 1
+        return len(rows)
+
+    def restore(self, annotation_ids: Iterable[int]) -> int:
+        """Unmask removed annotations, returns the number of rows restored"""
+        rows = self.rows_for_ids(annotation_ids, alive_only=False)
+        rows = rows[~self.alive[rows]]
+        if len(rows):
+            self.alive[rows] = True
+            self.version += 1
+        return len(rows)
@@ -0,0 +1,141 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from .metrics import metrics
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when a pool already has its maximum number of queued tasks"""
+
+    def __init__(self, pool_name: str):
+        super().__init__(f"{pool_name} pool is saturated, retry later")
+        self.pool_name = pool_name
+
+class BoundedPool:
+    """Executor wrapper that rejects work instead of queueing without limit.
+
+    The pending counter is only touched from the event loop thread, so it
+    needs no lock.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Executor], max_pending: int):
+        self.name = name
+        self.max_pending = max_pending
+        self._factory = factory
+        self._executor: Optional[Executor] = None
+        self.pending = 0
+        self.rejected = 0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = self._factory()
+        return self._executor
+
+    def _in_context(self, call: Callable) -> Callable:
+        # Thread pools run calls in the caller's context, so they read the
+        # dataset snapshot the request is pinned to; process pools cannot
+        if isinstance(self.executor, ThreadPoolExecutor):
+            return functools.partial(contextvars.copy_context().run, call)
+        return call
+
+    def _reserve(self, count: int):
+        if self.pending + count > self.max_pending:
+            self.rejected += 1
+            raise PoolSaturatedError(self.name)
+        self.pending += count
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run one call in the pool"""
+        self._reserve(1)
+        try:
+            loop = asyncio.get_running_loop()
+            call = self._in_context(functools.partial(fn, *args, **kwargs))
+            return await loop.run_in_executor(self.executor, call)
+        finally:
+            self.pending -= 1
+
+    async def map(self, fn: Callable, calls: Sequence[Tuple]) -> List[Any]:
+        """Run fn(*args) for every args tuple; all slots are reserved up front"""
+        if not calls:
+            return []
+        self._reserve(len(calls))
+        try:
+            loop = asyncio.get_running_loop()
+            return await asyncio.gather(*[
+                loop.run_in_executor(self.executor, self._in_context(functools.partial(fn, *args))) for args in calls
+            ])
+        finally:
+            self.pending -= len(calls)
+
+    def spawn(self, fn: Callable, *args, **kwargs) -> "asyncio.Future":
+        """Start one call in the background; the slot is reserved before this returns.
+
+        Unlike run, the call does not inherit the caller's context: a
+        background job outlives the request and reads the latest snapshot.
+        """
+        self._reserve(1)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        # Done callbacks run on the event loop thread, like the other counter updates
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        self.pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {'pending': self.pending, 'max_pending': self.max_pending, 'rejected': self.rejected}
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+# Pool sizes come from the environment:
+#   CPU_THREADS        threads for image work that needs in-process state (caches, data_loader)
+#   CROP_PROCESSES     worker processes for per-image crop rendering; 0 renders on
+#                      cpu_pool threads and keeps the decoded image cache in play
+#   IO_THREADS         threads for blocking file I/O (annotation saves, reloads, crop cache lookups)
+#   JOB_THREADS        threads for long background jobs (2D projections)
+#   MAX_PENDING_TASKS  queued + running tasks per pool before requests get a 503
+CPU_THREADS = _env_int("CPU_THREADS", min(8, os.cpu_count() or 1))
+CROP_PROCESSES = _env_int("CROP_PROCESSES", 0)
+IO_THREADS = _env_int("IO_THREADS", 4)
+JOB_THREADS = _env_int("JOB_THREADS", 1)
+MAX_PENDING_TASKS = _env_int("MAX_PENDING_TASKS", 256)
+
+cpu_pool = BoundedPool("cpu", lambda: ThreadPoolExecutor(max_workers=CPU_THREADS, thread_name_prefix="cpu"),
+                       MAX_PENDING_TASKS)
+process_pool: Optional[BoundedPool] = None
+if CROP_PROCESSES > 0:
+    process_pool = BoundedPool("process", lambda: ProcessPoolExecutor(max_workers=CROP_PROCESSES),
+                               MAX_PENDING_TASKS)
+io_pool = BoundedPool("io", lambda: ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="io"),
+                      MAX_PENDING_TASKS)
+job_pool = BoundedPool("job", lambda: ThreadPoolExecutor(max_workers=JOB_THREADS, thread_name_prefix="job"),
+                       MAX_PENDING_TASKS)
+
+def all_pools() -> List[BoundedPool]:
+    return [pool for pool in (cpu_pool, process_pool, io_pool, job_pool) if pool is not None]
+
+def shutdown_pools():
+    for pool in all_pools():
+        pool.shutdown()
+
+def _pool_samples():
+    pools = all_pools()
+    return [
+        ('pool_pending_tasks', 'gauge', 'Queued and running tasks per pool',
+         [({'pool': pool.name}, pool.pending) for pool in pools]),
+        ('pool_rejected_total', 'counter', 'Tasks rejected because the pool was saturated',
+         [({'pool': pool.name}, pool.rejected) for pool in pools]),
+    ]
+
+metrics.add_collector(_pool_samples)
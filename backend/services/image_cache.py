@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+class DecodedImageCache:
+    """LRU of decoded source images bounded by total pixel bytes.
+
+    Keyed by image path and decode scale so sibling crops from the same
+    frame share one decode.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._images: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def get_first(self, keys: List[str]) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """Get the first cached key of several candidates, counted as one lookup"""
+        with self._lock:
+            for key in keys:
+                image = self._images.get(key)
+                if image is not None:
+                    self._images.move_to_end(key)
+                    self.hits += 1
+                    return key, image
+            self.misses += 1
+            return None, None
+
+    def put(self, key: str, image: np.ndarray):
+        if image.nbytes > self.max_bytes:
+            return
+        # Cached arrays are shared between requests, keep them read-only
+        image.setflags(write=False)
+        with self._lock:
+            previous = self._images.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._images[key] = image
+            self._bytes += image.nbytes
+            while self._bytes > self.max_bytes:
+                _, old = self._images.popitem(last=False)
+                self._bytes -= old.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._images),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
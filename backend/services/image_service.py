@@ -2,105 +2,401 @@ import cv2
 import numpy as np
 from PIL import Image
 import io
+import time
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+from .crop_cache import CropCache
+from .image_cache import DecodedImageCache
 from .data_loader import data_loader
+from .executors import cpu_pool, io_pool, process_pool
+from .metrics import metrics
+from .thumbnail_atlas import ThumbnailAtlas
+
+# Output format -> (PIL format, media type)
+CROP_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+    'png': ('PNG', 'image/png'),
+}
+
+# Per-stage crop timings; stages run in worker processes (CROP_PROCESSES) record
+# into that process's registry and do not show up in /metrics
+CROP_STAGE_SECONDS = metrics.histogram('crop_stage_seconds', 'Time spent in each stage of crop rendering',
+                                       ('stage',))
+
+# Formats libjpeg can decode at 1/2, 1/4 or 1/8 scale directly
+REDUCED_DECODE_SUFFIXES = {'.jpg', '.jpeg'}
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+def _reduction_factor(image_path: Path, annotations: List[dict], padding: int,
+                      size: Optional[int]) -> int:
+    """Largest JPEG decode reduction that still leaves every crop at least `size` pixels"""
+    if not size or image_path.suffix.lower() not in REDUCED_DECODE_SUFFIXES:
+        return 1
+    smallest_region = min(max(annotation['bbox'][2], annotation['bbox'][3]) + 2 * padding
+                          for annotation in annotations)
+    for factor in (8, 4, 2):
+        if smallest_region / factor >= size:
+            return factor
+    return 1
+
+def _decode_image(image_path: str, factor: int = 1) -> Optional[np.ndarray]:
+    """Decode an image as BGR, at 1/factor scale for JPEGs"""
+    with CROP_STAGE_SECONDS.time(stage='decode'):
+        return cv2.imread(image_path, REDUCED_DECODE_FLAGS[factor])
+
+def _crop_array(image: np.ndarray, annotation: dict, padding: int,
+                size: Optional[int], factor: int = 1) -> np.ndarray:
+    """Cut the padded bbox out of a decoded image and resize it.
+
+    `factor` is the reduction the image was decoded at; bbox and padding
+    are scaled down to match.
+    """
+    start = time.perf_counter()
+    # Get image dimensions
+    img_height, img_width = image.shape[:2]
+
+    # Extract bbox coordinates (COCO format: [x, y, width, height])
+    x, y, w, h = annotation['bbox']
+    if factor > 1:
+        x, y, w, h = x / factor, y / factor, w / factor, h / factor
+        padding = round(padding / factor)
+    x, y, w, h = int(x), int(y), int(w), int(h)
+
+    # Add padding and ensure within image bounds
+    x1 = max(0, x - padding)
+    y1 = max(0, y - padding)
+    x2 = min(img_width, x + w + padding)
+    y2 = min(img_height, y + h + padding)
+
+    # Crop the region
+    cropped = image[y1:y2, x1:x2]
+    CROP_STAGE_SECONDS.observe(time.perf_counter() - start, stage='crop')
+
+    start = time.perf_counter()
+    if size:
+        # Fit into a size x size thumbnail, keeping the aspect ratio
+        scale = size / max(cropped.shape[:2])
+        thumb_size = (max(1, round(cropped.shape[1] * scale)), max(1, round(cropped.shape[0] * scale)))
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+        cropped = cv2.resize(cropped, thumb_size, interpolation=interpolation)
+    elif cropped.shape[0] < 64 or cropped.shape[1] < 64:
+        # Resize if too small (minimum 64x64)
+        cropped = cv2.resize(cropped, (64, 64), interpolation=cv2.INTER_CUBIC)
+    else:
+        return cropped
+    CROP_STAGE_SECONDS.observe(time.perf_counter() - start, stage='resize')
+
+    return cropped
+
+def _encode_image(image: np.ndarray, format: str) -> bytes:
+    """Encode a BGR array with PIL"""
+    start = time.perf_counter()
+    # Convert BGR to RGB
+    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    # Convert to PIL Image and save to bytes
+    pil_image = Image.fromarray(image_rgb)
+    img_buffer = io.BytesIO()
+    pil_image.save(img_buffer, format=CROP_FORMATS[format][0], quality=90)
+    img_buffer.seek(0)
+    CROP_STAGE_SECONDS.observe(time.perf_counter() - start, stage='encode')
+
+    return img_buffer.getvalue()
+
+def _encode_crop(image: np.ndarray, annotation: dict, padding: int,
+                 size: Optional[int], format: str, factor: int = 1) -> Optional[bytes]:
+    """Crop, resize and encode one detection from a decoded image"""
+    try:
+        return _encode_image(_crop_array(image, annotation, padding, size, factor), format)
+    except Exception as e:
+        print(f"Error cropping detection {annotation.get('id')}: {e}")
+        return None
+
+def _render_file_crops(image_path: str, annotations: List[dict], padding: int,
+                       size: Optional[int], format: str) -> Dict[int, Optional[bytes]]:
+    """Decode one source image and render all its crops.
+
+    Self-contained so it can run in a worker process.
+    """
+    factor = _reduction_factor(Path(image_path), annotations, padding, size)
+    image = _decode_image(image_path, factor)
+    if image is None:
+        return {annotation['id']: None for annotation in annotations}
+    return {annotation['id']: _encode_crop(image, annotation, padding, size, format, factor)
+            for annotation in annotations}
+
+def resolve_image_path(images_dir: Path, image_info: Optional[dict]) -> Optional[Path]:
+    """Source file of a COCO image record, trying common extensions when the exact name is missing"""
+    if not image_info:
+        return None
+        
+    filename = image_info.get('file_name')
+    if not filename:
+        return None
+        
+    image_path = images_dir / filename
+    
+    # Try common extensions if exact filename doesn't exist
+    if not image_path.exists():
+        base_name = image_path.stem
+        for ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']:
+            alt_path = images_dir / f"{base_name}{ext}"
+            if alt_path.exists():
+                return alt_path
+                
+    return image_path if image_path.exists() else None
 
 class ImageService:
-    def __init__(self, images_dir: str = "data/images"):
+    def __init__(self, images_dir: str = "data/images", cache_bytes: int = 128 * 1024 * 1024,
+                 disk_cache_dir: Optional[str] = None, decoded_cache_bytes: int = 256 * 1024 * 1024,
+                 atlas_dir: Optional[str] = None):
         self.images_dir = Path(images_dir)
+        self.crop_cache = CropCache(max_bytes=cache_bytes, disk_dir=disk_cache_dir)
+        self.image_cache = DecodedImageCache(max_bytes=decoded_cache_bytes)
+        # Thumbnails pre-rendered by build_thumbnail_atlas.py, used when present
+        self.atlas = ThumbnailAtlas(atlas_dir, data_loader.data_dir / "annotations.json") if atlas_dir else None
+        metrics.add_collector(self._cache_samples)
         
     def get_image_path(self, image_id: int) -> Optional[Path]:
         """Find image file by image_id"""
-        if not data_loader.annotations:
-            return None
+        return resolve_image_path(self.images_dir, data_loader.get_image_info(image_id))
+        
+    def crop_detection(self, annotation_id: int, padding: int = 10,
+                       size: Optional[int] = None, format: str = 'jpeg') -> Optional[bytes]:
+        """Crop detection region from image and return as bytes.
+
+        `size` fits the crop into a size x size thumbnail; without it the
+        crop keeps its native resolution (at least 64x64).
+        """
+        return self.crop_detections([annotation_id], padding, size, format)[annotation_id]
+        
+    def _lookup_crops(self, annotation_ids: List[int], padding: int, size: Optional[int],
+                      format: str) -> Tuple[Dict[int, Optional[bytes]], Dict[int, List[dict]]]:
+        """Serve crop cache hits and group the misses by source image"""
+        if format not in CROP_FORMATS:
+            raise ValueError(f"Unsupported crop format: {format}")
+        with CROP_STAGE_SECONDS.time(stage='lookup'):
+            return self._lookup_cached(annotation_ids, padding, size, format)
             
-        # Find image info in COCO annotations
-        image_info = None
-        for img in data_loader.annotations.get('images', []):
-            if img['id'] == image_id:
-                image_info = img
-                break
+    def _lookup_cached(self, annotation_ids: List[int], padding: int, size: Optional[int],
+                       format: str) -> Tuple[Dict[int, Optional[bytes]], Dict[int, List[dict]]]:
+        """_lookup_crops without the format check"""
+        # Crops are only valid for the annotations they were rendered from; a
+        # layout swap keeps the load id, so cached crops survive it
+        self.crop_cache.bind(data_loader.load_id)
+        atlas = None
+        if self.atlas is not None:
+            self.atlas.bind(data_loader.generation, data_loader.load_id)
+            if self.atlas.covers(padding, size, format):
+                atlas = self.atlas
+        
+        results: Dict[int, Optional[bytes]] = {aid: None for aid in annotation_ids}
+        pending: Dict[int, List[dict]] = {}
+        for aid in results:
+            # Atlas thumbnails are already mapped in, so they skip the crop cache
+            cached = atlas.get(aid) if atlas is not None else None
+            if cached is None:
+                cached = self.crop_cache.get((aid, padding, size, format))
+            if cached is not None:
+                results[aid] = cached
+                continue
                 
-        if not image_info:
-            return None
-            
-        filename = image_info.get('file_name')
-        if not filename:
-            return None
-            
-        image_path = self.images_dir / filename
-        
-        # Try common extensions if exact filename doesn't exist
-        if not image_path.exists():
-            base_name = image_path.stem
-            for ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']:
-                alt_path = self.images_dir / f"{base_name}{ext}"
-                if alt_path.exists():
-                    return alt_path
-                    
-        return image_path if image_path.exists() else None
+            annotation = data_loader.get_annotation_fields(aid)
+            if annotation and annotation.get('image_id') and annotation.get('bbox'):
+                pending.setdefault(annotation['image_id'], []).append(annotation)
+                
+        return results, pending
         
-    def crop_detection(self, annotation_id: int, padding: int = 10) -> Optional[bytes]:
-        """Crop detection region from image and return as bytes"""
-        annotation = data_loader.get_annotation_by_id(annotation_id)
-        if not annotation:
-            return None
+    def _render_image_crops(self, image_id: int, annotations: List[dict], padding: int,
+                            size: Optional[int], format: str) -> Dict[int, Optional[bytes]]:
+        """Render all requested crops of one source image through the decoded image cache"""
+        image_path = self.get_image_path(image_id)
+        if not image_path:
+            return {}
+        factor = _reduction_factor(image_path, annotations, padding, size)
+        image, factor = self._load_image_at(image_path, factor)
+        if image is None:
+            return {}
+        return {annotation['id']: _encode_crop(image, annotation, padding, size, format, factor)
+                for annotation in annotations}
+        
+    def _store_crops(self, results: Dict[int, Optional[bytes]], rendered: Dict[int, Optional[bytes]],
+                     padding: int, size: Optional[int], format: str):
+        for aid, image_bytes in rendered.items():
+            if image_bytes is not None:
+                self.crop_cache.put((aid, padding, size, format), image_bytes)
+            results[aid] = image_bytes
             
-        image_id = annotation.get('image_id')
-        bbox = annotation.get('bbox')  # [x, y, width, height] in COCO format
+    def crop_detections(self, annotation_ids: List[int], padding: int = 10,
+                        size: Optional[int] = None, format: str = 'jpeg') -> Dict[int, Optional[bytes]]:
+        """Crop several detections, decoding each source image at most once"""
+        results, pending = self._lookup_crops(annotation_ids, padding, size, format)
+        for image_id, annotations in pending.items():
+            rendered = self._render_image_crops(image_id, annotations, padding, size, format)
+            self._store_crops(results, rendered, padding, size, format)
+        return results
         
-        if not image_id or not bbox:
-            return None
+    def _file_render_calls(self, pending: Dict[int, List[dict]], padding: int, size: Optional[int],
+                           format: str) -> List[Tuple]:
+        """Arguments of _render_file_crops for every pending source image that exists"""
+        calls = []
+        for image_id, annotations in pending.items():
+            image_path = self.get_image_path(image_id)
+            if image_path:
+                calls.append((str(image_path), annotations, padding, size, format))
+        return calls
+        
+    def _store_groups(self, results: Dict[int, Optional[bytes]], rendered_groups: List[Dict[int, Optional[bytes]]],
+                      padding: int, size: Optional[int], format: str):
+        for rendered in rendered_groups:
+            self._store_crops(results, rendered, padding, size, format)
             
-        # Get image path
+    async def crop_detections_async(self, annotation_ids: List[int], padding: int = 10,
+                                    size: Optional[int] = None,
+                                    format: str = 'jpeg') -> Dict[int, Optional[bytes]]:
+        """Like crop_detections, but renders each source image on a worker pool.
+
+        Cache lookups and stores can touch the disk (spilled crops, the
+        atlas, a cache reset), so they run on io_pool rather than the event
+        loop. Raises PoolSaturatedError when a pool has no room for the batch.
+        """
+        results, pending = await io_pool.run(self._lookup_crops, annotation_ids, padding, size, format)
+        if not pending:
+            return results
+            
+        if process_pool is not None:
+            calls = await io_pool.run(self._file_render_calls, pending, padding, size, format)
+            rendered_groups = await process_pool.map(_render_file_crops, calls)
+        else:
+            calls = [(image_id, annotations, padding, size, format)
+                     for image_id, annotations in pending.items()]
+            rendered_groups = await cpu_pool.map(self._render_image_crops, calls)
+            
+        await io_pool.run(self._store_groups, results, rendered_groups, padding, size, format)
+        return results
+        
+    def load_image(self, image_id: int) -> Optional[np.ndarray]:
+        """Get the full-resolution BGR source image, shared through the decoded image cache"""
         image_path = self.get_image_path(image_id)
         if not image_path:
             return None
+        return self._load_image_at(image_path, 1)[0]
+        
+    def _load_image_at(self, image_path: Path, factor: int) -> Tuple[Optional[np.ndarray], int]:
+        """Get the image decoded at 1/factor scale, or any finer cached decode.
+
+        Returns the image and the factor it was actually decoded at.
+        """
+        candidates = [f for f in (8, 4, 2, 1) if f <= factor]
+        key, image = self.image_cache.get_first([f"{image_path}@{f}" for f in candidates])
+        if image is not None:
+            return image, int(key.rsplit('@', 1)[1])
             
         try:
-            # Load image
-            image = cv2.imread(str(image_path))
-            if image is None:
-                return None
-                
-            # Get image dimensions
-            img_height, img_width = image.shape[:2]
-            
-            # Extract bbox coordinates (COCO format: [x, y, width, height])
-            x, y, w, h = bbox
-            x, y, w, h = int(x), int(y), int(w), int(h)
-            
-            # Add padding and ensure within image bounds
-            x1 = max(0, x - padding)
-            y1 = max(0, y - padding)
-            x2 = min(img_width, x + w + padding)
-            y2 = min(img_height, y + h + padding)
-            
-            # Crop the region
-            cropped = image[y1:y2, x1:x2]
-            
-            # Resize if too small (minimum 64x64)
-            if cropped.shape[0] < 64 or cropped.shape[1] < 64:
-                cropped = cv2.resize(cropped, (64, 64), interpolation=cv2.INTER_CUBIC)
-            
-            # Convert BGR to RGB
-            cropped_rgb = cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB)
-            
-            # Convert to PIL Image and save to bytes
-            pil_image = Image.fromarray(cropped_rgb)
-            
-            # Save to bytes buffer
-            img_buffer = io.BytesIO()
-            pil_image.save(img_buffer, format='JPEG', quality=90)
-            img_buffer.seek(0)
-            
-            return img_buffer.getvalue()
-            
+            image = _decode_image(str(image_path), factor)
         except Exception as e:
-            print(f"Error cropping detection {annotation_id}: {e}")
-            return None
+            print(f"Error decoding image {image_path}: {e}")
+            return None, factor
+        if image is None:
+            return None, factor
+            
+        self.image_cache.put(f"{image_path}@{factor}", image)
+        return image, factor
+        
+    def render_sprite(self, annotation_ids: List[int], size: int, padding: int = 10,
+                      format: str = 'jpeg') -> Tuple[bytes, Dict]:
+        """Pack thumbnails of several detections into one sprite sheet.
+
+        Each detection gets a size x size cell in row-major order; the
+        manifest lists where each thumbnail sits inside its cell.
+        """
+        if format not in CROP_FORMATS:
+            raise ValueError(f"Unsupported crop format: {format}")
             
+        annotation_ids = list(dict.fromkeys(annotation_ids))
+        columns = max(1, int(np.ceil(np.sqrt(len(annotation_ids)))))
+        rows = max(1, int(np.ceil(len(annotation_ids) / columns)))
+        sheet = np.full((rows * size, columns * size, 3), 128, dtype=np.uint8)
+        
+        cells = {aid: cell for cell, aid in enumerate(annotation_ids)}
+        pending: Dict[int, List[dict]] = {}
+        for aid in annotation_ids:
+            annotation = data_loader.get_annotation_fields(aid)
+            if annotation and annotation.get('image_id') and annotation.get('bbox'):
+                pending.setdefault(annotation['image_id'], []).append(annotation)
+                
+        items = []
+        for image_id, annotations in pending.items():
+            image_path = self.get_image_path(image_id)
+            if not image_path:
+                continue
+            factor = _reduction_factor(image_path, annotations, padding, size)
+            image, factor = self._load_image_at(image_path, factor)
+            if image is None:
+                continue
+            for annotation in annotations:
+                try:
+                    thumb = _crop_array(image, annotation, padding, size, factor)
+                except Exception as e:
+                    print(f"Error cropping detection {annotation['id']}: {e}")
+                    continue
+                row, column = divmod(cells[annotation['id']], columns)
+                x, y = column * size, row * size
+                h, w = thumb.shape[:2]
+                sheet[y:y + h, x:x + w] = thumb
+                items.append({'annotation_id': annotation['id'], 'x': x, 'y': y, 'w': w, 'h': h})
+                
+        found = {item['annotation_id'] for item in items}
+        manifest = {
+            'width': sheet.shape[1],
+            'height': sheet.shape[0],
+            'cell_size': size,
+            'format': format,
+            'items': sorted(items, key=lambda item: cells[item['annotation_id']]),
+            'missing': [aid for aid in annotation_ids if aid not in found],
+        }
+        return _encode_image(sheet, format), manifest
+        
+    def get_cache_stats(self) -> Dict:
+        """Get crop and decoded image cache counters"""
+        stats = self.crop_cache.stats()
+        stats['decoded_images'] = self.image_cache.stats()
+        if self.atlas is not None:
+            stats['atlas'] = self.atlas.stats()
+        return stats
+        
+    def _cache_samples(self):
+        """Crop and decoded image cache counters for /metrics"""
+        crops, decoded = self.crop_cache.stats(), self.image_cache.stats()
+        return [
+            ('crop_cache_lookups_total', 'counter', 'Crop cache lookups by result', [
+                ({'result': 'hit'}, crops['hits']),
+                ({'result': 'disk_hit'}, crops['disk_hits']),
+                ({'result': 'miss'}, crops['misses']),
+            ]),
+            ('crop_cache_hit_ratio', 'gauge', 'Share of crop lookups served from memory or disk',
+             [({}, crops['hit_rate'])]),
+            ('crop_cache_bytes', 'gauge', 'Bytes held by the crop cache', [
+                ({'tier': 'memory'}, crops['memory_bytes']),
+                ({'tier': 'disk'}, crops['disk_bytes']),
+            ]),
+            ('decoded_image_cache_lookups_total', 'counter', 'Decoded image cache lookups by result', [
+                ({'result': 'hit'}, decoded['hits']),
+                ({'result': 'miss'}, decoded['misses']),
+            ]),
+            ('decoded_image_cache_hit_ratio', 'gauge', 'Share of decoded image lookups served from memory',
+             [({}, decoded['hit_rate'])]),
+            ('decoded_image_cache_bytes', 'gauge', 'Bytes held by the decoded image cache', [({}, decoded['bytes'])]),
+            ('thumbnail_atlas_hits_total', 'counter', 'Crops served from the thumbnail atlas',
+             [({}, self.atlas.hits if self.atlas is not None else 0)]),
+        ]
+        
     def create_placeholder_image(self, size: Tuple[int, int] = (64, 64)) -> bytes:
         """Create a placeholder image when crop fails"""
         # Create a simple gray placeholder
@@ -120,4 +416,4 @@ class ImageService:
         return img_buffer.getvalue()
 
 # Global image service instance
-image_service = ImageService()
\ No newline at end of file
+image_service = ImageService(disk_cache_dir="data/crop_cache", atlas_dir="data/thumbnail_atlas")
\ No newline at end of file
@@ -0,0 +1,90 @@
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from .data_loader import data_loader
+from .vector_index import BruteForceIndex, IVFIndex, inverse_norms
+
+class NeighborService:
+    """Cosine nearest neighbours over the high-dimensional embeddings.
+
+    Candidate sets up to `exact_max_rows` are searched exactly with a
+    blocked matrix multiply; larger ones go through an IVF index built on
+    first use. Removed annotations are filtered at query time, so only a
+    reload rebuilds anything.
+    """
+
+    def __init__(self, exact_max_rows: int = 200_000, n_probe: int = 8):
+        self.exact_max_rows = exact_max_rows
+        self.n_probe = n_probe
+        self._lock = threading.Lock()
+        self._index = None
+        self._inv_norms: Optional[np.ndarray] = None
+        self._ivf: Optional[IVFIndex] = None
+
+    def _sync(self, index):
+        # Norms and the IVF index are only valid for one loaded dataset
+        with self._lock:
+            if index is not self._index:
+                self._inv_norms = inverse_norms(data_loader.get_features, np.flatnonzero(index.has_point),
+                                                len(index))
+                self._ivf = None
+                self._index = index
+            return self._inv_norms
+
+    def _get_ivf(self, index, inv_norms: np.ndarray) -> IVFIndex:
+        with self._lock:
+            if self._ivf is None:
+                self._ivf = IVFIndex(data_loader.get_features, inv_norms, np.flatnonzero(index.has_point),
+                                     n_probe=self.n_probe)
+            return self._ivf
+
+    def search_rows(self, query_rows: np.ndarray, k: int, allowed: np.ndarray,
+                    exact: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows among allowed rows for each query row, returns (rows, cosine scores).
+
+        Query rows must have an embedding. Missing results are row -1 with score -inf.
+        """
+        index = data_loader.get_index()
+        inv_norms = self._sync(index)
+        queries = data_loader.get_features(query_rows) * inv_norms[query_rows][:, None]
+        candidates = np.flatnonzero(allowed)
+        if exact or len(candidates) <= self.exact_max_rows:
+            searcher = BruteForceIndex(data_loader.get_features, inv_norms)
+            return searcher.search(queries, candidates, k)
+        return self._get_ivf(index, inv_norms).search(queries, k, allowed)
+
+    def search(self, annotation_ids: List[int], k: int = 50, class_filter: Optional[str] = None,
+               exact: bool = False) -> Dict[int, List[dict]]:
+        """Get the k most similar live annotations for each query ID.
+
+        Unknown or removed query IDs, and annotations without an embedding,
+        are left out of the result.
+        """
+        if not data_loader.has_features():
+            raise RuntimeError("High-dimensional embeddings not loaded (data/embeddings.npy)")
+        index = data_loader.get_index()
+        query_rows = index.rows_for_ids(annotation_ids)
+        query_rows = query_rows[index.has_point[query_rows]]
+        if not len(query_rows):
+            return {}
+
+        # One extra result so the query itself can be dropped
+        rows, scores = self.search_rows(query_rows, k + 1, index.point_mask(class_filter), exact)
+
+        results = {}
+        names = index.class_names
+        for query_row, row_list, score_list in zip(query_rows.tolist(), rows.tolist(), scores.tolist()):
+            neighbors = [
+                {
+                    'annotation_id': int(index.annotation_ids[row]),
+                    'score': score,
+                    'class_name': names[index.class_codes[row]],
+                }
+                for row, score in zip(row_list, score_list)
+                if row >= 0 and row != query_row
+            ]
+            results[int(index.annotation_ids[query_row])] = neighbors[:k]
+        return results
+
+# Global neighbor service instance
+neighbor_service = NeighborService()
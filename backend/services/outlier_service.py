@@ -0,0 +1,211 @@
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from .data_loader import data_loader
+from .neighbor_service import neighbor_service
+from .spatial_index import GridIndex
+
+SCORE_FIELDS = ('score', 'centroid_distance', 'lof', 'neighbor_disagreement')
+
+def _drop_self(query_rows: np.ndarray, rows: np.ndarray, dists: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Remove each query from its own k+1 neighbour list, or the farthest neighbour if it is absent"""
+    is_self = rows == query_rows[:, None]
+    is_self[~is_self.any(axis=1), -1] = True
+    keep = np.argsort(is_self, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(rows, keep, axis=1), np.take_along_axis(dists, keep, axis=1)
+
+def _percentile_rank(values: np.ndarray) -> np.ndarray:
+    if len(values) < 2:
+        return np.zeros(len(values))
+    return np.argsort(np.argsort(values, kind='stable'), kind='stable') / (len(values) - 1)
+
+class _ClassScores:
+    """Scores of the live rows of one class plus the neighbour lists they came from"""
+
+    def __init__(self, rows: np.ndarray, class_knn: np.ndarray, class_dist: np.ndarray, all_knn: np.ndarray):
+        self.rows = rows
+        self.class_knn = class_knn
+        self.class_dist = class_dist
+        self.all_knn = all_knn
+        self.scores: Dict[str, np.ndarray] = {}
+        self.version = -1  # index.version the scores reflect
+
+    def subset(self, keep: np.ndarray):
+        self.rows = self.rows[keep]
+        self.class_knn = self.class_knn[keep]
+        self.class_dist = self.class_dist[keep]
+        self.all_knn = self.all_knn[keep]
+
+class OutlierService:
+    """Per-annotation outlier scores, computed one class at a time.
+
+    Signals, in the high-dimensional space when embeddings.npy is loaded
+    and in the 2D projection otherwise:
+        centroid_distance       distance to the class centroid over the class median
+        lof                     local outlier factor among the k nearest same-class points
+        neighbor_disagreement   share of the k nearest points of any class with another class
+    `score` averages the three percentile ranks within the class.
+
+    Scores are cached per class. After removals only rows whose neighbour
+    lists lost a member are re-queried; a restore recomputes from scratch.
+    """
+
+    def __init__(self, k: int = 10, chunk_size: int = 1024):
+        self.k = k
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._cache: Dict[int, _ClassScores] = {}
+        self._index = None
+        self._alive_seen: Optional[np.ndarray] = None
+
+    def _sync(self, index) -> Tuple[np.ndarray, int]:
+        """One consistent (alive, version) copy for this call to score against"""
+        # Cached scores assume rows only ever disappear from the index they were computed on.
+        # One consistent copy, so a restore between the check and the copy is not marked seen.
+        alive, version = data_loader.alive_state(index)
+        if index is not self._index or (alive & ~self._alive_seen).any():
+            self._cache.clear()
+            self._index = index
+        self._alive_seen = alive
+        return alive, version
+
+    def space(self) -> str:
+        return 'features' if data_loader.has_features() else '2d'
+
+    def _vectors(self, rows: np.ndarray) -> np.ndarray:
+        index = data_loader.get_index()
+        if not data_loader.has_features():
+            return np.column_stack([index.x[rows], index.y[rows]])
+        # Unit vectors, so Euclidean distances agree with the cosine neighbour search
+        vectors = data_loader.get_features(rows)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    def _knn(self, query_rows: np.ndarray, allowed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """k nearest allowed rows of each query row, excluding itself, with Euclidean distances"""
+        if not data_loader.has_features():
+            # A grid over the allowed points keeps 2D queries local instead of scanning every candidate;
+            # it groups queries by cell itself, so all of them go in one call. Cells smaller than the
+            # selection grid's mean fewer candidates per query for k = 11.
+            index = data_loader.get_index()
+            grid = GridIndex(index.x, index.y, np.flatnonzero(allowed), points_per_cell=8)
+            rows, squared = grid.knn(index.x[query_rows], index.y[query_rows], self.k + 1)
+            return _drop_self(query_rows, rows, np.sqrt(squared), self.k)
+
+        found_rows, found_dists = [], []
+        for start in range(0, len(query_rows), self.chunk_size):
+            chunk = query_rows[start:start + self.chunk_size]
+            rows, similarity = neighbor_service.search_rows(chunk, self.k + 1, allowed)
+            rows, dists = _drop_self(chunk, rows, np.sqrt(np.maximum(2 - 2 * similarity, 0)), self.k)
+            found_rows.append(rows)
+            found_dists.append(dists)
+        if not found_rows:
+            return np.empty((0, self.k), dtype=np.int64), np.empty((0, self.k))
+        return np.concatenate(found_rows), np.concatenate(found_dists)
+
+    def _centroid_distances(self, rows: np.ndarray) -> np.ndarray:
+        total = 0
+        for start in range(0, len(rows), self.chunk_size):
+            total = total + self._vectors(rows[start:start + self.chunk_size]).sum(axis=0)
+        centroid = total / max(len(rows), 1)
+        return np.concatenate([
+            np.linalg.norm(self._vectors(rows[start:start + self.chunk_size]) - centroid, axis=1)
+            for start in range(0, len(rows), self.chunk_size)
+        ]) if len(rows) else np.empty(0)
+
+    def _score(self, index, state: _ClassScores):
+        rows = state.rows
+        if not len(rows):
+            state.scores = {field: np.empty(0) for field in SCORE_FIELDS}
+            return
+        distances = self._centroid_distances(rows)
+        median = np.median(distances) if len(distances) else 0.0
+        centroid_distance = distances / median if median > 0 else distances
+
+        # Local outlier factor from the same-class neighbour lists
+        valid = state.class_knn >= 0
+        positions = np.searchsorted(rows, np.where(valid, state.class_knn, rows[0]))
+        k_distance = np.where(valid, state.class_dist, -np.inf).max(axis=1)
+        reach = np.where(valid, np.maximum(k_distance[positions], state.class_dist), np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            density = 1.0 / (np.nanmean(reach, axis=1) + 1e-12)
+            lof = np.nanmean(np.where(valid, density[positions], np.nan), axis=1) / density
+        lof = np.nan_to_num(lof, nan=1.0)
+
+        # Neighbours of any class that carry a different label
+        valid = state.all_knn >= 0
+        other = (index.class_codes[np.where(valid, state.all_knn, 0)] != index.class_codes[rows][:, None]) & valid
+        disagreement = other.sum(axis=1) / np.maximum(valid.sum(axis=1), 1)
+
+        state.scores = {
+            'centroid_distance': centroid_distance,
+            'lof': lof,
+            'neighbor_disagreement': disagreement,
+            'score': (_percentile_rank(centroid_distance) + _percentile_rank(lof)
+                      + _percentile_rank(disagreement)) / 3,
+        }
+
+    def _compute(self, index, code: int, points: np.ndarray) -> _ClassScores:
+        class_mask = points & (index.class_codes == code)
+        rows = np.flatnonzero(class_mask)
+        class_knn, class_dist = self._knn(rows, class_mask)
+        all_knn, _ = self._knn(rows, points)
+        state = _ClassScores(rows, class_knn, class_dist, all_knn)
+        self._score(index, state)
+        return state
+
+    def _update(self, index, code: int, state: _ClassScores, points: np.ndarray):
+        """Drop removed rows and re-query only rows whose neighbour lists lost a member"""
+        # Every cached row has a point, so `points` tells which of them are still live
+        state.subset(points[state.rows])
+        lost_class = ((state.class_knn >= 0) & ~points[state.class_knn]).any(axis=1)
+        if lost_class.any():
+            state.class_knn[lost_class], state.class_dist[lost_class] = self._knn(
+                state.rows[lost_class], points & (index.class_codes == code))
+        lost_any = ((state.all_knn >= 0) & ~points[state.all_knn]).any(axis=1)
+        if lost_any.any():
+            state.all_knn[lost_any], _ = self._knn(state.rows[lost_any], points)
+        self._score(index, state)
+
+    def _class_scores(self, index, code: int, points: np.ndarray, version: int) -> _ClassScores:
+        """Scores of one class as of `version`; `points` marks the rows live at that version with a point"""
+        state = self._cache.get(code)
+        if state is None:
+            state = self._cache[code] = self._compute(index, code, points)
+        elif state.version != version:
+            self._update(index, code, state, points)
+        state.version = version
+        return state
+
+    def get_outliers(self, class_filter: Optional[str] = None, top_k: int = 100, offset: int = 0,
+                     sort: str = 'score') -> Dict:
+        """Live annotations ranked by an outlier signal, highest first, one page at a time"""
+        if sort not in SCORE_FIELDS:
+            raise ValueError(f"Unknown sort field: {sort}")
+        index = data_loader.get_index()
+        if class_filter is not None and class_filter not in index.class_names:
+            raise KeyError(class_filter)
+
+        with self._lock:
+            alive, version = self._sync(index)
+            points = index.has_point & alive
+            codes = [index.class_names.index(class_filter)] if class_filter else range(len(index.class_names))
+            states = [self._class_scores(index, code, points, version) for code in codes]
+
+        rows = np.concatenate([state.rows for state in states] or [np.empty(0, dtype=np.int64)])
+        scores = {field: np.concatenate([state.scores[field] for state in states] or [np.empty(0)])
+                  for field in SCORE_FIELDS}
+        order = np.argsort(-scores[sort], kind='stable')[offset:offset + top_k]
+
+        names = index.class_names
+        outliers: List[dict] = []
+        for position in order.tolist():
+            row = rows[position]
+            entry = {'annotation_id': int(index.annotation_ids[row]), 'class_name': names[index.class_codes[row]]}
+            entry.update({field: float(scores[field][position]) for field in SCORE_FIELDS})
+            outliers.append(entry)
+        return {'class_name': class_filter, 'space': self.space(), 'total': len(rows),
+                'offset': offset, 'outliers': outliers}
+
+# Global outlier service instance
+outlier_service = OutlierService()
@@ -0,0 +1,40 @@
+import json
+import struct
+import numpy as np
+from .dataset_index import DatasetIndex
+
+POINTS_MEDIA_TYPE = "application/vnd.embeddings.points"
+POINTS_MAGIC = b"EMBP"
+POINTS_VERSION = 1
+
+def encode_points(index: DatasetIndex, mask: np.ndarray) -> bytes:
+    """Pack the masked points as little-endian typed arrays.
+
+    Layout:
+        magic "EMBP" | uint32 version | uint32 count | uint32 header length
+        JSON header {"classes": [...]} padded with spaces to an 8-byte boundary
+        int64 annotation_id[count]
+        float32 x[count]
+        float32 y[count]
+        uint16 class_code[count]   (index into header classes)
+
+    Every column starts on a boundary matching its element size, so the
+    client can view the buffer as typed arrays without copying.
+    """
+    rows = np.flatnonzero(mask)
+    count = len(rows)
+
+    header = json.dumps({'classes': index.class_names}).encode('utf-8')
+    prefix_size = len(POINTS_MAGIC) + 12
+    header += b" " * (-(prefix_size + len(header)) % 8)
+
+    parts = [
+        POINTS_MAGIC,
+        struct.pack("<III", POINTS_VERSION, count, len(header)),
+        header,
+        index.annotation_ids[rows].astype("<i8").tobytes(),
+        index.x[rows].astype("<f4").tobytes(),
+        index.y[rows].astype("<f4").tobytes(),
+        index.class_codes[rows].astype("<u2").tobytes(),
+    ]
+    return b"".join(parts)
@@ -0,0 +1,132 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# Profiling is off unless PROFILER_ENABLED is set; it exposes code paths and costs CPU while running
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "").lower() in ("1", "true", "yes")
+MAX_PROFILE_SECONDS = 300
+MAX_STACK_DEPTH = 64
+
+# Leaf frames of threads that are parked, not working: pool workers, the event loop
+IDLE_FRAMES = {('threading.py', 'wait'), ('selectors.py', 'select'), ('queue.py', 'get'), ('thread.py', '_worker')}
+
+def _frame_name(frame) -> Tuple[str, str]:
+    code = frame.f_code
+    return os.path.basename(code.co_filename), code.co_name
+
+class SamplingProfiler:
+    """On-demand statistical profiler for a running server.
+
+    While started, a background thread records the Python stack of every
+    other thread each `interval` seconds and counts identical stacks.
+    Stacks of parked threads are counted as idle and left out of the
+    report. The cost is one stack walk per thread per sample, so it can
+    stay on for a while in production; it stops on its own after
+    `seconds`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._idle = 0
+        self._interval = 0.0
+        self._started_at: Optional[float] = None
+        self._stopped_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = 0.005, seconds: float = 60.0) -> Dict:
+        """Start sampling, discarding the previous profile"""
+        if interval <= 0 or seconds <= 0:
+            raise ValueError("interval and seconds must be positive")
+        with self._lock:
+            if self.running:
+                raise RuntimeError("Profiler is already running")
+            self._stacks = Counter()
+            self._samples = 0
+            self._idle = 0
+            self._interval = interval
+            self._started_at = time.time()
+            self._stopped_at = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(min(seconds, MAX_PROFILE_SECONDS),),
+                                            name="sampling-profiler", daemon=True)
+            self._thread.start()
+        return self.status()
+
+    def stop(self, limit: int = 50) -> Dict:
+        """Stop sampling and return the report"""
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+        return self.report(limit)
+
+    def _run(self, seconds: float):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while not self._stop.wait(self._interval) and time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                with self._lock:
+                    self._samples += 1
+                    if stack[0] in IDLE_FRAMES:
+                        self._idle += 1
+                    else:
+                        self._stacks[tuple(reversed(stack))] += 1
+        self._stopped_at = time.time()
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                'enabled': PROFILER_ENABLED,
+                'running': self.running,
+                'interval': self._interval,
+                'started_at': self._started_at,
+                'stopped_at': self._stopped_at,
+                'samples': self._samples,
+                'idle_samples': self._idle,
+            }
+
+    def report(self, limit: int = 50) -> Dict:
+        """Most frequent stacks in collapsed form ("file:function;...") and per-function sample counts.
+
+        `self` counts samples where the function was running, `total` where
+        it was anywhere on the stack.
+        """
+        with self._lock:
+            stacks = self._stacks.most_common()
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in stacks:
+            own[stack[-1]] += count
+            for frame in set(stack):
+                total[frame] += count
+        busy = sum(own.values())
+        functions: List[Dict] = [
+            {'function': f"{file}:{name}", 'self': count, 'total': total[(file, name)],
+             'self_share': count / busy if busy else 0.0}
+            for (file, name), count in own.most_common(limit)
+        ]
+        report = self.status()
+        report['busy_samples'] = busy
+        report['stacks'] = [{'stack': ";".join(f"{file}:{name}" for file, name in stack), 'count': count}
+                            for stack, count in stacks[:limit]]
+        report['functions'] = functions
+        return report
+
+# Global profiler instance
+profiler = SamplingProfiler()
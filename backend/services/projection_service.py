@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from .data_loader import data_loader
+
+# method -> default parameters; requests may override only these keys
+PROJECTION_METHODS: Dict[str, Dict] = {
+    'pca': {},
+    'umap': {'n_neighbors': 15, 'min_dist': 0.1, 'random_state': 42},
+    'tsne': {'perplexity': 30.0, 'random_state': 42},
+}
+
+def _pca(features: np.ndarray, rows: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    """Project onto the top two principal components, reading the features in chunks"""
+    total = None
+    gram = None
+    for start in range(0, len(rows), chunk_size):
+        block = np.asarray(features[rows[start:start + chunk_size]], dtype=np.float64)
+        total = block.sum(axis=0) if total is None else total + block.sum(axis=0)
+        gram = block.T @ block if gram is None else gram + block.T @ block
+    mean = total / len(rows)
+    covariance = gram / len(rows) - np.outer(mean, mean)
+    _, vectors = np.linalg.eigh(covariance)
+    components = vectors[:, ::-1][:, :2]
+    return np.concatenate([
+        (np.asarray(features[rows[start:start + chunk_size]], dtype=np.float64) - mean) @ components
+        for start in range(0, len(rows), chunk_size)
+    ])
+
+def _nonlinear(method: str, vectors: np.ndarray, params: Dict) -> np.ndarray:
+    """UMAP or t-SNE through their optional packages"""
+    if method == 'umap':
+        try:
+            import umap
+        except ImportError:
+            raise RuntimeError("UMAP projections need the umap-learn package")
+        reducer = umap.UMAP(n_components=2, n_neighbors=int(params['n_neighbors']),
+                            min_dist=float(params['min_dist']), random_state=params['random_state'])
+        return reducer.fit_transform(vectors)
+    try:
+        from sklearn.manifold import TSNE
+    except ImportError:
+        raise RuntimeError("t-SNE projections need the scikit-learn package")
+    perplexity = min(float(params['perplexity']), max(len(vectors) - 1, 1) / 3)
+    return TSNE(n_components=2, perplexity=perplexity, init='pca',
+                random_state=params['random_state']).fit_transform(vectors)
+
+class ProjectionJob:
+    """One projection request; PCA runs first as a preview for nonlinear methods"""
+
+    def __init__(self, method: str, class_name: Optional[str], params: Dict, apply: bool):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.class_name = class_name
+        self.params = params
+        self.apply = apply
+        self.status = 'queued'  # queued -> running -> done | failed
+        self.stage: Optional[str] = None  # method currently computing
+        self.applied: Optional[str] = None  # last method swapped into the view
+        self.cached = False
+        self.point_count = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.id, 'method': self.method, 'class_name': self.class_name,
+            'params': self.params, 'apply': self.apply, 'status': self.status, 'stage': self.stage,
+            'applied': self.applied, 'cached': self.cached, 'point_count': self.point_count,
+            'error': self.error, 'created_at': self.created_at, 'finished_at': self.finished_at,
+        }
+
+class ProjectionService:
+    """Computes 2D layouts from the high-dimensional embeddings.
+
+    Layouts are cached in data/projection_cache keyed by method, parameters,
+    the exact set of annotations projected and the features file, so
+    re-running a projection after a restart or an undo is a file read.
+    Finished layouts are swapped into data_loader when the job asks for it.
+    """
+
+    def __init__(self, max_jobs: int = 50):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, ProjectionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create_job(self, method: str, class_name: Optional[str] = None, params: Optional[Dict] = None,
+                   apply: bool = True) -> ProjectionJob:
+        """Validate a request and register its job; run it with run_job"""
+        if method not in PROJECTION_METHODS:
+            raise ValueError(f"Unknown projection method: {method}")
+        unknown = set(params or {}) - set(PROJECTION_METHODS[method])
+        if unknown:
+            raise ValueError(f"Unknown parameters for {method}: {', '.join(sorted(unknown))}")
+        if not data_loader.has_features():
+            raise RuntimeError("Projections need high-dimensional embeddings (data/embeddings.npy)")
+        if class_name is not None and class_name not in data_loader.get_index().class_names:
+            raise KeyError(class_name)
+
+        job = ProjectionJob(method, class_name, dict(PROJECTION_METHODS[method], **(params or {})), apply)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[ProjectionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[ProjectionJob]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def _cache_path(self, method: str, params: Dict, annotation_ids: np.ndarray):
+        features_stat = os.stat(data_loader.data_dir / "embeddings.npy")
+        key = hashlib.blake2b(digest_size=16)
+        key.update(json.dumps({'method': method, 'params': params,
+                               'features': [features_stat.st_size, features_stat.st_mtime_ns]},
+                              sort_keys=True).encode())
+        key.update(np.ascontiguousarray(annotation_ids, dtype=np.int64).tobytes())
+        return data_loader.data_dir / "projection_cache" / f"{method}_{key.hexdigest()}.npy"
+
+    def _project(self, method: str, params: Dict, rows: np.ndarray, job: ProjectionJob) -> np.ndarray:
+        path = self._cache_path(method, params, data_loader.get_index().annotation_ids[rows])
+        if path.exists():
+            job.cached = True
+            return np.load(path)
+        if method == 'pca':
+            coords = _pca(data_loader.features, data_loader.get_index().embedding_rows[rows])
+        else:
+            coords = _nonlinear(method, data_loader.get_features(rows), params)
+        coords = np.asarray(coords, dtype=np.float32)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(path.name + ".tmp")
+        with open(temp_path, 'wb') as f:
+            np.save(f, coords)
+        os.replace(temp_path, path)
+        return coords
+
+    def _apply(self, job: ProjectionJob, method: str, rows: np.ndarray, coords: np.ndarray, annotation_ids):
+        index = data_loader.get_index()
+        if index.annotation_ids is not annotation_ids:
+            # The dataset was reloaded while the job ran; the rows no longer line up
+            return
+        embeddings = np.full((len(data_loader.features), 2), np.nan, dtype=np.float32)
+        embeddings[index.embedding_rows[rows]] = coords
+        data_loader.swap_embeddings(embeddings, {'job_id': job.id, 'method': method, 'class_name': job.class_name})
+        job.applied = method
+
+    def run_job(self, job: ProjectionJob):
+        """Compute the job's layouts; blocking, meant for a background pool"""
+        job.status = 'running'
+        try:
+            index = data_loader.get_index()
+            annotation_ids = index.annotation_ids
+            has_features = (index.embedding_rows >= 0) & (index.embedding_rows < len(data_loader.features))
+            rows = np.flatnonzero(index.alive & has_features & self._class_mask(index, job))
+            job.point_count = len(rows)
+            if not len(rows):
+                raise ValueError("No annotations to project")
+
+            stages = ['pca'] if job.method == 'pca' else ['pca', job.method]
+            for method in stages:
+                job.stage = method
+                params = job.params if method == job.method else PROJECTION_METHODS[method]
+                coords = self._project(method, params, rows, job)
+                if job.apply:
+                    self._apply(job, method, rows, coords, annotation_ids)
+            job.status = 'done'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.stage = None
+            job.finished_at = time.time()
+        return job
+
+    @staticmethod
+    def _class_mask(index, job: ProjectionJob):
+        if job.class_name is None:
+            return True
+        return index.class_codes == index.class_names.index(job.class_name)
+
+# Global projection service instance
+projection_service = ProjectionService()
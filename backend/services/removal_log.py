@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from .dataset_cache import file_fingerprint, fingerprint_matches
+from .shared_state import FileLock
+
+# (op, batch, ids) for one logged removal or undo, op is 'remove' or 'undo'
+LogChange = Tuple[str, int, List[int]]
+
+class RemovalLog:
+    """Append-only, fsync'd log of annotation removals.
+
+    One JSON record per line:
+        {"op": "source", "fingerprint": {...}}     first line, identifies annotations.json
+        {"op": "remove", "batch": 3, "ids": [...], "ts": ...}
+        {"op": "undo", "batch": 3, "ts": ...}
+
+    Replaying the log gives the set of removed ids; the source annotations
+    file itself is never rewritten.
+
+    Several worker processes can share one log: appends hold a file lock
+    and first catch up with records other processes wrote, so batch numbers
+    stay unique. Records read that way, and this process's own appends, are
+    queued as changes for poll().
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(self.path.with_suffix('.lock'))
+        self._batches: Dict[int, List[int]] = {}  # active batch -> ids, in removal order
+        self._next_batch = 1
+        self._offset = 0  # bytes of the log replayed so far
+        self._pending: List[LogChange] = []
+
+    @property
+    def offset(self) -> int:
+        """Bytes replayed; equal in every process that has caught up, so it doubles as a version"""
+        return self._offset
+
+    def open(self, source_path: Path):
+        """Replay the log for this source file, starting a fresh one if it belongs to another.
+
+        The source is matched by content like the dataset cache, so a touched,
+        copied or checked-out annotations file keeps its removals.
+        """
+        with self._lock, self._file_lock.hold():
+            self._batches = {}
+            self._next_batch = 1
+            self._offset = 0
+            self._pending = []
+            if self.path.exists():
+                records = self._read_new()
+                if records and records[0].get('op') == 'source' and \
+                        fingerprint_matches(source_path, records[0].get('fingerprint') or {}):
+                    self._replay(records[1:])
+                    return
+                # The annotations file changed underneath the log, keep the old one aside
+                stale = self.path.with_name(f"{self.path.stem}.{int(time.time())}.stale{self.path.suffix}")
+                os.replace(self.path, stale)
+                print(f"Removal log does not match annotations, moved to {stale}")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._offset = 0
+            self._append_locked({'op': 'source', 'fingerprint': file_fingerprint(source_path)})
+
+    def _read_new(self) -> List[Dict]:
+        """Records appended since the last read; a line still being written is left for later"""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        records = []
+        for line in data[:end].decode('utf-8').splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn final write from a crash; everything before it is intact
+                print(f"Ignoring corrupt removal log line: {line[:80]}")
+        return records
+
+    def _replay(self, records: List[Dict]) -> List[LogChange]:
+        changes = []
+        for record in records:
+            batch = record.get('batch')
+            if record.get('op') == 'remove':
+                self._batches[batch] = record['ids']
+                changes.append(('remove', batch, record['ids']))
+            elif record.get('op') == 'undo' and batch in self._batches:
+                changes.append(('undo', batch, self._batches.pop(batch)))
+            if isinstance(batch, int):
+                self._next_batch = max(self._next_batch, batch + 1)
+        return changes
+
+    def _catch_up(self):
+        """Replay records other processes appended, queueing them for poll()"""
+        self._pending.extend(self._replay(self._read_new()))
+
+    def _append_locked(self, record: Dict):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            # Callers hold the file lock and have caught up, so nothing else was appended
+            self._offset = f.tell()
+
+    def append_removal(self, annotation_ids: List[int]) -> int:
+        """Durably record a removal batch, returns its batch number"""
+        with self._lock, self._file_lock.hold():
+            self._catch_up()
+            batch = self._next_batch
+            record = {'op': 'remove', 'batch': batch, 'ids': list(annotation_ids), 'ts': time.time()}
+            self._append_locked(record)
+            self._pending.extend(self._replay([record]))
+            return batch
+
+    def append_undo(self, batch: Optional[int] = None) -> Optional[Tuple[int, List[int]]]:
+        """Undo a batch (the latest by default), returns (batch, ids) or None"""
+        with self._lock, self._file_lock.hold():
+            self._catch_up()
+            if not self._batches:
+                return None
+            if batch is None:
+                batch = max(self._batches)
+            if batch not in self._batches:
+                return None
+            ids = self._batches[batch]
+            record = {'op': 'undo', 'batch': batch, 'ts': time.time()}
+            self._append_locked(record)
+            self._pending.extend(self._replay([record]))
+            return batch, ids
+
+    def changed(self) -> bool:
+        """Whether the log holds records this process has not replayed yet"""
+        try:
+            return os.stat(self.path).st_size > self._offset
+        except FileNotFoundError:
+            return False
+
+    def poll(self) -> List[LogChange]:
+        """Removals and undos since the last poll, from this process or any other, in log order"""
+        with self._lock:
+            self._catch_up()
+            changes, self._pending = self._pending, []
+            return changes
+
+    def removed_ids(self) -> Set[int]:
+        with self._lock:
+            return {aid for ids in self._batches.values() for aid in ids}
+
+    def batches(self) -> List[Dict]:
+        """Active batches, oldest first"""
+        with self._lock:
+            return [{'batch': batch, 'count': len(ids)} for batch, ids in sorted(self._batches.items())]
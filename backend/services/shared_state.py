@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows; locks then only cover threads, so run a single worker there
+    fcntl = None
+
+class FileLock:
+    """Exclusive lock shared by the threads of this process and by other worker processes"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+class SharedState:
+    """Small JSON document every worker process follows, e.g. the reload generation.
+
+    Writers hold a file lock and replace the file atomically, so there is
+    one writer at a time and readers never see a partial document. Readers
+    notice changes from the file's inode and mtime without re-reading it.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock = FileLock(self.path.with_suffix('.lock'))
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._data: Dict = {}
+
+    def _file_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read_file(self) -> Dict:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def changed(self) -> bool:
+        """Whether the document changed since it was last read by this process"""
+        return self._file_stamp() != self._stamp
+
+    def read(self) -> Dict:
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            # Stat before reading: a write in between shows up as another change next time
+            self._data, self._stamp = self._read_file(), stamp
+        return dict(self._data)
+
+    def update(self, increment: Optional[str] = None, **changes) -> Dict:
+        """Set keys, and add one to the `increment` key, as a single atomic write"""
+        with self.lock.hold():
+            data = self._read_file()
+            data.update(changes)
+            if increment is not None:
+                data[increment] = data.get(increment, 0) + 1
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with open(temp_path, 'w') as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self._data, self._stamp = data, self._file_stamp()
+            return dict(data)
@@ -0,0 +1,157 @@
+import numpy as np
+from typing import Sequence, Tuple
+
+# Distance matrix entries computed at once per group of queries sharing a cell
+KNN_BLOCK_ENTRIES = 4 * 1024 * 1024
+
+class GridIndex:
+    """Uniform grid over 2D points for rectangle, polygon and nearest-neighbour queries.
+
+    Point rows are sorted by cell so every cell is a contiguous slice;
+    a query only touches the cells it overlaps.
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, rows: np.ndarray, points_per_cell: int = 32):
+        self.x = x
+        self.y = y
+        count = len(rows)
+        side = int(np.ceil(np.sqrt(max(count, 1) / points_per_cell)))
+        self.nx = self.ny = min(max(side, 1), 4096)
+
+        if count:
+            self.x_min, self.x_max = float(x[rows].min()), float(x[rows].max())
+            self.y_min, self.y_max = float(y[rows].min()), float(y[rows].max())
+        else:
+            self.x_min = self.x_max = self.y_min = self.y_max = 0.0
+        self.cell_w = (self.x_max - self.x_min) / self.nx or 1.0
+        self.cell_h = (self.y_max - self.y_min) / self.ny or 1.0
+
+        cells = self._cell_y(y[rows]) * self.nx + self._cell_x(x[rows])
+        order = np.argsort(cells, kind='stable')
+        self.rows = rows[order]
+        self.starts = np.searchsorted(cells[order], np.arange(self.nx * self.ny + 1))
+
+    def _cell_x(self, values) -> np.ndarray:
+        return np.clip(((values - self.x_min) / self.cell_w).astype(np.int64), 0, self.nx - 1)
+
+    def _cell_y(self, values) -> np.ndarray:
+        return np.clip(((values - self.y_min) / self.cell_h).astype(np.int64), 0, self.ny - 1)
+
+    def _candidates(self, x_min: float, x_max: float, y_min: float, y_max: float) -> np.ndarray:
+        """Rows in every cell overlapping the rectangle"""
+        if (len(self.rows) == 0 or x_min > x_max or y_min > y_max
+                or x_max < self.x_min or x_min > self.x_max
+                or y_max < self.y_min or y_min > self.y_max):
+            return np.empty(0, dtype=self.rows.dtype)
+
+        cx0, cx1 = self._cell_x(np.array([x_min, x_max]))
+        cy0, cy1 = self._cell_y(np.array([y_min, y_max]))
+        # Cells of one grid row are adjacent, so each grid row is a single slice
+        slices = [
+            self.rows[self.starts[cy * self.nx + cx0]:self.starts[cy * self.nx + cx1 + 1]]
+            for cy in range(cy0, cy1 + 1)
+        ]
+        return np.concatenate(slices)
+
+    def query_rect(self, x_min: float, x_max: float, y_min: float, y_max: float) -> np.ndarray:
+        """Rows inside the rectangle (bounds inclusive)"""
+        rows = self._candidates(x_min, x_max, y_min, y_max)
+        x, y = self.x[rows], self.y[rows]
+        return rows[(x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)]
+
+    def query_polygon(self, polygon: Sequence[Sequence[float]]) -> np.ndarray:
+        """Rows inside the polygon given as a list of [x, y] vertices"""
+        vertices = np.asarray(polygon, dtype=np.float64)
+        rows = self.query_rect(vertices[:, 0].min(), vertices[:, 0].max(),
+                               vertices[:, 1].min(), vertices[:, 1].max())
+        return rows[points_in_polygon(self.x[rows], self.y[rows], vertices)]
+
+    def _box(self, cx: int, cy: int, radius: int) -> Tuple[int, int, int, int]:
+        return (max(cx - radius, 0), min(cx + radius, self.nx - 1),
+                max(cy - radius, 0), min(cy + radius, self.ny - 1))
+
+    def _box_rows(self, x0: int, x1: int, y0: int, y1: int) -> np.ndarray:
+        return np.concatenate([self.rows[self.starts[cy * self.nx + x0]:self.starts[cy * self.nx + x1 + 1]]
+                               for cy in range(y0, y1 + 1)])
+
+    def _box_clearance(self, qx: np.ndarray, qy: np.ndarray, x0: int, x1: int, y0: int, y1: int) -> np.ndarray:
+        """Distance from each query to the nearest box side with cells beyond it"""
+        clearance = np.full(len(qx), np.inf)
+        if x0 > 0:
+            clearance = np.minimum(clearance, qx - (self.x_min + x0 * self.cell_w))
+        if x1 < self.nx - 1:
+            clearance = np.minimum(clearance, self.x_min + (x1 + 1) * self.cell_w - qx)
+        if y0 > 0:
+            clearance = np.minimum(clearance, qy - (self.y_min + y0 * self.cell_h))
+        if y1 < self.ny - 1:
+            clearance = np.minimum(clearance, self.y_min + (y1 + 1) * self.cell_h - qy)
+        return np.maximum(clearance, 0)
+
+    def _nearest(self, qx: np.ndarray, qy: np.ndarray, candidates: np.ndarray,
+                 k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """k nearest candidates per query by brute force, ascending and padded with -1 / inf"""
+        rows = np.full((len(qx), k), -1, dtype=np.int64)
+        squared = np.full((len(qx), k), np.inf)
+        step = max(1, KNN_BLOCK_ENTRIES // max(len(candidates), 1))
+        take = min(k, len(candidates))
+        if not take:
+            return rows, squared
+        cx = self.x[candidates].astype(np.float64)
+        cy = self.y[candidates].astype(np.float64)
+        for start in range(0, len(qx), step):
+            block = slice(start, start + step)
+            dist = (qx[block, None] - cx) ** 2 + (qy[block, None] - cy) ** 2
+            nearest = np.argpartition(dist, take - 1, axis=1)[:, :take] if take < len(candidates) \
+                else np.broadcast_to(np.arange(take), (len(dist), take))
+            nearest_dist = np.take_along_axis(dist, nearest, axis=1)
+            order = np.argsort(nearest_dist, axis=1, kind='stable')
+            rows[block, :take] = candidates[np.take_along_axis(nearest, order, axis=1)]
+            squared[block, :take] = np.take_along_axis(nearest_dist, order, axis=1)
+        return rows, squared
+
+    def knn(self, qx: np.ndarray, qy: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact k nearest indexed rows per query point, returns (rows, squared distances) ascending.
+
+        Queries are grouped by cell. Each group searches a box of cells
+        around its own, doubling the box until every query's k-th
+        neighbour is closer than the nearest unsearched cell. Missing
+        results are row -1 with distance inf, like vector_index.knn_l2.
+        """
+        qx = np.asarray(qx, dtype=np.float64)
+        qy = np.asarray(qy, dtype=np.float64)
+        rows = np.full((len(qx), k), -1, dtype=np.int64)
+        squared = np.full((len(qx), k), np.inf)
+        if not len(qx) or not len(self.rows) or k <= 0:
+            return rows, squared
+
+        qcx, qcy = self._cell_x(qx), self._cell_y(qy)
+        cells = qcy * self.nx + qcx
+        order = np.argsort(cells, kind='stable')
+        groups = np.split(order, np.flatnonzero(np.diff(cells[order])) + 1)
+        for group in groups:
+            cx, cy = int(qcx[group[0]]), int(qcy[group[0]])
+            radius = 1
+            while True:
+                box = self._box(cx, cy, radius)
+                whole_grid = box == (0, self.nx - 1, 0, self.ny - 1)
+                candidates = self._box_rows(*box)
+                if len(candidates) >= k or whole_grid:
+                    found, found_sq = self._nearest(qx[group], qy[group], candidates, k)
+                    if whole_grid or (found_sq[:, -1] <= self._box_clearance(qx[group], qy[group], *box) ** 2).all():
+                        rows[group], squared[group] = found, found_sq
+                        break
+                radius *= 2
+        return rows, squared
+
+def points_in_polygon(x: np.ndarray, y: np.ndarray, vertices: np.ndarray) -> np.ndarray:
+    """Even-odd ray casting test, vectorized over points"""
+    inside = np.zeros(len(x), dtype=bool)
+    x1, y1 = vertices[-1]
+    for x2, y2 in vertices:
+        crosses = (y1 > y) != (y2 > y)
+        if crosses.any():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+            inside ^= crosses & (x < x_cross)
+        x1, y1 = x2, y2
+    return inside
@@ -0,0 +1,176 @@
+import threading
+import numpy as np
+from typing import Dict, List, Optional
+from .data_loader import data_loader
+
+HISTOGRAM_BINS = 20
+
+def _bin_codes(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Histogram bin of each value shifted by one, 0 for NaN and values outside the edges"""
+    codes = np.zeros(len(values), dtype=np.int32)
+    inside = np.isfinite(values) & (values >= edges[0]) & (values <= edges[-1])
+    # The last bin is closed on the right, like np.histogram
+    codes[inside] = np.clip(np.searchsorted(edges, values[inside], side='right'), 1, len(edges) - 1)
+    return codes
+
+def _score_edges(scores: np.ndarray) -> np.ndarray:
+    finite = scores[np.isfinite(scores)]
+    if not len(finite) or (finite.min() >= 0 and finite.max() <= 1):
+        return np.linspace(0.0, 1.0, HISTOGRAM_BINS + 1)
+    return np.linspace(finite.min(), max(finite.max(), finite.min() + 1e-9), HISTOGRAM_BINS + 1)
+
+def _area_edges(areas: np.ndarray) -> np.ndarray:
+    # Box areas span orders of magnitude, so the bins are log-spaced
+    positive = areas[np.isfinite(areas) & (areas > 0)]
+    if not len(positive):
+        return np.logspace(0, 1, HISTOGRAM_BINS + 1)
+    low, high = np.log10(positive.min()), np.log10(positive.max())
+    return np.logspace(low, max(high, low + 1e-9), HISTOGRAM_BINS + 1)
+
+class StatsService:
+    """Annotation counts kept up to date as annotations are removed and restored.
+
+    Every row gets a code per statistic (category, image, class, score bin,
+    area bin) once per loaded dataset, and the counts are one bincount over
+    the live rows. On removal or undo only the rows whose alive flag flipped
+    are counted in or out, so reads cost O(categories + bins); only the
+    per-image listing is O(images).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = None
+        self._index = None
+        self._version = -1
+        self._alive_seen: Optional[np.ndarray] = None
+        self._axes: Dict[str, np.ndarray] = {}
+        self._codes: Dict[str, np.ndarray] = {}
+        self._counts: Dict[str, np.ndarray] = {}
+        self._point_counts: Optional[np.ndarray] = None
+        self._images_covered = 0
+
+    def _build(self, index, alive: np.ndarray):
+        """Per-row codes and full counts for a freshly loaded dataset"""
+        table = data_loader.table
+        category_ids, category_codes = np.unique(table.category_ids, return_inverse=True)
+        image_ids, image_codes = np.unique(table.image_ids, return_inverse=True)
+        areas = table.bboxes[:, 2] * table.bboxes[:, 3]
+        self._axes = {
+            'category': category_ids,
+            'image': image_ids,
+            'score': _score_edges(table.scores),
+            'area': _area_edges(areas),
+        }
+        self._codes = {
+            'category': category_codes.astype(np.int32),
+            'image': image_codes.astype(np.int32),
+            'class': index.class_codes,
+            'score': _bin_codes(table.scores, self._axes['score']),
+            'area': _bin_codes(areas, self._axes['area']),
+        }
+        self._sizes = {
+            'category': len(category_ids),
+            'image': len(image_ids),
+            'class': len(index.class_names),
+            'score': HISTOGRAM_BINS + 1,
+            'area': HISTOGRAM_BINS + 1,
+        }
+        self._counts = {name: np.bincount(codes[alive], minlength=self._sizes[name])
+                        for name, codes in self._codes.items()}
+        self._images_covered = int(np.count_nonzero(self._counts['image'][image_ids >= 0]))
+        self._ids = index.annotation_ids
+
+    def _count_points(self, index, alive: np.ndarray):
+        self._point_counts = np.bincount(index.class_codes[alive & index.has_point],
+                                         minlength=len(index.class_names))
+
+    def _sync(self, index):
+        if index is self._index and index.version == self._version:
+            return
+        # One copy of alive for the whole update, so a removal landing meanwhile
+        # is either counted and marked seen, or left for the next sync
+        alive, version = data_loader.alive_state(index)
+        if index.annotation_ids is not self._ids:
+            self._build(index, alive)
+            self._count_points(index, alive)
+        elif index is not self._index:
+            # Same annotations under another 2D layout: only the point counts move
+            self._apply(index, alive, alive ^ self._alive_seen)
+            self._count_points(index, alive)
+        elif version != self._version:
+            self._apply(index, alive, alive ^ self._alive_seen)
+        else:
+            return
+        self._index = index
+        self._version = version
+        self._alive_seen = alive
+
+    def _apply(self, index, alive: np.ndarray, flipped: np.ndarray):
+        """Count rows that came back in and rows that were removed out"""
+        rows = np.flatnonzero(flipped)
+        if not len(rows):
+            return
+        now_alive = alive[rows]
+        restored, removed = rows[now_alive], rows[~now_alive]
+        touched = np.unique(self._codes['image'][rows])
+        touched = touched[self._axes['image'][touched] >= 0]
+        covered_before = np.count_nonzero(self._counts['image'][touched])
+        for name, codes in self._codes.items():
+            size = self._sizes[name]
+            self._counts[name] += (np.bincount(codes[restored], minlength=size)
+                                   - np.bincount(codes[removed], minlength=size))
+        self._images_covered += int(np.count_nonzero(self._counts['image'][touched]) - covered_before)
+        size = len(index.class_names)
+        self._point_counts += (np.bincount(index.class_codes[restored[index.has_point[restored]]], minlength=size)
+                               - np.bincount(index.class_codes[removed[index.has_point[removed]]], minlength=size))
+
+    def _current(self, *names: str):
+        """Copies of the named counts and the bin axes they refer to"""
+        index = data_loader.get_index()
+        with self._lock:
+            self._sync(index)
+            counts = {name: (self._point_counts if name == 'points' else self._counts[name]).copy()
+                      for name in names}
+            counts['images_covered'] = self._images_covered
+            return counts, self._axes
+
+    @staticmethod
+    def _histogram(counts: np.ndarray, edges: np.ndarray) -> Dict:
+        # Bin 0 holds rows with a missing value
+        return {'edges': edges.tolist(), 'counts': counts[1:].tolist(), 'missing': int(counts[0])}
+
+    def annotation_stats(self) -> Dict:
+        """Live annotation counts per category, image coverage and score/area histograms"""
+        counts, axes = self._current('category', 'score', 'area')
+        names = {cat['id']: cat['name'] for cat in data_loader.annotations.get('categories', [])}
+        category_counts = {}
+        for position in np.flatnonzero(counts['category']).tolist():
+            cat_id = int(axes['category'][position])
+            name = names.get(cat_id, f"category_{cat_id if cat_id >= 0 else None}")
+            category_counts[name] = category_counts.get(name, 0) + int(counts['category'][position])
+        return {
+            'total_annotations': int(counts['category'].sum()),
+            'category_counts': category_counts,
+            'total_categories': int(np.count_nonzero(counts['category'])),
+            'total_images': len(data_loader.annotations.get('images', [])),
+            'images_with_annotations': counts['images_covered'],
+            'score_histogram': self._histogram(counts['score'], axes['score']),
+            'area_histogram': self._histogram(counts['area'], axes['area']),
+        }
+
+    def class_counts(self, points_only: bool = False) -> Dict[str, int]:
+        """Live annotations, or live embedding points, per class name"""
+        name = 'points' if points_only else 'class'
+        counts = self._current(name)[0][name]
+        names: List[str] = data_loader.get_index().class_names
+        return {names[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+
+    def image_counts(self) -> Dict[int, int]:
+        """Live annotations per image id, for images that still have any"""
+        counts, axes = self._current('image')
+        image_ids, counts = axes['image'], counts['image']
+        keep = np.flatnonzero((counts > 0) & (image_ids >= 0))
+        return dict(zip(image_ids[keep].tolist(), counts[keep].tolist()))
+
+# Global stats service instance
+stats_service = StatsService()
@@ -0,0 +1,136 @@
+import json
+import mmap
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .dataset_cache import fingerprint_matches
+
+ATLAS_FORMAT = 1
+
+# Index columns, one int64 row per thumbnail
+ID, PART, OFFSET, LENGTH = range(4)
+
+def part_paths(atlas_dir: Path, part: int) -> Tuple[Path, Path]:
+    """Thumbnail bytes and (id, offset, length) rows of one part"""
+    return atlas_dir / f"part_{part:05d}.atlas", atlas_dir / f"part_{part:05d}.npy"
+
+class _AtlasState:
+    """One opened atlas; published whole and never changed afterwards"""
+
+    def __init__(self, manifest: Dict, index: Optional[np.ndarray], parts: List[Optional[mmap.mmap]]):
+        self.manifest = manifest
+        self.index = index
+        self.parts = parts
+
+_NO_ATLAS = _AtlasState({}, None, [])
+
+class ThumbnailAtlas:
+    """Pre-rendered crop thumbnails served without decoding anything.
+
+    build_thumbnail_atlas.py renders every annotation at one size, padding
+    and format into part files of concatenated encoded images, plus
+    index.npy with one (id, part, offset, length) row per thumbnail,
+    sorted by id. Parts are memory-mapped, so a lookup is a binary search
+    and a slice. manifest.json names the annotations file the atlas was
+    built from; the atlas is only used while that file is unchanged and
+    once the build has completed.
+
+    Reopening publishes a new state in one assignment. Readers keep the
+    state they started with, and its mappings are closed once the last
+    reader drops it.
+    """
+
+    def __init__(self, atlas_dir: Path, source_path: Path):
+        self.atlas_dir = Path(atlas_dir)
+        self.source_path = Path(source_path)
+        self.manifest_path = self.atlas_dir / "manifest.json"
+        self._lock = threading.Lock()
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._generation = -1
+        self._load_id: Optional[str] = None
+        self._state = _NO_ATLAS
+        self.hits = 0
+
+    def _manifest_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _open(self) -> _AtlasState:
+        """Map a completed atlas that matches the annotations file, else serve nothing"""
+        parts = []
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+            if manifest.get('format') != ATLAS_FORMAT or not manifest.get('complete'):
+                return _NO_ATLAS
+            if not fingerprint_matches(self.source_path, manifest['source']):
+                print(f"Thumbnail atlas in {self.atlas_dir} was built from another annotations file, ignoring it")
+                return _NO_ATLAS
+            for part in range(manifest['parts']):
+                atlas_path = part_paths(self.atlas_dir, part)[0]
+                with open(atlas_path, 'rb') as f:
+                    # Empty files cannot be mapped; their parts have no index rows
+                    parts.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                                 if os.fstat(f.fileno()).st_size else None)
+            index = np.load(self.atlas_dir / "index.npy", mmap_mode='r')
+            print(f"Loaded thumbnail atlas: {len(index)} thumbnails at {manifest['size']}px")
+            return _AtlasState(manifest, index, parts)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not open thumbnail atlas in {self.atlas_dir}: {e}")
+            # Never published, so nothing else holds these mappings
+            for part in parts:
+                if part is not None:
+                    part.close()
+            return _NO_ATLAS
+
+    def bind(self, generation: int, load_id: Optional[str]):
+        """Pick up a newly built atlas, and re-check the source after a dataset reload.
+
+        Requests still pinned to a snapshot from an older reload generation
+        keep the current atlas instead of reopening it.
+        """
+        stamp = self._manifest_stamp()
+        if generation < self._generation or (stamp == self._stamp and load_id == self._load_id):
+            return
+        with self._lock:
+            if generation < self._generation or (stamp == self._stamp and load_id == self._load_id):
+                return
+            self._state = self._open()
+            self._stamp, self._generation, self._load_id = stamp, generation, load_id
+
+    def covers(self, padding: int, size: Optional[int], format: str) -> bool:
+        """Whether crops with these parameters are served from the atlas"""
+        state = self._state
+        manifest = state.manifest
+        return (state.index is not None and manifest.get('size') == size
+                and manifest.get('padding') == padding and manifest.get('image_format') == format)
+
+    def get(self, annotation_id: int) -> Optional[bytes]:
+        """Encoded thumbnail of an annotation, None if the atlas has none"""
+        state = self._state
+        index = state.index
+        if index is None:
+            return None
+        position = int(np.searchsorted(index[:, ID], annotation_id))
+        if position == len(index) or index[position, ID] != annotation_id:
+            return None
+        part, offset, length = (int(value) for value in index[position, PART:])
+        self.hits += 1
+        return state.parts[part][offset:offset + length]
+
+    def stats(self) -> Dict:
+        state = self._state
+        manifest = state.manifest
+        return {
+            'loaded': state.index is not None,
+            'thumbnails': len(state.index) if state.index is not None else 0,
+            'size': manifest.get('size'),
+            'padding': manifest.get('padding'),
+            'format': manifest.get('image_format'),
+            'hits': self.hits,
+        }
@@ -0,0 +1,109 @@
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from .data_loader import data_loader
+
+class TileService:
+    """Level-of-detail tiles over the 2D embedding space.
+
+    Tile (z, x, y) splits the bounding box of all points into a 2^z x 2^z
+    grid, x growing right and y growing up in data coordinates. A tile
+    holding fewer than `point_threshold` points returns them raw; denser
+    tiles return per-class density bins. Tiles are cached with LRU
+    eviction and dropped whenever the dataset changes.
+    """
+
+    def __init__(self, max_tiles: int = 512, point_threshold: int = 5000, bins_per_side: int = 64):
+        self.max_tiles = max_tiles
+        self.point_threshold = point_threshold
+        self.bins_per_side = bins_per_side
+        self.max_zoom = 20
+        self._cache: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self._index = None
+        self._index_version = -1
+
+    def _sync_cache(self, index):
+        # Cached tiles are only valid for one index object at one removal version
+        if index is not self._index or index.version != self._index_version:
+            self._cache.clear()
+            self._index = index
+            self._index_version = index.version
+
+    def get_tile(self, z: int, x: int, y: int, class_filter: Optional[str] = None) -> Dict:
+        """Get a tile, computing and caching it on a miss"""
+        if not 0 <= z <= self.max_zoom:
+            raise ValueError(f"Zoom level must be between 0 and {self.max_zoom}")
+        if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            raise ValueError(f"Tile ({x}, {y}) is outside zoom level {z}")
+
+        index = data_loader.get_index()
+        self._sync_cache(index)
+
+        key = (z, x, y, class_filter)
+        tile = self._cache.get(key)
+        if tile is not None:
+            self._cache.move_to_end(key)
+            return tile
+
+        tile = self._build_tile(index, z, x, y, class_filter)
+        self._cache[key] = tile
+        if len(self._cache) > self.max_tiles:
+            self._cache.popitem(last=False)
+        return tile
+
+    def _build_tile(self, index, z: int, x: int, y: int, class_filter: Optional[str]) -> Dict:
+        grid = index.grid
+        tiles_per_side = 2 ** z
+        tile_w = (grid.x_max - grid.x_min) / tiles_per_side or 1.0
+        tile_h = (grid.y_max - grid.y_min) / tiles_per_side or 1.0
+        x0 = grid.x_min + x * tile_w
+        y0 = grid.y_min + y * tile_h
+
+        rows = index.select_rows(x0, x0 + tile_w, y0, y0 + tile_h, class_filter=class_filter)
+
+        # Points on a shared edge belong to the tile on their right/top only
+        px, py = index.x[rows], index.y[rows]
+        tx = np.clip(((px - grid.x_min) / tile_w).astype(np.int64), 0, tiles_per_side - 1)
+        ty = np.clip(((py - grid.y_min) / tile_h).astype(np.int64), 0, tiles_per_side - 1)
+        in_tile = (tx == x) & (ty == y)
+        rows, px, py = rows[in_tile], px[in_tile], py[in_tile]
+
+        tile = {
+            'z': z, 'x': x, 'y': y,
+            'bounds': [x0, x0 + tile_w, y0, y0 + tile_h],
+            'count': len(rows),
+        }
+
+        if len(rows) < self.point_threshold:
+            tile['mode'] = 'points'
+            tile['points'] = index.points_for_rows(rows)
+            return tile
+
+        # Aggregate into bins_per_side^2 cells per class
+        size = self.bins_per_side
+        bx = np.clip(((px - x0) / tile_w * size).astype(np.int64), 0, size - 1)
+        by = np.clip(((py - y0) / tile_h * size).astype(np.int64), 0, size - 1)
+        codes = index.class_codes[rows].astype(np.int64)
+        keys = (codes * size + by) * size + bx
+        counts = np.bincount(keys, minlength=len(index.class_names) * size * size)
+        occupied = np.flatnonzero(counts)
+
+        tile['mode'] = 'bins'
+        tile['bins_per_side'] = size
+        tile['classes'] = index.class_names
+        # Each bin: [bin_x, bin_y, class_code, count]
+        tile['bins'] = np.stack([
+            occupied % size,
+            occupied // size % size,
+            occupied // (size * size),
+            counts[occupied],
+        ], axis=1).tolist()
+        return tile
+
+    def clear(self):
+        """Drop all cached tiles"""
+        self._cache.clear()
+        self._index = None
+
+# Global tile service instance
+tile_service = TileService()
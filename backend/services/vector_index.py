@@ -0,0 +1,153 @@
+import numpy as np
+from typing import Callable, Optional, Tuple
+
+# fetch(rows) -> float32 vectors of those index rows, e.g. DataLoader.get_features
+FetchVectors = Callable[[np.ndarray], np.ndarray]
+
+def _merge_top_k(best_scores: np.ndarray, best_rows: np.ndarray,
+                 scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep the k highest scores per query out of the current best and a new block"""
+    rows = np.concatenate([best_rows, np.broadcast_to(rows, scores.shape)], axis=1)
+    scores = np.concatenate([best_scores, scores], axis=1)
+    if scores.shape[1] > k:
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, keep, axis=1)
+        rows = np.take_along_axis(rows, keep, axis=1)
+    return scores, rows
+
+def _sort_results(scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Sort by descending score, padding to k columns with row -1 and score -inf"""
+    order = np.argsort(-scores, axis=1, kind='stable')
+    rows = np.take_along_axis(rows, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+    missing = k - rows.shape[1]
+    if missing > 0:
+        rows = np.pad(rows, ((0, 0), (0, missing)), constant_values=-1)
+        scores = np.pad(scores, ((0, 0), (0, missing)), constant_values=-np.inf)
+    return rows, scores
+
+def knn_l2(queries: np.ndarray, fetch: FetchVectors, candidates: np.ndarray, k: int,
+           block_size: int = 16384) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact Euclidean k nearest candidates per query, returns (rows, squared distances) ascending.
+
+    Missing results are row -1 with distance inf.
+    """
+    query_sq = np.einsum('ij,ij->i', queries, queries)[:, None]
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(candidates), block_size):
+        block = candidates[start:start + block_size]
+        vectors = fetch(block)
+        # Ranking by 2q.v - |v|^2 is ranking by -|q - v|^2 without the per-query constant
+        scores = 2 * (queries @ vectors.T) - np.einsum('ij,ij->i', vectors, vectors)
+        best_scores, best_rows = _merge_top_k(best_scores, best_rows, scores, block, k)
+    rows, scores = _sort_results(best_scores, best_rows, k)
+    return rows, np.maximum(query_sq - scores, 0)
+
+def _nearest_centroid(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.argmax(vectors @ centroids.T, axis=1)
+
+def inverse_norms(fetch: FetchVectors, rows: np.ndarray, size: int, block_size: int = 16384) -> np.ndarray:
+    """1/||v|| for the given rows of an index of `size` rows, 0 elsewhere and for zero vectors"""
+    result = np.zeros(size, dtype=np.float32)
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        norms = np.linalg.norm(fetch(block), axis=1)
+        result[block] = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return result
+
+class BruteForceIndex:
+    """Exact cosine similarity search by blocked matrix multiply.
+
+    Vectors are read block by block through fetch, so a memory-mapped
+    matrix is never copied whole; only one block and the running top-k
+    per query are held at a time.
+    """
+
+    def __init__(self, fetch: FetchVectors, inv_norms: np.ndarray, block_size: int = 16384):
+        self.fetch = fetch
+        self.inv_norms = inv_norms
+        self.block_size = block_size
+
+    def search(self, queries: np.ndarray, candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k candidate rows per unit-norm query, returns (rows, scores) sorted by score.
+
+        Missing results are row -1 with score -inf.
+        """
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(candidates), self.block_size):
+            block = candidates[start:start + self.block_size]
+            scores = (queries @ self.fetch(block).T) * self.inv_norms[block]
+            best_scores, best_rows = _merge_top_k(best_scores, best_rows, scores, block, k)
+        return _sort_results(best_scores, best_rows, k)
+
+class IVFIndex:
+    """Approximate cosine search with an inverted file over spherical k-means cells.
+
+    Each query scans only the n_probe cells whose centroids are closest,
+    then ranks those candidates exactly. Rows are grouped by cell in one
+    contiguous array, like the 2D grid index.
+    """
+
+    def __init__(self, fetch: FetchVectors, inv_norms: np.ndarray, rows: np.ndarray,
+                 n_lists: Optional[int] = None, n_probe: int = 8, train_size: int = 50000,
+                 iterations: int = 10, block_size: int = 16384, seed: int = 0):
+        self.fetch = fetch
+        self.inv_norms = inv_norms
+        self.n_probe = n_probe
+        self.block_size = block_size
+        self.n_lists = n_lists or max(1, int(np.sqrt(len(rows))))
+
+        rng = np.random.default_rng(seed)
+        sample = rows if len(rows) <= train_size else np.sort(rng.choice(rows, train_size, replace=False))
+        self.centroids = self._train(self._unit(sample), iterations, rng)
+
+        assignment = np.concatenate([
+            _nearest_centroid(self._unit(rows[start:start + block_size]), self.centroids)
+            for start in range(0, len(rows), block_size)
+        ]) if len(rows) else np.empty(0, dtype=np.int64)
+        order = np.argsort(assignment, kind='stable')
+        self.rows = rows[order]
+        self.starts = np.searchsorted(assignment[order], np.arange(self.n_lists + 1))
+
+    def _unit(self, rows: np.ndarray) -> np.ndarray:
+        return self.fetch(rows) * self.inv_norms[rows][:, None]
+
+    def _train(self, vectors: np.ndarray, iterations: int, rng: np.random.Generator) -> np.ndarray:
+        self.n_lists = min(self.n_lists, max(len(vectors), 1))
+        if not len(vectors):
+            return np.zeros((1, 1), dtype=np.float32)
+        centroids = vectors[rng.choice(len(vectors), self.n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = _nearest_centroid(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty cells keep their previous centroid
+            filled = norms[:, 0] > 0
+            centroids[filled] = sums[filled] / norms[filled]
+        return centroids
+
+    def search(self, queries: np.ndarray, k: int, allowed: Optional[np.ndarray] = None,
+               n_probe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows per unit-norm query among rows where allowed is True, returns (rows, scores).
+
+        Queries with fewer than k candidates in their probed cells are
+        padded with row -1 and score -inf.
+        """
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        cells = np.argpartition(-(queries @ self.centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+        result_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        result_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([self.rows[self.starts[c]:self.starts[c + 1]] for c in cells[i]])
+            if allowed is not None:
+                candidates = candidates[allowed[candidates]]
+            if not len(candidates):
+                continue
+            scores = (self.fetch(candidates) @ query) * self.inv_norms[candidates]
+            top = np.argsort(-scores, kind='stable')[:k]
+            result_rows[i, :len(top)] = candidates[top]
+            result_scores[i, :len(top)] = scores[top]
+        return result_rows, result_scores
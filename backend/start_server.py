@@ -3,6 +3,7 @@
 Startup script for the Object Detection Analysis Tool backend
 """
 
+import argparse
 import os
 import sys
 from pathlib import Path
@@ -44,6 +45,11 @@ def check_images_directory():
         return True
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WORKERS", "1")),
+                        help="Worker processes; more than one disables auto-reload (default: $WORKERS or 1)")
+    args = parser.parse_args()
+    
     print("🚀 Starting Object Detection Analysis Tool Backend")
     print("=" * 50)
     
@@ -56,7 +62,7 @@ def main():
     
     print("\n📊 Loading data...")
     
-    # Import and load data
+    # Import and load data; this also writes the dataset cache the workers memory-map
     try:
         from services.data_loader import data_loader
         data_loader.load_all()
@@ -64,7 +70,7 @@ def main():
         
         # Print summary
         print(f"   - Embeddings: {data_loader.embeddings.shape}")
-        print(f"   - Annotations: {len(data_loader.annotations['annotations'])}")
+        print(f"   - Annotations: {data_loader.get_live_annotation_count()}")
         print(f"   - Mapping: {len(data_loader.mapping)}")
         print(f"   - Classes: {len(data_loader.class_names)}")
         
@@ -80,7 +86,13 @@ def main():
     
     # Start the server
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    if args.workers > 1:
+        # Workers map the same cache files, so the dataset pages are shared;
+        # removals and reloads reach every worker through data/ (see DataLoader.sync)
+        print(f"   Workers:      {args.workers}")
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=args.workers)
+    else:
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
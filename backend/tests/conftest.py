@@ -0,0 +1,15 @@
+import sys
+from pathlib import Path
+import pytest
+
+# Tests import the backend modules the way main.py does, from the backend directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """A small synthetic dataset without images, as benchmarks/generate_dataset.py writes it"""
+    from benchmarks.generate_dataset import build_parser, generate, resolve_counts
+    args = resolve_counts(build_parser().parse_args(
+        [str(tmp_path), "--detections", "600", "--images", "40", "--classes", "4", "--no-images"]))
+    generate(tmp_path, args)
+    return tmp_path / "data"
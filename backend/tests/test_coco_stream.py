@@ -0,0 +1,77 @@
+import json
+import numpy as np
+import pytest
+from services.coco_stream import load_coco_streaming
+
+ANNOTATIONS = [
+    {'id': 1, 'image_id': 10, 'category_id': 3, 'bbox': [1.5, 2, 30, 40], 'score': 0.9},
+    {'id': 22, 'image_id': 11, 'category_id': 4, 'bbox': [0, 0, 5, 5], 'caption': 'café – 猫 🐈'},
+    {'id': 333, 'bbox': [1, 2], 'attributes': {'nested': [1, {'deep': '}]'}]}},
+    {'id': 4444, 'image_id': 12, 'category_id': 3, 'bbox': [7, 8, 9, 10], 'score': 12345678901},
+]
+
+def write_coco(path, annotations):
+    # Irregular whitespace and non-ASCII text before the array shift every byte offset
+    entries = [json.dumps(ann, ensure_ascii=False) for ann in annotations]
+    text = ('{"info": {"description": "Größe ✓"},\n "images": [{"id": 10, "file_name": "ä.jpg"}],'
+            '\n "annotations" : [\n  ' + ' ,\n\t'.join(entries) + '  ],\n'
+            ' "categories": [{"id": 3, "name": "vögel"}]}\n')
+    path.write_text(text, encoding='utf-8')
+    return [entry.encode('utf-8') for entry in entries]
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 16, 1 << 20])
+def test_byte_spans_cover_each_record_exactly(tmp_path, chunk_size):
+    path = tmp_path / 'annotations.json'
+    encoded = write_coco(path, ANNOTATIONS)
+    meta, table = load_coco_streaming(path, chunk_size=chunk_size)
+    data = path.read_bytes()
+    try:
+        assert len(table) == len(ANNOTATIONS)
+        for row, ann in enumerate(ANNOTATIONS):
+            offset, length = int(table.offsets[row]), int(table.lengths[row])
+            assert data[offset:offset + length] == encoded[row]
+            assert table.raw_record(row) == encoded[row]
+            assert table.record(row) == ann
+    finally:
+        table.close()
+    assert meta == {
+        'info': {'description': 'Größe ✓'},
+        'images': [{'id': 10, 'file_name': 'ä.jpg'}],
+        'categories': [{'id': 3, 'name': 'vögel'}],
+    }
+
+def test_columns_and_missing_fields(tmp_path):
+    path = tmp_path / 'annotations.json'
+    write_coco(path, ANNOTATIONS)
+    _, table = load_coco_streaming(path, chunk_size=16)
+    assert table.ids.tolist() == [1, 22, 333, 4444]
+    assert table.image_ids.tolist() == [10, 11, -1, 12]
+    assert table.category_ids.tolist() == [3, 4, -1, 3]
+    assert table.bboxes[0].tolist() == [1.5, 2, 30, 40]
+    assert np.isnan(table.bboxes[2]).all()
+    assert np.isnan(table.scores[1]) and table.scores[3] == 12345678901
+    assert table.fields(2) == {'id': 333, 'image_id': None, 'category_id': None, 'bbox': None, 'score': None}
+    assert table.fields(0) == {'id': 1, 'image_id': 10, 'category_id': 3, 'bbox': [1.5, 2, 30, 40], 'score': 0.9}
+
+def test_empty_annotations_and_empty_file_object(tmp_path):
+    path = tmp_path / 'annotations.json'
+    path.write_text('{"images": [], "annotations": [ ], "categories": []}')
+    meta, table = load_coco_streaming(path, chunk_size=4)
+    assert meta == {'images': [], 'categories': []}
+    assert len(table) == 0 and table.offsets.dtype == np.int64
+
+    path.write_text(' { } ')
+    meta, table = load_coco_streaming(path)
+    assert meta == {} and len(table) == 0
+
+@pytest.mark.parametrize('text', [
+    '{"annotations": [{"id": 1} {"id": 2}]}',
+    '{"annotations": [{"id": 1}, {"id": 2}',
+    '{"images": [] "annotations": []}',
+    '["annotations"]',
+])
+def test_malformed_input_raises_value_error(tmp_path, text):
+    path = tmp_path / 'annotations.json'
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        load_coco_streaming(path, chunk_size=8)
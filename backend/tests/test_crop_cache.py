@@ -0,0 +1,48 @@
+import os
+from services.crop_cache import CropCache
+
+def spill_all(cache, count=4):
+    # The memory tier holds one 10-byte crop, so the rest spill to disk
+    for annotation_id in range(count):
+        cache.put((annotation_id, 10, 128, 'jpeg'), bytes([annotation_id]) * 10)
+
+def test_evicted_crops_are_served_from_disk(tmp_path):
+    cache = CropCache(max_bytes=10, disk_dir=str(tmp_path))
+    spill_all(cache)
+    assert cache.get((0, 10, 128, 'jpeg')) == bytes([0]) * 10
+    assert cache.stats()['disk_hits'] == 1
+
+def test_spills_go_to_a_directory_per_process(tmp_path):
+    cache = CropCache(max_bytes=10, disk_dir=str(tmp_path))
+    spill_all(cache)
+    assert cache.disk_dir == tmp_path / str(os.getpid())
+    assert len(list(cache.disk_dir.iterdir())) == 3
+
+def test_bind_keeps_other_processes_files(tmp_path):
+    other = tmp_path / str(os.getppid())
+    other.mkdir()
+    (other / "1_10_128.jpeg").write_bytes(b"other")
+    cache = CropCache(max_bytes=10, disk_dir=str(tmp_path))
+    cache.bind('load-1')
+    spill_all(cache)
+    cache.bind('load-2')
+    assert cache.stats()['disk_entries'] == 0
+    assert not cache.disk_dir.exists()
+    assert (other / "1_10_128.jpeg").read_bytes() == b"other"
+
+def test_same_owner_keeps_entries(tmp_path):
+    cache = CropCache(max_bytes=10, disk_dir=str(tmp_path))
+    cache.bind('load-1')
+    spill_all(cache)
+    cache.bind('load-' + '1')
+    assert cache.stats()['disk_entries'] == 3
+
+def test_directories_of_exited_processes_are_removed(tmp_path):
+    # Above the kernel's pid_max, so no process can have it
+    gone = tmp_path / str(2 ** 23)
+    gone.mkdir()
+    (gone / "1_10_128.jpeg").write_bytes(b"stale")
+    (tmp_path / "2_10_128.jpeg").write_bytes(b"old layout")
+    cache = CropCache(max_bytes=10, disk_dir=str(tmp_path))
+    spill_all(cache)
+    assert sorted(path.name for path in tmp_path.iterdir()) == [str(os.getpid())]
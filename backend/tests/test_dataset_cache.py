@@ -0,0 +1,58 @@
+import os
+import numpy as np
+from services.dataset_cache import DatasetCache, file_fingerprint, fingerprint_matches
+
+def write_source(path, middle: bytes):
+    # Larger than the old 1 MiB head and tail samples, so an edit in the middle is past both
+    path.write_bytes(b"a" * 3_000_000 + middle + b"z" * 3_000_000)
+
+def test_unchanged_file_matches(tmp_path):
+    source = tmp_path / "annotations.json"
+    write_source(source, b"12345")
+    assert fingerprint_matches(source, file_fingerprint(source))
+
+def test_touch_keeps_match(tmp_path):
+    source = tmp_path / "annotations.json"
+    write_source(source, b"12345")
+    stored = file_fingerprint(source)
+    os.utime(source, ns=(stored['mtime_ns'] + 10**9, stored['mtime_ns'] + 10**9))
+    assert fingerprint_matches(source, stored)
+
+def test_same_size_edit_in_the_middle_is_a_change(tmp_path):
+    source = tmp_path / "annotations.json"
+    write_source(source, b"12345")
+    stored = file_fingerprint(source)
+    write_source(source, b"54321")
+    assert os.path.getsize(source) == stored['size']
+    assert not fingerprint_matches(source, stored)
+
+def test_same_size_edit_with_restored_mtime_is_trusted(tmp_path):
+    # Size and mtime both unchanged is the fast path; nothing is hashed
+    source = tmp_path / "annotations.json"
+    write_source(source, b"12345")
+    stored = file_fingerprint(source)
+    write_source(source, b"54321")
+    os.utime(source, ns=(stored['mtime_ns'], stored['mtime_ns']))
+    assert fingerprint_matches(source, stored)
+
+def test_cache_is_stale_after_same_size_edit(tmp_path):
+    source = tmp_path / "annotations.json"
+    write_source(source, b"12345")
+    cache = DatasetCache(tmp_path / "cache", {'annotations': source})
+    cache.save(cache.fingerprints(), {'ids': np.arange(5)}, coco={})
+    loaded = cache.load()
+    assert loaded is not None
+    assert list(loaded['columns']['ids']) == [0, 1, 2, 3, 4]
+
+    write_source(source, b"54321")
+    assert cache.load() is None
+
+def test_cache_from_older_format_is_stale(tmp_path):
+    source = tmp_path / "annotations.json"
+    write_source(source, b"12345")
+    cache = DatasetCache(tmp_path / "cache", {'annotations': source})
+    fingerprint = file_fingerprint(source)
+    del fingerprint['digest']
+    fingerprint['mtime_ns'] += 1
+    cache.save({'annotations': fingerprint}, {'ids': np.arange(5)})
+    assert cache.load() is None
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from services.coco_stream import AnnotationTable
+from services.dataset_index import DatasetIndex, SortedIdMap
+
+CATEGORIES = [{'id': 1, 'name': 'cat'}, {'id': 2, 'name': 'dog'}]
+
+def make_table(ids, category_ids):
+    count = len(ids)
+    return AnnotationTable("unused.json", {
+        'ids': np.asarray(ids, dtype=np.int64),
+        'image_ids': np.ones(count, dtype=np.int64),
+        'category_ids': np.asarray(category_ids, dtype=np.int64),
+        'bboxes': np.ones((count, 4)),
+        'scores': np.ones(count),
+        'offsets': np.zeros(count, dtype=np.int64),
+        'lengths': np.zeros(count, dtype=np.int32),
+    })
+
+@pytest.fixture
+def index():
+    # Ids out of order; 105 has no mapping, 106 maps past the embeddings, 107 to a NaN point
+    table = make_table([103, 101, 102, 104, 105, 106, 107], [1, 2, 1, 7, 1, 2, 2])
+    mapping = SortedIdMap.from_dict({101: 0, 102: 1, 103: 2, 104: 3, 106: 50, 107: 4})
+    embeddings = np.array([[0, 0], [1, 1], [2, 2], [3, 3], [np.nan, 0]], dtype=np.float32)
+    return DatasetIndex.build(table, CATEGORIES, mapping, embeddings)
+
+def ids_of(index, rows):
+    return sorted(index.annotation_ids[rows].tolist())
+
+def test_sorted_id_map():
+    mapping = SortedIdMap.from_dict({5: 50, 1: 10, 3: 30})
+    assert mapping.lookup(np.array([3, 4, 1, 9])).tolist() == [30, -1, 10, -1]
+    assert mapping[5] == 50 and 4 not in mapping and 1 in mapping
+    assert list(mapping) == [1, 3, 5] and len(mapping) == 3
+    with pytest.raises(KeyError):
+        mapping[4]
+
+def test_class_codes_follow_categories_then_unknown_ids(index):
+    assert index.class_names == ['cat', 'dog', 'class_7']
+    assert [index.class_names[code] for code in index.class_codes] == \
+        ['cat', 'dog', 'cat', 'class_7', 'cat', 'dog', 'dog']
+
+def test_points_need_a_mapping_in_range_and_finite_coordinates(index):
+    assert ids_of(index, np.flatnonzero(index.has_point)) == [101, 102, 103, 104]
+    row = index.row_for_id(102)
+    assert (index.x[row], index.y[row]) == (1.0, 1.0)
+
+def test_point_mask_by_class(index):
+    assert ids_of(index, np.flatnonzero(index.point_mask())) == [101, 102, 103, 104]
+    assert ids_of(index, np.flatnonzero(index.point_mask('cat'))) == [102, 103]
+    assert not index.point_mask('horse').any()
+
+def test_remove_and_restore(index):
+    assert index.remove([101, 102, 999]) == 2
+    assert index.version == 1
+    assert index.remove([101]) == 0
+    assert index.version == 1
+    assert index.row_for_id(101) is None
+    assert ids_of(index, np.flatnonzero(index.point_mask())) == [103, 104]
+    assert len(index.rows_for_ids([101], alive_only=False)) == 1
+
+    assert index.restore([101, 103]) == 1
+    assert index.version == 2
+    assert ids_of(index, np.flatnonzero(index.point_mask())) == [101, 103, 104]
+
+def test_rows_for_ids_drops_unknown_and_duplicates(index):
+    assert ids_of(index, index.rows_for_ids([104, 104, 999, 101])) == [101, 104]
+    assert len(index.rows_for_ids([])) == 0
+
+def test_select_rows(index):
+    assert ids_of(index, index.select_rows(0.5, 2.5, 0.5, 2.5)) == [102, 103]
+    assert ids_of(index, index.select_rows(-1, 10, -1, 10, class_filter='dog')) == [101]
+    index.remove([103])
+    assert ids_of(index, index.select_rows(0.5, 2.5, 0.5, 2.5)) == [102]
+    triangle = [[-0.5, -0.5], [3.5, -0.5], [-0.5, 3.5]]
+    assert ids_of(index, index.select_rows(0, 0, 0, 0, polygon=triangle)) == [101, 102]
+    # Returned in annotation row order
+    rows = index.select_rows(-1, 10, -1, 10)
+    assert rows.tolist() == sorted(rows.tolist())
+
+def test_with_embeddings_keeps_removals_and_bumps_version(index):
+    index.remove([101])
+    moved = DatasetIndex.with_embeddings(index, np.array([[9, 9], [8, 8], [np.nan, 1], [7, 7], [6, 6]],
+                                                         dtype=np.float32))
+    assert moved.version == index.version + 1
+    assert not moved.alive[moved.rows_for_ids([101], alive_only=False)].any()
+    assert ids_of(moved, np.flatnonzero(moved.point_mask())) == [102, 104, 107]
+    # The original index and its removals are unaffected
+    assert ids_of(index, np.flatnonzero(index.point_mask())) == [102, 103, 104]
+    moved.restore([101])
+    assert index.row_for_id(101) is None
+
+def test_cached_columns_rebuild_the_same_index(index):
+    columns = index.columns()
+    rebuilt = DatasetIndex(index.annotation_ids, columns['class_codes'], index.class_names,
+                           columns['embedding_rows'], columns['has_point'], columns['x'], columns['y'],
+                           columns['id_order'])
+    assert rebuilt.row_for_id(104) == index.row_for_id(104)
+    assert np.array_equal(rebuilt.select_rows(-1, 10, -1, 10), index.select_rows(-1, 10, -1, 10))
@@ -0,0 +1,67 @@
+import threading
+import numpy as np
+import pytest
+from services.data_loader import DataLoader
+from services.dataset_index import DatasetIndex
+from services.outlier_service import OutlierService
+import services.outlier_service as outlier_module
+
+class FakeLoader:
+    """The parts of DataLoader the outlier service reads, with 2D points only"""
+
+    def __init__(self, index):
+        self.index = index
+        self._sync_lock = threading.Lock()
+
+    alive_state = DataLoader.alive_state
+
+    def get_index(self):
+        return self.index
+
+    def has_features(self):
+        return False
+
+@pytest.fixture
+def loader(monkeypatch):
+    count = 600
+    rng = np.random.default_rng(1)
+    ids = np.arange(1, count + 1)
+    x, y = rng.normal(size=(2, count)).astype(np.float32)
+    index = DatasetIndex(ids, (ids % 3).astype(np.int16), ['a', 'b', 'c'], np.arange(count),
+                         np.ones(count, dtype=bool), x, y, np.arange(count))
+    loader = FakeLoader(index)
+    monkeypatch.setattr(outlier_module, 'data_loader', loader)
+    return loader
+
+def ranked(result):
+    return [(entry['annotation_id'], round(entry['score'], 9)) for entry in result['outliers']]
+
+def test_update_after_removal_matches_a_fresh_computation(loader):
+    service = OutlierService(k=5)
+    service.get_outliers(top_k=1000)
+    loader.index.remove(list(range(1, 200, 7)))
+    updated = service.get_outliers(top_k=1000)
+    fresh = OutlierService(k=5).get_outliers(top_k=1000)
+    assert updated['total'] == fresh['total'] == 600 - len(range(1, 200, 7))
+    assert ranked(updated) == ranked(fresh)
+
+def test_removal_during_an_update_is_applied_by_the_next_call(loader, monkeypatch):
+    service = OutlierService(k=5)
+    service.get_outliers(top_k=1000)
+    loader.index.remove([1, 2, 3])
+    take_state = loader.alive_state
+
+    def removal_lands_after_the_copy(index):
+        state = take_state(index)
+        index.remove([10, 11, 12])
+        return state
+
+    monkeypatch.setattr(loader, 'alive_state', removal_lands_after_the_copy)
+    during = service.get_outliers(top_k=1000)
+    assert during['total'] == 597
+    monkeypatch.setattr(loader, 'alive_state', take_state)
+
+    after = service.get_outliers(top_k=1000)
+    assert after['total'] == 594
+    assert not {10, 11, 12} & {entry['annotation_id'] for entry in after['outliers']}
+    assert ranked(after) == ranked(OutlierService(k=5).get_outliers(top_k=1000))
@@ -0,0 +1,74 @@
+import os
+from services.removal_log import RemovalLog
+
+def make_log(tmp_path, content=b'{"annotations": []}'):
+    source = tmp_path / "annotations.json"
+    source.write_bytes(content)
+    log = RemovalLog(tmp_path / "removal_log.jsonl")
+    log.open(source)
+    return source, log
+
+def reopen(tmp_path, source):
+    log = RemovalLog(tmp_path / "removal_log.jsonl")
+    log.open(source)
+    return log
+
+def test_replay_restores_removals(tmp_path):
+    source, log = make_log(tmp_path)
+    assert log.append_removal([1, 2]) == 1
+    assert log.append_removal([3]) == 2
+    assert reopen(tmp_path, source).removed_ids() == {1, 2, 3}
+
+def test_undo_latest_and_by_batch(tmp_path):
+    source, log = make_log(tmp_path)
+    log.append_removal([1, 2])
+    log.append_removal([3])
+    log.append_removal([4])
+    assert log.append_undo() == (3, [4])
+    assert log.append_undo(1) == (1, [1, 2])
+    assert log.append_undo(1) is None
+    replayed = reopen(tmp_path, source)
+    assert replayed.removed_ids() == {3}
+    assert replayed.batches() == [{'batch': 2, 'count': 1}]
+    # Batch numbers are not reused after an undo
+    assert replayed.append_removal([5]) == 4
+
+def test_poll_returns_changes_in_log_order(tmp_path):
+    _, log = make_log(tmp_path)
+    batch = log.append_removal([7])
+    log.append_undo(batch)
+    assert log.poll() == [('remove', batch, [7]), ('undo', batch, [7])]
+    assert log.poll() == []
+
+def test_other_process_appends_are_picked_up(tmp_path):
+    source, first = make_log(tmp_path)
+    second = reopen(tmp_path, source)
+    first.append_removal([1])
+    assert second.changed()
+    assert second.poll() == [('remove', 1, [1])]
+    # The second log caught up before appending, so it does not reuse batch 1
+    assert second.append_removal([2]) == 2
+    assert first.poll()[-1] == ('remove', 2, [2])
+    assert first.offset == second.offset
+
+def test_torn_last_line_is_ignored(tmp_path):
+    source, log = make_log(tmp_path)
+    log.append_removal([1])
+    with open(log.path, 'a') as f:
+        f.write('{"op": "remove", "batch": 2, "ids": [')
+    assert reopen(tmp_path, source).removed_ids() == {1}
+
+def test_touched_source_keeps_the_log(tmp_path):
+    source, log = make_log(tmp_path)
+    log.append_removal([1, 2])
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_mtime_ns + 10**9, stat.st_mtime_ns + 10**9))
+    assert reopen(tmp_path, source).removed_ids() == {1, 2}
+    assert not list(tmp_path.glob("*.stale.jsonl"))
+
+def test_changed_source_sets_the_log_aside(tmp_path):
+    source, log = make_log(tmp_path)
+    log.append_removal([1, 2])
+    source.write_bytes(b'{"annotations": [{}]}')
+    assert reopen(tmp_path, source).removed_ids() == set()
+    assert len(list(tmp_path.glob("*.stale.jsonl"))) == 1
@@ -0,0 +1,69 @@
+import contextvars
+import numpy as np
+import pytest
+from services.data_loader import DataLoader
+
+@pytest.fixture
+def loader(data_dir):
+    loader = DataLoader(str(data_dir))
+    loader.load_all()
+    return loader
+
+def test_pinned_context_keeps_its_snapshot_across_a_reload(loader):
+    token = loader.pin()
+    try:
+        pinned = loader.get_snapshot()
+        loader.reload()
+        assert loader.get_snapshot() is pinned
+        assert loader.generation == pinned.generation
+        # Another request, with its own context, reads the new snapshot
+        assert contextvars.Context().run(loader.get_snapshot) is not pinned
+    finally:
+        loader.unpin(token)
+    assert loader.get_snapshot() is not pinned
+    assert loader.generation == pinned.generation + 1
+
+def test_unpinned_reads_follow_the_latest_snapshot(loader):
+    first = loader.get_snapshot()
+    loader.reload()
+    assert loader.get_snapshot() is not first
+    assert loader.get_index() is loader.get_snapshot().index
+
+def test_layout_swap_leaves_pinned_layout_alone(loader):
+    token = loader.pin()
+    try:
+        before = np.asarray(loader.get_index().x).copy()
+        swapped = np.asarray(loader.embeddings)[:, ::-1].copy()
+        loader.swap_embeddings(swapped, {'method': 'pca', 'job_id': 'test'}, publish=False)
+        assert np.array_equal(loader.get_index().x, before)
+    finally:
+        loader.unpin(token)
+    assert loader.layout_id == 'test_pca'
+    assert not np.array_equal(loader.get_index().x, before)
+
+def test_swap_keeps_removals_and_load_id(loader):
+    ids = loader.get_index().annotation_ids[:5].tolist()
+    load_id = loader.load_id
+    loader.log_removal(ids)
+    loader.swap_embeddings(np.asarray(loader.embeddings)[:, ::-1].copy(), None, publish=False)
+    assert loader.load_id == load_id
+    assert not loader.get_index().alive[loader.get_index().rows_for_ids(ids, alive_only=False)].any()
+
+def test_removals_are_replayed_on_reload(loader):
+    ids = loader.get_index().annotation_ids[10:20].tolist()
+    batch, removed = loader.log_removal(ids)
+    assert removed == 10
+    live = loader.get_live_annotation_count()
+    loader.reload()
+    assert loader.get_live_annotation_count() == live
+    assert loader.log_undo(batch) == (batch, 10)
+    assert loader.get_live_annotation_count() == live + 10
+
+def test_second_loader_catches_up_like_another_worker(data_dir, loader):
+    other = DataLoader(str(data_dir))
+    other.load_all()
+    loader.log_removal(loader.get_index().annotation_ids[:3].tolist())
+    assert other.needs_sync()
+    other.sync()
+    assert other.get_live_annotation_count() == loader.get_live_annotation_count()
+    assert other.dataset_version() == loader.dataset_version()
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from services.spatial_index import GridIndex, points_in_polygon
+
+@pytest.fixture
+def clustered_points():
+    rng = np.random.default_rng(0)
+    centres = rng.uniform(-50, 50, size=(8, 2))
+    points = centres[rng.integers(0, 8, size=3000)] + rng.normal(0, 2, size=(3000, 2))
+    # Outliers far from every cluster
+    points[:20] = rng.uniform(-200, 200, size=(20, 2))
+    return points[:, 0].astype(np.float32), points[:, 1].astype(np.float32)
+
+def brute_force_rect(x, y, rows, x_min, x_max, y_min, y_max):
+    return np.sort(rows[(x[rows] >= x_min) & (x[rows] <= x_max) & (y[rows] >= y_min) & (y[rows] <= y_max)])
+
+def test_query_rect_matches_brute_force(clustered_points):
+    x, y = clustered_points
+    rows = np.arange(len(x))
+    grid = GridIndex(x, y, rows)
+    for rect in [(-10, 10, -10, 10), (-300, 300, -300, 300), (0, 0.5, 0, 0.5), (500, 600, 0, 1)]:
+        assert np.array_equal(np.sort(grid.query_rect(*rect)), brute_force_rect(x, y, rows, *rect))
+
+def test_query_rect_only_returns_indexed_rows(clustered_points):
+    x, y = clustered_points
+    rows = np.arange(0, len(x), 3)
+    grid = GridIndex(x, y, rows)
+    assert np.array_equal(np.sort(grid.query_rect(-300, 300, -300, 300)), rows)
+
+def test_query_rect_on_empty_grid():
+    grid = GridIndex(np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64))
+    assert len(grid.query_rect(-1, 1, -1, 1)) == 0
+
+def test_query_polygon_matches_point_test(clustered_points):
+    x, y = clustered_points
+    grid = GridIndex(x, y, np.arange(len(x)))
+    triangle = [[-60, -60], [60, -60], [0, 60]]
+    expected = np.flatnonzero(points_in_polygon(x, y, np.asarray(triangle, dtype=np.float64)))
+    assert np.array_equal(np.sort(grid.query_polygon(triangle)), expected)
+
+def test_points_in_polygon_square():
+    square = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=np.float64)
+    inside = points_in_polygon(np.array([0.5, 1.5, -0.1]), np.array([0.5, 0.5, 0.5]), square)
+    assert inside.tolist() == [True, False, False]
+
+@pytest.mark.parametrize('k', [1, 11])
+def test_knn_matches_brute_force(clustered_points, k):
+    x, y = clustered_points
+    rows = np.arange(1, len(x), 2)
+    grid = GridIndex(x, y, rows)
+    queries = np.arange(0, len(x), 7)
+    found, squared = grid.knn(x[queries], y[queries], k)
+
+    qx, qy = x[queries].astype(np.float64), y[queries].astype(np.float64)
+    dist = (qx[:, None] - x[rows]) ** 2 + (qy[:, None] - y[rows]) ** 2
+    expected = np.sort(dist, axis=1)[:, :k]
+    assert np.allclose(squared, expected)
+    assert np.allclose((qx[:, None] - x[found]) ** 2 + (qy[:, None] - y[found]) ** 2, squared)
+
+def test_knn_pads_when_there_are_too_few_points():
+    x = np.array([0.0, 1.0, 5.0])
+    y = np.zeros(3)
+    grid = GridIndex(x, y, np.arange(3))
+    found, squared = grid.knn(np.array([0.9]), np.array([0.0]), 5)
+    assert found.tolist() == [[1, 0, 2, -1, -1]]
+    assert np.allclose(squared[0, :3], [0.01, 0.81, 16.81])
+    assert np.isinf(squared[0, 3:]).all()
@@ -0,0 +1,73 @@
+import threading
+import numpy as np
+import pytest
+from services.data_loader import DataLoader
+from services.dataset_index import DatasetIndex
+from services.stats_service import StatsService
+import services.stats_service as stats_module
+
+class FakeTable:
+    def __init__(self, count: int):
+        rng = np.random.default_rng(0)
+        self.category_ids = rng.integers(1, 4, size=count)
+        self.image_ids = rng.integers(1, 50, size=count)
+        self.scores = rng.uniform(0, 1, size=count)
+        self.bboxes = np.column_stack([np.zeros(count), np.zeros(count), rng.uniform(1, 100, size=(count, 2))])
+
+class FakeLoader:
+    """The parts of DataLoader the stats service reads"""
+
+    def __init__(self, index, table):
+        self.index = index
+        self.table = table
+        self._sync_lock = threading.Lock()
+
+    alive_state = DataLoader.alive_state
+
+@pytest.fixture
+def dataset(monkeypatch):
+    count = 2000
+    ids = np.arange(1000, 1000 + count)
+    codes = (ids % 3).astype(np.int16)
+    index = DatasetIndex(ids, codes, ['a', 'b', 'c'], np.arange(count), np.ones(count, dtype=bool),
+                         np.zeros(count, dtype=np.float32), np.zeros(count, dtype=np.float32),
+                         np.arange(count))
+    loader = FakeLoader(index, FakeTable(count))
+    monkeypatch.setattr(stats_module, 'data_loader', loader)
+    return index, loader
+
+def expected_counts(index):
+    return np.bincount(index.class_codes[index.alive], minlength=3)
+
+def test_counts_follow_removals_and_restores(dataset):
+    index, _ = dataset
+    stats = StatsService()
+    stats._sync(index)
+    index.remove(range(1000, 1300))
+    stats._sync(index)
+    assert np.array_equal(stats._counts['class'], expected_counts(index))
+    index.restore(range(1100, 1200))
+    stats._sync(index)
+    assert np.array_equal(stats._counts['class'], expected_counts(index))
+    assert stats._counts['category'].sum() == index.alive.sum()
+
+def test_concurrent_removals_are_never_lost(dataset):
+    index, loader = dataset
+    stats = StatsService()
+    stats._sync(index)
+    done = threading.Event()
+
+    def remove_in_batches():
+        for start in range(1000, 3000, 20):
+            with loader._sync_lock:
+                index.remove(range(start, start + 20))
+        done.set()
+
+    writer = threading.Thread(target=remove_in_batches)
+    writer.start()
+    while not done.is_set():
+        stats._sync(index)
+    writer.join()
+    stats._sync(index)
+    assert np.array_equal(stats._counts['class'], expected_counts(index))
+    assert stats._counts['class'].sum() == 0
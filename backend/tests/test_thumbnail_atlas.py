@@ -0,0 +1,65 @@
+import json
+import os
+import shutil
+import numpy as np
+from services.dataset_cache import file_fingerprint
+from services.thumbnail_atlas import ATLAS_FORMAT, ThumbnailAtlas, part_paths
+
+def write_atlas(atlas_dir, source, thumbnails):
+    """One part holding `thumbnails` ({annotation id: bytes}) in id order"""
+    # Like a fresh build, which deletes the atlas directory rather than rewriting files in place
+    shutil.rmtree(atlas_dir, ignore_errors=True)
+    atlas_dir.mkdir()
+    rows, data = [], b""
+    for annotation_id, thumbnail in sorted(thumbnails.items()):
+        rows.append((annotation_id, 0, len(data), len(thumbnail)))
+        data += thumbnail
+    part_paths(atlas_dir, 0)[0].write_bytes(data)
+    np.save(atlas_dir / "index.npy", np.array(rows, dtype=np.int64).reshape(-1, 4))
+    manifest = {'format': ATLAS_FORMAT, 'size': 128, 'padding': 10, 'image_format': 'jpeg',
+                'source': file_fingerprint(source), 'parts': 1, 'complete': True}
+    (atlas_dir / "manifest.json").write_text(json.dumps(manifest))
+    # Some filesystems keep the old mtime for a rewrite within the same tick
+    stat = os.stat(atlas_dir / "manifest.json")
+    os.utime(atlas_dir / "manifest.json", ns=(stat.st_atime_ns, stat.st_mtime_ns + len(thumbnails)))
+
+def make_atlas(tmp_path, thumbnails):
+    source = tmp_path / "annotations.json"
+    source.write_text('{"annotations": []}')
+    write_atlas(tmp_path / "atlas", source, thumbnails)
+    return ThumbnailAtlas(tmp_path / "atlas", source)
+
+def test_get_and_covers(tmp_path):
+    atlas = make_atlas(tmp_path, {7: b"seven", 3: b"three"})
+    assert atlas.get(3) is None
+    atlas.bind(0, 'load-0')
+    assert atlas.covers(10, 128, 'jpeg') and not atlas.covers(10, 64, 'jpeg')
+    assert atlas.get(3) == b"three" and atlas.get(7) == b"seven"
+    assert atlas.get(5) is None
+    assert atlas.stats()['thumbnails'] == 2 and atlas.hits == 2
+
+def test_changed_source_disables_the_atlas(tmp_path):
+    atlas = make_atlas(tmp_path, {1: b"one"})
+    (tmp_path / "annotations.json").write_text('{"annotations": [{"id": 1}]}')
+    atlas.bind(1, 'load-1')
+    assert atlas.get(1) is None and not atlas.covers(10, 128, 'jpeg')
+
+def test_readers_keep_the_state_they_started_with(tmp_path):
+    atlas = make_atlas(tmp_path, {1: b"one"})
+    atlas.bind(0, 'load-0')
+    state = atlas._state
+    write_atlas(tmp_path / "atlas", tmp_path / "annotations.json", {1: b"uno", 2: b"dos"})
+    atlas.bind(0, 'load-0')
+    assert atlas.get(2) == b"dos"
+    # The previous mappings are still open for a reader holding the old state
+    assert state.parts[0][0:3] == b"one"
+
+def test_older_generation_does_not_reopen(tmp_path):
+    atlas = make_atlas(tmp_path, {1: b"one"})
+    atlas.bind(2, 'load-2')
+    state = atlas._state
+    atlas.bind(1, 'load-1')
+    assert atlas._state is state
+    atlas.bind(2, 'load-2')
+    atlas.bind(3, 'load-3')
+    assert atlas._state is not state and atlas.get(1) == b"one"
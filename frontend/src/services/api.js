@@ -18,13 +18,69 @@ export async function getEmbeddingsByClass(className) {
   return response.data
 }
 
+// Binary embeddings: packed little-endian columns, see backend/services/point_codec.py
+const POINTS_MAGIC = 'EMBP'
+
+export function decodePoints(buffer) {
+  const view = new DataView(buffer)
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4))
+  if (magic !== POINTS_MAGIC) {
+    throw new Error(`Unexpected points payload: ${magic}`)
+  }
+  const count = view.getUint32(8, true)
+  const headerLength = view.getUint32(12, true)
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 16, headerLength)))
+
+  let offset = 16 + headerLength
+  const annotationIds = new BigInt64Array(buffer, offset, count)
+  offset += count * 8
+  const x = new Float32Array(buffer, offset, count)
+  offset += count * 4
+  const y = new Float32Array(buffer, offset, count)
+  offset += count * 4
+  const classCodes = new Uint16Array(buffer, offset, count)
+
+  return { count, classNames: header.classes, annotationIds, x, y, classCodes }
+}
+
+export async function getEmbeddingsBinary(className = null) {
+  const response = await api.get('/embeddings', {
+    params: { format: 'binary', class_name: className || undefined },
+    responseType: 'arraybuffer',
+  })
+  return decodePoints(response.data)
+}
+
+// Expand decoded columns into the point objects used by the scatter plot
+export function pointsFromColumns(columns) {
+  const points = new Array(columns.count)
+  for (let i = 0; i < columns.count; i++) {
+    points[i] = {
+      annotation_id: Number(columns.annotationIds[i]),
+      x: columns.x[i],
+      y: columns.y[i],
+      class_name: columns.classNames[columns.classCodes[i]],
+    }
+  }
+  return points
+}
+
+// Level-of-detail tile: { mode: 'points', points } or { mode: 'bins', bins, classes }
+export async function getEmbeddingTile(z, x, y, className = null) {
+  const response = await api.get(`/embeddings/tiles/${z}/${x}/${y}`, {
+    params: { class_name: className || undefined },
+  })
+  return response.data
+}
+
 // Classes endpoint
 export async function getClasses() {
   const response = await api.get('/classes')
   return response.data
 }
 
-// Selection endpoint
+// Selection endpoint: a rectangle (x_min, x_max, y_min, y_max) or a lasso
+// `polygon` of [x, y] vertices, optionally restricted with `class_name`
 export async function getSelection(selectionCoords) {
   const response = await api.post('/selection', selectionCoords)
   return response.data.annotation_ids
@@ -35,6 +91,73 @@ export function getCropImageUrl(annotationId) {
   return `${API_BASE_URL}/crop/${annotationId}`
 }
 
+// Batch crops: length-prefixed bundle, see backend/services/crop_bundle.py.
+// Resolves to a Map of annotation_id -> Blob (null when the crop failed)
+export async function getCropBundle(annotationIds, size = 128, format = 'jpeg') {
+  const response = await api.post('/crops', {
+    annotation_ids: annotationIds,
+    size,
+    format,
+    layout: 'bundle',
+  }, { responseType: 'arraybuffer' })
+
+  const buffer = response.data
+  const view = new DataView(buffer)
+  const count = view.getUint32(4, true)
+  const crops = new Map()
+  let offset = 8
+  for (let i = 0; i < count; i++) {
+    const annotationId = Number(view.getBigInt64(offset, true))
+    const length = view.getUint32(offset + 8, true)
+    offset += 12
+    crops.set(annotationId, length
+      ? new Blob([buffer.slice(offset, offset + length)], { type: `image/${format}` })
+      : null)
+    offset += length
+  }
+  return crops
+}
+
+// One page of annotations; pass the previous page's next_cursor to continue
+export async function getAnnotationsPage({ sort = 'id', order = 'asc', className = null, limit = 100,
+                                          cursor = null, fields = null, ...filters } = {}) {
+  const response = await api.get('/annotations', {
+    params: {
+      sort, order, limit, class_name: className || undefined, cursor: cursor || undefined,
+      fields: fields ? fields.join(',') : undefined,
+      min_score: filters.minScore, max_score: filters.maxScore,
+      min_area: filters.minArea, max_area: filters.maxArea,
+    }
+  })
+  return response.data
+}
+
+// Page through annotations ranked by outlier score (most suspicious first)
+export async function getOutliers(className = null, topK = 100, offset = 0, sort = 'score') {
+  const response = await api.get('/outliers', {
+    params: { class_name: className || undefined, top_k: topK, offset, sort }
+  })
+  return response.data
+}
+
+// Start a background 2D projection job ('pca', 'umap' or 'tsne')
+export async function startProjection(method = 'pca', className = null, params = {}) {
+  const response = await api.post('/projections', { method, class_name: className, params })
+  return response.data
+}
+
+// Poll a projection job
+export async function getProjectionJob(jobId) {
+  const response = await api.get(`/projections/${jobId}`)
+  return response.data
+}
+
+// Switch back to the precomputed embeddings_2d.npy layout
+export async function resetProjection() {
+  const response = await api.post('/projections/reset')
+  return response.data
+}
+
 // Remove annotations endpoint
 export async function removeAnnotations(annotationIds) {
   const response = await api.post('/remove', { 
@@ -43,4 +166,16 @@ export async function removeAnnotations(annotationIds) {
   return response.data
 }
 
+// Undo a removal batch (the latest one when batchId is omitted)
+export async function undoRemoval(batchId = null) {
+  const response = await api.post('/remove/undo', { batch_id: batchId })
+  return response.data
+}
+
+// Write the cleaned annotations file on the server
+export async function exportAnnotations() {
+  const response = await api.post('/export')
+  return response.data
+}
+
 export default api
\ No newline at end of file
@@ -2,6 +2,9 @@ import { defineStore } from 'pinia'
 import { ref, computed } from 'vue'
 import * as api from '../services/api'
 
+// Thumbnails are fetched in bundles of this many crops
+const CROP_BATCH_SIZE = 200
+
 export const useDataStore = defineStore('data', () => {
   // State
   const embeddings = ref([])
@@ -11,6 +14,8 @@ export const useDataStore = defineStore('data', () => {
   const galleryItems = ref([])
   const checkedItems = ref([])
   const loading = ref(false)
+  const lastRemovalBatch = ref(null)
+  const lastExportFile = ref(null)
 
   // Computed
   const filteredEmbeddings = computed(() => {
@@ -24,8 +29,8 @@ export const useDataStore = defineStore('data', () => {
   async function loadEmbeddings() {
     loading.value = true
     try {
-      const data = await api.getEmbeddings()
-      embeddings.value = data
+      const columns = await api.getEmbeddingsBinary()
+      embeddings.value = api.pointsFromColumns(columns)
     } catch (error) {
       console.error('Failed to load embeddings:', error)
     } finally {
@@ -36,8 +41,8 @@ export const useDataStore = defineStore('data', () => {
   async function loadClassEmbeddings(className) {
     loading.value = true
     try {
-      const data = await api.getEmbeddingsByClass(className)
-      embeddings.value = data
+      const columns = await api.getEmbeddingsBinary(className)
+      embeddings.value = api.pointsFromColumns(columns)
       selectedClass.value = className
     } catch (error) {
       console.error('Failed to load class embeddings:', error)
@@ -57,7 +62,10 @@ export const useDataStore = defineStore('data', () => {
 
   async function updateSelection(selectionCoords) {
     try {
-      const annotationIds = await api.getSelection(selectionCoords)
+      const annotationIds = await api.getSelection({
+        ...selectionCoords,
+        class_name: selectedClass.value === 'all' ? null : selectedClass.value
+      })
       selectedPoints.value = annotationIds
       
       // Load gallery items for selected points
@@ -67,12 +75,21 @@ export const useDataStore = defineStore('data', () => {
     }
   }
 
+  function revokeGalleryUrls() {
+    for (const item of galleryItems.value) {
+      if (item.imageUrl && item.imageUrl.startsWith('blob:')) {
+        URL.revokeObjectURL(item.imageUrl)
+      }
+    }
+  }
+
   async function loadGalleryItems(annotationIds) {
     loading.value = true
     try {
+      revokeGalleryUrls()
       const items = annotationIds.map(id => ({
         annotation_id: id,
-        imageUrl: api.getCropImageUrl(id),
+        imageUrl: null,
         checked: false
       }))
       galleryItems.value = items
@@ -82,6 +99,25 @@ export const useDataStore = defineStore('data', () => {
     } finally {
       loading.value = false
     }
+
+    // Fill in thumbnails batch by batch instead of one request per image
+    const items = galleryItems.value
+    for (let start = 0; start < items.length; start += CROP_BATCH_SIZE) {
+      const batch = items.slice(start, start + CROP_BATCH_SIZE)
+      try {
+        const crops = await api.getCropBundle(batch.map(item => item.annotation_id))
+        if (galleryItems.value !== items) return  // selection changed meanwhile
+        for (const item of batch) {
+          const blob = crops.get(item.annotation_id)
+          item.imageUrl = blob ? URL.createObjectURL(blob) : api.getCropImageUrl(item.annotation_id)
+        }
+      } catch (error) {
+        console.error('Failed to load crop bundle:', error)
+        for (const item of batch) {
+          item.imageUrl = api.getCropImageUrl(item.annotation_id)
+        }
+      }
+    }
   }
 
   function toggleItemCheck(annotationId) {
@@ -101,7 +137,8 @@ export const useDataStore = defineStore('data', () => {
     
     loading.value = true
     try {
-      await api.removeAnnotations(checkedItems.value)
+      const result = await api.removeAnnotations(checkedItems.value)
+      lastRemovalBatch.value = result.batch_id
       
       // Remove from current data
       embeddings.value = embeddings.value.filter(
@@ -122,7 +159,36 @@ export const useDataStore = defineStore('data', () => {
     }
   }
 
+  async function undoLastRemoval() {
+    loading.value = true
+    try {
+      await api.undoRemoval(lastRemovalBatch.value)
+      lastRemovalBatch.value = null
+      // Restored points come back with the next embeddings load
+      const columns = await api.getEmbeddingsBinary(selectedClass.value === 'all' ? null : selectedClass.value)
+      embeddings.value = api.pointsFromColumns(columns)
+    } catch (error) {
+      console.error('Failed to undo removal:', error)
+    } finally {
+      loading.value = false
+    }
+  }
+
+  async function exportAnnotations() {
+    loading.value = true
+    lastExportFile.value = null
+    try {
+      const result = await api.exportAnnotations()
+      lastExportFile.value = result.output_file
+    } catch (error) {
+      console.error('Failed to export annotations:', error)
+    } finally {
+      loading.value = false
+    }
+  }
+
   function clearSelection() {
+    revokeGalleryUrls()
     selectedPoints.value = []
     galleryItems.value = []
     checkedItems.value = []
@@ -137,6 +203,8 @@ export const useDataStore = defineStore('data', () => {
     galleryItems,
     checkedItems,
     loading,
+    lastRemovalBatch,
+    lastExportFile,
     
     // Computed
     filteredEmbeddings,
@@ -149,6 +217,8 @@ export const useDataStore = defineStore('data', () => {
     loadGalleryItems,
     toggleItemCheck,
     removeSelectedItems,
+    undoLastRemoval,
+    exportAnnotations,
     clearSelection
   }
 })
\ No newline at end of file